@@ -0,0 +1,712 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ЗАМЕРЫ СКОРОСТИ ПАРСЕРА TORGI.ORG
+========================================
+
+Программа измеряет, сколько времени и памяти тратит каждый этап
+парсера (parse_trades.py), и как это меняется с ростом таблицы.
+Интернет не нужен: страницы берутся из папки bench_fixtures/
+(сохраненные страницы torgi.org) или создаются генератором
+на нужное число строк - от 1 тысячи до 1 миллиона.
+
+ЭТАПЫ:
+1. parse_price           - преобразование текста цены в число
+2. find_data_in_cell     - анализ ячеек таблицы
+3. bs4_parse             - построение дерева BeautifulSoup для страницы
+4. parse_lots_from_table - извлечение лотов из готовой таблицы
+5. extract_lxml          - потоковый разбор страницы через lxml
+6. filter_lots_by_price  - фильтрация по диапазону цен
+   price_index_*         - построение индекса цен и запросы к нему
+   filter_price_index    - тот же фильтр через готовый индекс цен
+7. sort                  - сортировка лотов по цене
+8. fetch_crawl           - загрузка всех страниц с локального HTTP-сервера
+                           и разбор лотов (весь путь, как в --crawl)
+
+Для каждого этапа и размера записывается время, скорость
+(элементов в секунду) и пиковая память. Результаты сохраняются
+в JSON, чтобы сравнивать версии между собой.
+
+ЗАПУСК:
+    python bench_trades.py
+    python bench_trades.py --sizes 1000,100000,1000000 --output bench.json
+    python bench_trades.py --compare bench_old.json     # есть ли замедление?
+    python bench_trades.py --record                     # сохранить живую страницу
+"""
+
+# ИМПОРТ БИБЛИОТЕК
+# ============================================================
+import argparse           # Для разбора аргументов командной строки
+import glob               # Для поиска сохраненных страниц
+import http.server        # Для локального HTTP-сервера со страницами
+import json               # Для сохранения результатов
+import os                 # Для работы с путями
+import platform           # Для сведений о компьютере в результатах
+import random             # Для генерации случайных лотов
+import sys                # Для вывода в поток ошибок и кода выхода
+import threading          # Для запуска сервера в фоне
+import time               # Для замера времени
+import tracemalloc        # Для замера пиковой памяти
+from urllib.parse import urlsplit, parse_qsl
+
+from bs4 import BeautifulSoup
+
+import parse_trades as pt
+
+
+# НАСТРОЙКИ
+# ============================================================
+# Папка с сохраненными страницами torgi.org
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_fixtures')
+
+# Размеры синтетических таблиц по умолчанию (строк с лотами)
+DEFAULT_SIZES = (1000, 10000)
+
+# Если этап на каком-то размере работал дольше (секунд),
+# на бОльших размерах он пропускается
+DEFAULT_TIME_LIMIT = 30.0
+
+# Сколько лотов на одной странице локального сервера
+ROWS_PER_PAGE = 50
+
+# Замедление больше этой доли считается ухудшением (для --compare)
+DEFAULT_THRESHOLD = 0.2
+
+# Данные для генератора лотов
+SYNTHETIC_KINDS = (
+    'Земельный участок, категория земель: земли населенных пунктов',
+    'Нежилое помещение, назначение: нежилое, наименование: магазин',
+    'Квартира, общая площадь {area} кв.м., этаж {floor}',
+    'Жилой дом и земельный участок по адресу',
+    '1/3 доля в праве общей долевой собственности на квартиру',
+    'Транспортное средство, {year} г.в., пробег {mileage} км',
+)
+SYNTHETIC_REGIONS = (
+    'Московская обл.', 'Ленинградская обл.', 'Санкт-Петербург г.',
+    'Краснодарский край', 'Алтайский край', 'Тверская обл.',
+    'Новосибирская обл.', 'Свердловская обл.', 'Татарстан респ',
+)
+
+# Адрес списка на локальном сервере
+SERVER_LIST_PATH = '/index.php?class=Auction&action=List&mod=Open&AuctionType=All'
+
+
+# ГЕНЕРАТОР СИНТЕТИЧЕСКИХ СТРАНИЦ
+# ============================================================
+
+def generate_lot_rows(count, seed=1, start=0):
+    """
+    ГЕНЕРАЦИЯ СТРОК ТАБЛИЦЫ С ЛОТАМИ
+    ============================================
+
+    Строки устроены как на torgi.org: номер, название со ссылкой,
+    регион, дата, цена, статус, форма торгов.
+
+    ПАРАМЕТРЫ:
+    - count: сколько строк создать
+    - seed: начальное значение генератора (одинаковый seed → одинаковые строки)
+    - start: номер первого лота (чтобы ссылки на разных страницах не совпадали)
+
+    ВОЗВРАЩАЕТ:
+    - Список строк HTML (<tr>...</tr>)
+    """
+
+    rng = random.Random(seed * 1000003 + start)
+    rows = []
+
+    for i in range(start, start + count):
+        oid = 100000 + i
+        name = rng.choice(SYNTHETIC_KINDS).format(area=rng.randint(18, 250),
+                                                  floor=rng.randint(1, 25),
+                                                  year=rng.randint(1995, 2024),
+                                                  mileage=rng.randint(1000, 300000))
+        # Номер лота в названии делает названия разными
+        name = f"{name}, лот № {oid}"
+        price = round(rng.uniform(50000, 50000000), 2)
+
+        rows.append(
+            '<tr>'
+            f'<td>{i + 1}</td>'
+            f'<td><a href="index.php?class=ArrestAuction&amp;action=View&amp;OID={oid}">{name}</a></td>'
+            f'<td>{rng.choice(SYNTHETIC_REGIONS)}</td>'
+            f'<td>{rng.randint(1, 28):02d}-{rng.randint(1, 12):02d}-2024</td>'
+            f'<td>{pt.format_price_text(price)}</td>'
+            '<td>Прием заявок</td>'
+            '<td>Аукцион</td>'
+            '</tr>'
+        )
+
+    return rows
+
+
+def generate_listing_html(rows, page=None, pages=None):
+    """
+    СБОРКА СТРАНИЦЫ СПИСКА ЛОТОВ
+    ============================================
+
+    Первая таблица - меню (как на сайте), вторая - лоты с заголовком.
+    Если заданы page и pages, внизу добавляется постраничная навигация
+    с "окном" из соседних номеров страниц.
+
+    ПАРАМЕТРЫ:
+    - rows: строки таблицы из generate_lot_rows()
+    - page: номер этой страницы (или None)
+    - pages: всего страниц (или None)
+
+    ВОЗВРАЩАЕТ:
+    - HTML-код страницы
+    """
+
+    nav = ''
+    if page and pages and pages > 1:
+        numbers = sorted({1, pages} | set(range(max(1, page - 5), min(pages, page + 5) + 1)))
+        nav = ' | '.join(
+            f'<b>{n}</b>' if n == page else
+            f'<a href="{SERVER_LIST_PATH.replace("&", "&amp;")}&amp;page={n}">{n}</a>'
+            for n in numbers)
+
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        '<title>Открытые торги</title></head><body>'
+        '<table class="menu"><tr><td><a href="/">Главная</a></td>'
+        '<td><a href="/index.php?class=Page&amp;action=View">Контакты</a></td></tr></table>'
+        '<table class="data"><tr><th>№</th><th>Наименование лота</th><th>Регион</th>'
+        '<th>Дата торгов</th><th>Начальная цена</th><th>Статус</th><th>Форма торгов</th></tr>'
+        + ''.join(rows) +
+        '</table>'
+        f'<div class="pager">{nav}</div>'
+        '</body></html>'
+    )
+
+
+def generate_lot_page(oid, seed=1):
+    """
+    СТРАНИЦА ОДНОГО ЛОТА (ДЛЯ --enrich)
+    ============================================
+
+    Данные записаны парами "подпись - значение" в строках таблицы,
+    как на torgi.org; организатор - во вложенной таблице.
+
+    ВОЗВРАЩАЕТ:
+    - HTML-код страницы
+    """
+
+    rng = random.Random(seed * 1000003 + oid)
+    day, month = rng.randint(1, 28), rng.randint(1, 12)
+
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>Лот {oid}</title></head><body>'
+        '<table class="menu"><tr><td><a href="/">Главная</a></td><td>Торги</td></tr></table>'
+        '<table class="data">'
+        f'<tr><th>Номер лота:</th><td>{oid}</td></tr>'
+        f'<tr><td>Дата проведения торгов:</td><td>{day:02d}-{month:02d}-2024 <b>10:00</b></td></tr>'
+        f'<tr><td>Дата начала приема заявок:</td><td>{day:02d}-{month:02d}-2023</td></tr>'
+        f'<tr><td>Дата окончания\n  приема заявок:</td><td>{day:02d}-{month:02d}-2024</td></tr>'
+        f'<tr><td>Площадь:</td><td>{rng.randint(18, 3000)}   кв.м.</td></tr>'
+        '<tr><td>Организатор торгов:</td><td><table><tr><td>ТУ Росимущества</td>'
+        f'<td>ИНН 77{rng.randint(10000000, 99999999)}</td></tr></table></td></tr>'
+        f'<tr><td>Шаг аукциона:</td><td>{pt.format_price_text(rng.randint(1, 500) * 1000.0)}</td></tr>'
+        '</table></body></html>'
+    )
+
+
+def generate_site_pages(count, seed=1):
+    """
+    ГЕНЕРАЦИЯ ВСЕХ СТРАНИЦ СПИСКА ДЛЯ ЛОКАЛЬНОГО СЕРВЕРА
+    ============================================
+
+    ВОЗВРАЩАЕТ:
+    - Список HTML-страниц (в байтах) по ROWS_PER_PAGE лотов на странице
+    """
+
+    pages = max(1, (count + ROWS_PER_PAGE - 1) // ROWS_PER_PAGE)
+    result = []
+    for page in range(1, pages + 1):
+        start = (page - 1) * ROWS_PER_PAGE
+        rows = generate_lot_rows(min(ROWS_PER_PAGE, count - start), seed, start)
+        result.append(generate_listing_html(rows, page, pages).encode('utf-8'))
+    return result
+
+
+# ЛОКАЛЬНЫЙ HTTP-СЕРВЕР
+# ============================================================
+# Заменяет torgi.org при замере полного пути "загрузка → разбор".
+# Отдает страницы по параметру page=N и страницы лотов по OID=N,
+# поддерживает keep-alive и условные запросы (ETag → 304), как
+# настоящий веб-сервер. Адреса запросов записываются в server.requests.
+
+class FixtureHandler(http.server.BaseHTTPRequestHandler):
+    """
+    ОБРАБОТЧИК ЗАПРОСОВ К ЛОКАЛЬНОМУ СЕРВЕРУ
+    """
+
+    # HTTP/1.1 - соединения переиспользуются (keep-alive)
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        params = dict(parse_qsl(urlsplit(self.path).query))
+
+        if 'OID' in params:
+            body = self.server.lot_pages.get(params['OID'])
+            etag = f'"l{params["OID"]}-{len(body or b"")}"'
+        else:
+            page = int(params.get('page', '1')) if params.get('page', '1').isdigit() else 0
+            pages = self.server.pages
+            body = pages[page - 1] if 1 <= page <= len(pages) else None
+            etag = f'"p{page}-{len(body or b"")}"'
+
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Не засоряем вывод строкой на каждый запрос
+        pass
+
+
+def start_fixture_server(pages, lot_pages=None):
+    """
+    ЗАПУСК ЛОКАЛЬНОГО СЕРВЕРА В ФОНОВОМ ПОТОКЕ
+    ============================================
+
+    ПАРАМЕТРЫ:
+    - pages: список HTML-страниц (байты); страница N - pages[N - 1]
+      (None - страница отдает 404)
+    - lot_pages: страницы лотов (байты) по номеру OID (строка) или None
+
+    ВОЗВРАЩАЕТ:
+    - Объект сервера; адрес - server.server_address,
+      остановка - server.shutdown()
+    """
+
+    # Порт 0 - система сама выберет свободный порт
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.lot_pages = lot_pages or {}
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ЗАМЕРЫ
+# ============================================================
+
+def measure(func, *args, memory=True):
+    """
+    ЗАМЕР ВРЕМЕНИ И ПИКОВОЙ ПАМЯТИ ОДНОГО ВЫЗОВА
+    ============================================
+
+    Время замеряется отдельно от памяти: tracemalloc сам
+    замедляет программу и исказил бы время.
+
+    ВОЗВРАЩАЕТ:
+    - Тройку (секунды, пик памяти в МБ или None, результат функции)
+    """
+
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+
+    peak_mb = None
+    if memory:
+        # Освобождаем результат первого запуска до замера памяти
+        result = None
+        tracemalloc.start()
+        result = func(*args)
+        peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return seconds, peak_mb, result
+
+
+def make_record(stage, size, items, seconds, peak_mb, **extra):
+    """
+    ОДНА ЗАПИСЬ РЕЗУЛЬТАТА (СЛОВАРЬ ДЛЯ JSON)
+    """
+
+    record = {
+        'stage': stage,
+        'size': size,
+        'items': items,
+        'seconds': round(seconds, 6),
+        'items_per_sec': round(items / seconds, 1) if seconds > 0 else None,
+        'peak_mb': round(peak_mb, 3) if peak_mb is not None else None,
+        'skipped': False,
+    }
+    record.update(extra)
+    return record
+
+
+def parse_lots_fresh(table):
+    """
+    parse_lots_from_table() БЕЗ ЗАПОМНЕННЫХ СХЕМ КОЛОНОК
+    (каждый замер начинается в одинаковых условиях)
+    """
+
+    pt.COLUMN_MAP_CACHE.clear()
+    return pt.parse_lots_from_table(table)
+
+
+def extract_lxml_fresh(html):
+    """
+    РАЗБОР ЧЕРЕЗ LXML БЕЗ ЗАПОМНЕННЫХ СХЕМ КОЛОНОК
+    """
+
+    pt.COLUMN_MAP_CACHE.clear()
+    return pt.extract_lots_from_html(html, 'lxml')
+
+
+def crawl_and_parse(url, workers):
+    """
+    ПОЛНЫЙ ПУТЬ: ОБХОД ВСЕХ СТРАНИЦ И РАЗБОР ЛОТОВ
+    ============================================
+
+    ВОЗВРАЩАЕТ:
+    - Пару (число страниц, число лотов)
+    """
+
+    session = pt.create_session(pool_size=workers)
+    pages = pt.crawl_listing_pages(session, url, workers=workers)
+    lots = list(pt.iter_lots_from_pages(pages, pt.DEFAULT_ENGINE))
+    session.close()
+    return len(pages), len(lots)
+
+
+def bench_size(size, args, slow_stages):
+    """
+    ВСЕ ЭТАПЫ ДЛЯ ОДНОГО РАЗМЕРА ТАБЛИЦЫ
+    ============================================
+
+    ПАРАМЕТРЫ:
+    - size: число строк с лотами
+    - args: аргументы командной строки
+    - slow_stages: множество этапов, превысивших лимит времени
+      на меньшем размере (они пропускаются и сюда же добавляются новые)
+
+    ВОЗВРАЩАЕТ:
+    - Список записей make_record()
+    """
+
+    memory = not args.no_memory
+    records = []
+
+    # Подготовка входных данных (в замер не входит)
+    rows = generate_lot_rows(size, args.seed)
+    html = generate_listing_html(rows)
+    # Цена - пятая ячейка строки (см. generate_lot_rows)
+    price_texts = [row.split('<td>')[5].split('</td>')[0] for row in rows]
+
+    # Дерево BeautifulSoup строится, только если выполняется этап,
+    # которому нужна готовая таблица: на больших размерах разбор
+    # всей страницы через bs4 дольше самих замеров
+    soup_cache = {}
+
+    def get_table():
+        if 'table' not in soup_cache:
+            soup_cache['table'] = BeautifulSoup(html, 'html.parser').find_all('table')[1]
+        return soup_cache['table']
+
+    # Этап → (функция, подготовка ее аргумента, число элементов или None -
+    # по длине аргумента)
+    stages = [
+        ('parse_price', lambda texts: [pt.parse_price(t) for t in texts], lambda: price_texts, None),
+        ('find_data_in_cell', lambda cs: [pt.find_data_in_cell(c) for c in cs],
+         lambda: get_table().find_all(['td', 'th']), None),
+        ('bs4_parse', lambda h: BeautifulSoup(h, 'html.parser'), lambda: html, size),
+        ('parse_lots_from_table', parse_lots_fresh, get_table, size),
+    ]
+    if pt.etree is not None:
+        stages.append(('extract_lxml', extract_lxml_fresh, lambda: html, size))
+    if pt.np is not None:
+        stages.append(('parse_prices_batch', pt.parse_prices_batch, lambda: price_texts, None))
+
+    lots = None
+    for stage, func, prepare, items in stages:
+        if stage in slow_stages:
+            records.append({'stage': stage, 'size': size, 'skipped': True})
+            continue
+        data = prepare()
+        if items is None:
+            items = len(data)
+        seconds, peak_mb, result = measure(func, data, memory=memory)
+        records.append(make_record(stage, size, items, seconds, peak_mb))
+        if stage == 'parse_lots_from_table':
+            lots = result
+        if seconds > args.time_limit:
+            slow_stages.add(stage)
+
+    # Этапы над готовым списком лотов
+    if lots is None:
+        lots = pt.extract_lots_from_html(html, pt.DEFAULT_ENGINE)
+    prices = sorted(lot['price'] for lot in lots)
+    low, high = prices[len(prices) // 4], prices[3 * len(prices) // 4]
+
+    list_stages = [
+        ('filter_lots_by_price', lambda ls: pt.filter_lots_by_price(ls, low, high)),
+        ('sort', lambda ls: pt.sort_lots(ls, 'price-desc')),
+        ('top_lots', lambda ls: pt.top_lots(ls, 50, 'price-desc')),
+        ('external_sort', lambda ls: list(pt.external_sort_lots(ls, 'price-desc', max(1, len(ls) // 8)))),
+        ('price_index_build', pt.create_price_index),
+        ('region_facets_build', pt.create_region_facets),
+    ]
+    if pt.np is not None:
+        list_stages += [
+            ('select_lots_by_price', lambda ls: pt.select_lots_by_price(pt.create_lot_columns(ls),
+                                                                        low, high, 'price-desc')),
+            ('region_price_stats', lambda ls: pt.get_region_price_stats(pt.create_lot_columns(ls))),
+        ]
+    for stage, func in list_stages:
+        seconds, peak_mb, result = measure(func, lots, memory=memory)
+        records.append(make_record(stage, size, len(lots), seconds, peak_mb))
+    
+    # Запросы к готовому индексу: 1000 диапазонов подряд
+    index = pt.create_price_index(lots)
+    bounds = [(prices[i], prices[-1 - i]) for i in range(0, len(prices) // 2, max(1, len(prices) // 2000))][:1000]
+    seconds, peak_mb, _ = measure(lambda b: [pt.count_in_price_range(index, lo, hi) for lo, hi in b],
+                                  bounds, memory=memory)
+    records.append(make_record('price_index_count', size, len(bounds), seconds, peak_mb))
+    seconds, peak_mb, _ = measure(lambda ix: pt.filter_price_index(ix, low, high), index, memory=memory)
+    records.append(make_record('filter_price_index', size, len(lots), seconds, peak_mb))
+
+    # Поиск по названиям: построение индекса и 100 запросов
+    seconds, peak_mb, search_index = measure(pt.create_search_index, lots, memory=memory)
+    records.append(make_record('search_index_build', size, len(lots), seconds, peak_mb))
+    queries = ['квартира', '"земельный участок"', 'нежилое помещение', 'кварт*', 'доля квартира'] * 20
+    seconds, peak_mb, _ = measure(lambda qs: [pt.search_lots(search_index, q, low, high) for q in qs],
+                                  queries, memory=memory)
+    records.append(make_record('search_lots', size, len(queries), seconds, peak_mb))
+
+    # Полный путь через локальный HTTP-сервер
+    if not args.no_fetch and 'fetch_crawl' not in slow_stages:
+        pages = generate_site_pages(size, args.seed)
+        server = start_fixture_server(pages)
+        url = f"http://127.0.0.1:{server.server_address[1]}{SERVER_LIST_PATH}"
+        try:
+            seconds, _, (page_count, lot_count) = measure(crawl_and_parse, url, args.workers,
+                                                          memory=False)
+        finally:
+            server.shutdown()
+            server.server_close()
+        records.append(make_record('fetch_crawl', size, lot_count, seconds, None,
+                                   pages=page_count,
+                                   bytes=sum(len(page) for page in pages),
+                                   pages_per_sec=round(page_count / seconds, 1)))
+        if seconds > args.time_limit:
+            slow_stages.add('fetch_crawl')
+
+    return records
+
+
+def bench_fixtures(args):
+    """
+    РАЗБОР СОХРАНЕННЫХ СТРАНИЦ TORGI.ORG ОБОИМИ ДВИЖКАМИ
+    ============================================
+
+    ВОЗВРАЩАЕТ:
+    - Список записей make_record() - по одной на файл и движок
+    """
+
+    records = []
+    engines = ['bs4'] + (['lxml'] if pt.etree is not None else [])
+
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            html = f.read()
+        name = os.path.basename(path)
+
+        for engine in engines:
+            def parse(h, engine=engine):
+                pt.COLUMN_MAP_CACHE.clear()
+                return pt.extract_lots_from_html(h, engine)
+
+            seconds, peak_mb, lots = measure(parse, html, memory=not args.no_memory)
+            records.append(make_record(f'fixture_{engine}', len(lots or []), len(lots or []),
+                                       seconds, peak_mb, fixture=name))
+
+    return records
+
+
+def record_fixtures(args):
+    """
+    СОХРАНЕНИЕ ЖИВЫХ СТРАНИЦ TORGI.ORG В bench_fixtures/
+    ============================================
+
+    Единственный режим, которому нужен интернет.
+    """
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    session = pt.create_session()
+    stamp = time.strftime('%Y%m%d')
+
+    if args.record_pages > 1:
+        pages = pt.crawl_listing_pages(session, args.record_url, max_pages=args.record_pages)
+    else:
+        pages = [(args.record_url, pt.fetch_page(session, args.record_url))]
+
+    for url, html in pages:
+        path = os.path.join(FIXTURES_DIR, f"torgi_{stamp}_p{pt.get_page_number(url) or 1}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        print(f"💾 Сохранено: {path}", file=sys.stderr)
+
+
+def compare_results(results, baseline_path, threshold):
+    """
+    СРАВНЕНИЕ С ПРОШЛЫМИ РЕЗУЛЬТАТАМИ
+    ============================================
+
+    Ухудшение - скорость этапа упала больше чем на threshold
+    (0.2 = на 20%) по сравнению с сохраненным файлом.
+
+    ВОЗВРАЩАЕТ:
+    - Список строк с описанием ухудшений (пустой - все в порядке)
+    """
+
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    def key(record):
+        return (record['stage'], record['size'], record.get('fixture'))
+
+    old = {key(r): r for r in baseline['results'] if not r.get('skipped')}
+    regressions = []
+
+    for record in results:
+        before = old.get(key(record))
+        if record.get('skipped') or not before:
+            continue
+        if not before.get('items_per_sec') or not record.get('items_per_sec'):
+            continue
+        ratio = record['items_per_sec'] / before['items_per_sec']
+        if ratio < 1 - threshold:
+            regressions.append(f"{record['stage']} [{record['size']}]: "
+                               f"{before['items_per_sec']:,.0f} → {record['items_per_sec']:,.0f} в сек "
+                               f"({(1 - ratio) * 100:.0f}% медленнее)")
+
+    return regressions
+
+
+def print_results(results):
+    """
+    ТАБЛИЦА РЕЗУЛЬТАТОВ (В ПОТОК ОШИБОК, ЧТОБЫ НЕ МЕШАТЬ JSON)
+    """
+
+    print(f"\n{'этап':<24}{'размер':>10}{'секунд':>12}{'в секунду':>16}{'пик, МБ':>12}", file=sys.stderr)
+    print("-" * 74, file=sys.stderr)
+    for r in results:
+        if r.get('skipped'):
+            print(f"{r['stage']:<24}{r['size']:>10}{'пропущен':>12}", file=sys.stderr)
+            continue
+        peak = f"{r['peak_mb']:.2f}" if r['peak_mb'] is not None else '-'
+        print(f"{r['stage']:<24}{r['size']:>10}{r['seconds']:>12.4f}"
+              f"{r['items_per_sec']:>16,.0f}{peak:>12}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+    """
+    РАЗБОР АРГУМЕНТОВ КОМАНДНОЙ СТРОКИ
+    """
+
+    parser = argparse.ArgumentParser(description="Замеры скорости парсера torgi.org")
+
+    parser.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                        help="размеры синтетических таблиц через запятую (по умолчанию 1000,10000)")
+    parser.add_argument('--seed', type=int, default=1,
+                        help="начальное значение генератора лотов")
+    parser.add_argument('--time-limit', type=float, default=DEFAULT_TIME_LIMIT,
+                        help="пропускать бОльшие размеры для этапа, работавшего дольше N секунд")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="потоков загрузки для этапа fetch_crawl")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="не замерять пиковую память (быстрее)")
+    parser.add_argument('--no-fetch', action='store_true',
+                        help="не запускать этап fetch_crawl")
+    parser.add_argument('--output', default='-',
+                        help="файл для результатов JSON ('-' - стандартный вывод)")
+    parser.add_argument('--compare', default=None,
+                        help="файл с прошлыми результатами: выйти с кодом 1 при замедлении")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="допустимое замедление для --compare (по умолчанию 0.2 = 20%%)")
+    parser.add_argument('--record', action='store_true',
+                        help="сохранить живые страницы torgi.org в bench_fixtures/ и выйти")
+    parser.add_argument('--record-url', default=pt.LIST_URL,
+                        help="адрес страницы для --record")
+    parser.add_argument('--record-pages', type=int, default=1,
+                        help="сколько страниц списка сохранить для --record")
+
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    ГЛАВНАЯ ФУНКЦИЯ: ЗАМЕРЫ, ВЫВОД И СРАВНЕНИЕ РЕЗУЛЬТАТОВ
+    """
+
+    args = parse_args()
+
+    if args.record:
+        record_fixtures(args)
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    results = bench_fixtures(args)
+    slow_stages = set()
+    for size in sizes:
+        print(f"⏱  Размер {size}...", file=sys.stderr)
+        results.extend(bench_size(size, args, slow_stages))
+
+    print_results(results)
+
+    report = {
+        'meta': {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'engine': pt.DEFAULT_ENGINE,
+            'sizes': sizes,
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        if regressions:
+            print("\n❌ ЗАМЕДЛЕНИЕ:", file=sys.stderr)
+            for line in regressions:
+                print(f"   {line}", file=sys.stderr)
+            return 1
+        print("\n✅ Замедлений нет", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
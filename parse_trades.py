@@ -26,6 +26,426 @@
 from bs4 import BeautifulSoup  # Для работы с HTML (парсинг)
 import requests                # Для отправки запросов к сайту
 import re                      # Для работы с регулярными выражениями
+import io                      # Для чтения строки как файла (потоковый разбор)
+import argparse                # Для разбора аргументов командной строки
+import threading               # Для блокировок при работе из нескольких потоков
+import time                    # Для пауз между запросами (ограничение частоты)
+import hashlib                 # Для хешей названий лотов
+import bisect                  # Для двоичного поиска в индексе цен
+import sqlite3                 # Для локального хранилища лотов
+import gzip                    # Для сжатия страниц в кеше
+import json                    # Для оглавления кеша и сохраненных лотов
+import os                      # Для работы с файлами и папками
+import mmap                    # Для чтения сохраненных страниц (--replay)
+import tarfile                 # Для архивов tar со страницами (--replay)
+import zipfile                 # Для архивов zip со страницами (--replay)
+import sys                     # Для стандартного вывода и потока ошибок
+import signal                  # Для остановки наблюдения по SIGTERM
+import csv                     # Для вывода в формате CSV
+import contextlib              # Для перенаправления сообщений в поток ошибок
+import http.server             # Для адреса /metrics (метрики Prometheus)
+import cProfile                # Для профилирования времени (--profile cprofile)
+import pstats                  # Для вывода результатов cProfile
+import tracemalloc             # Для профилирования памяти (--profile tracemalloc)
+import collections             # Для очереди страниц, ожидающих загрузки или разбора
+import heapq                   # Для очереди проверок в режиме --watch
+import random                  # Для случайного сдвига паузы в режиме --watch
+import itertools               # Для чтения лотов частями (--top, --external-sort)
+import pickle                  # Для временных файлов внешней сортировки
+import multiprocessing         # Для запуска процессов разбора (spawn)
+import tempfile                # Для временных файлов внешней сортировки
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.adapters import HTTPAdapter  # Пул соединений для requests
+from urllib3.util.retry import Retry       # Повторы запросов с паузой
+
+# lxml - быстрый парсер HTML на C (есть в requirements.txt).
+# Если он не установлен, программа работает через BeautifulSoup.
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# pyarrow нужен только для вывода в форматах Parquet и Arrow
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# numpy нужен только для обработки цен столбцом (--region-stats,
+# сортировка больших списков); без него все считается построчно
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# НАСТРОЙКИ ЗАГРУЗКИ
+# ============================================================
+# Адрес сайта и страница со списком лотов
+BASE_URL = "https://torgi.org"
+LIST_URL = "https://torgi.org/index.php?class=Auction&action=List&mod=Open&AuctionType=All"
+
+# Заголовки запроса: имитируем браузер
+REQUEST_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Сколько секунд ждать ответа от сервера
+REQUEST_TIMEOUT = 10
+
+# Параметры адреса, в которых обычно передается номер страницы
+PAGE_PARAM_NAMES = ('page', 'Page', 'p', 'PageNumber', 'pageNum', 'start', 'from', 'offset')
+
+# Движок разбора HTML: 'lxml' (быстрый) или 'bs4' (BeautifulSoup, прежний)
+DEFAULT_ENGINE = 'lxml' if etree is not None else 'bs4'
+
+
+# ШАБЛОНЫ РАСПОЗНАВАНИЯ ЯЧЕЕК
+# ============================================================
+# Регулярные выражения компилируются один раз при запуске программы.
+
+# Цена:
+# \d        - начинается с цифры
+# [\d\s.]*  - любые цифры, пробелы или точки
+# руб       - слово "руб" (re.I - без учета регистра)
+PRICE_PATTERN = re.compile(r'\d[\d\s.]*руб', re.I)
+
+# Дата формата ДД-ММ-ГГГГ
+DATE_PATTERN = re.compile(r'\d{2}-\d{2}-\d{4}')
+
+# Регион:
+# [А-Я][а-я]+     - заглавная буква, потом маленькие ("Московская")
+# \s*             - пробелы
+# (обл|край|респ|г\.) - "обл" ИЛИ "край" ИЛИ "респ" ИЛИ "г."
+REGION_PATTERN = re.compile(r'[А-Я][а-я]+\s*(обл|край|респ|г\.)')
+
+
+# МЕТРИКИ РАБОТЫ
+# ============================================================
+# Если запуск идет медленно или лотов меньше, чем ожидалось, метрики
+# показывают, на каком шаге это происходит: сколько длился каждый этап,
+# сколько строк отброшено и почему, сколько скачано байт и как долго
+# отвечал сервер. Метрики выводятся в текстовом формате Prometheus
+# (файл --metrics-file или адрес http://localhost:ПОРТ/metrics).
+#
+# Метрики собираются в одном словаре METRICS (как и COLUMN_MAP_CACHE,
+# он общий для всей программы). Счетчик хранится по ключу
+# (имя метрики, метки), например:
+#   ('torgi_rows_rejected_total', (('reason', 'few_cells'),)) → 12
+
+# Описание метрик: имя → (тип Prometheus, пояснение)
+METRIC_INFO = {
+    'torgi_stage_seconds_total': ('counter', 'Время работы этапа, секунды'),
+    'torgi_rows_seen_total': ('counter', 'Строк таблиц с лотами просмотрено'),
+    'torgi_rows_rejected_total': ('counter', 'Строк отброшено (по причинам)'),
+    'torgi_duplicates_skipped_total': ('counter', 'Повторяющихся лотов пропущено'),
+    'torgi_price_parse_failures_total': ('counter', 'Текстов цены, которые не удалось разобрать'),
+    'torgi_lots_total': ('counter', 'Лотов извлечено со страниц'),
+    'torgi_detail_parse_failures_total': ('counter', 'Страниц лотов, которые не удалось разобрать (--enrich)'),
+    'torgi_http_requests_total': ('counter', 'HTTP-запросов (по кодам ответа)'),
+    'torgi_http_bytes_downloaded_total': ('counter', 'Скачано байт (тела ответов)'),
+    'torgi_http_request_seconds': ('histogram', 'Время ответа сервера, секунды'),
+    'torgi_cache_events_total': ('counter', 'Обращений к кешу страниц (по результату)'),
+    'torgi_memory_peak_bytes': ('gauge', 'Пик памяти Python за запуск (--profile tracemalloc)'),
+    'torgi_watch_polls_total': ('counter', 'Проверок списка в режиме --watch (по итогу)'),
+    'torgi_watch_events_total': ('counter', 'Событий о новых лотах и ценах в режиме --watch'),
+    'torgi_sort_runs_total': ('counter', 'Отсортированных частей записано на диск (--external-sort)'),
+}
+
+# Границы корзин гистограммы времени ответа (секунды)
+HTTP_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def create_metrics():
+    """
+    ПУСТОЙ НАБОР МЕТРИК
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь: счетчики, гистограммы и блокировка
+      (метрики пишутся и из потоков загрузки)
+    """
+    
+    return {
+        'values': {},                # (имя, метки) → число
+        'histograms': {},            # (имя, метки) → {'buckets': [...], 'sum': ..., 'count': ...}
+        'lock': threading.Lock(),
+    }
+
+
+# Метрики текущего запуска
+METRICS = create_metrics()
+
+
+def count_metric(name, amount=1, **labels):
+    """
+    УВЕЛИЧЕНИЕ СЧЕТЧИКА
+    ============================================
+    
+    ПРИМЕР:
+    - count_metric('torgi_rows_rejected_total', reason='few_cells')
+    """
+    
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS['lock']:
+        METRICS['values'][key] = METRICS['values'].get(key, 0) + amount
+
+
+def set_metric(name, value, **labels):
+    """
+    ЗАПИСЬ ЗНАЧЕНИЯ ПОКАЗАТЕЛЯ (gauge)
+    """
+    
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS['lock']:
+        METRICS['values'][key] = value
+
+
+def observe_metric(name, value, **labels):
+    """
+    ДОБАВЛЕНИЕ ЗНАЧЕНИЯ В ГИСТОГРАММУ
+    ============================================
+    
+    Значение попадает в первую корзину, граница которой не меньше
+    значения (в формате Prometheus корзины выводятся накопительно).
+    """
+    
+    key = (name, tuple(sorted(labels.items())))
+    with METRICS['lock']:
+        histogram = METRICS['histograms'].get(key)
+        if histogram is None:
+            histogram = {'buckets': [0] * len(HTTP_LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            METRICS['histograms'][key] = histogram
+        for i, bound in enumerate(HTTP_LATENCY_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+@contextlib.contextmanager
+def measure_stage(stage):
+    """
+    ЗАМЕР ВРЕМЕНИ ЭТАПА
+    ============================================
+    
+    ПРИМЕР:
+        with measure_stage('fetch'):
+            pages = crawl_listing_pages(...)
+    """
+    
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        count_metric('torgi_stage_seconds_total', time.perf_counter() - start, stage=stage)
+
+
+def iter_measured(items, stage):
+    """
+    ЗАМЕР ВРЕМЕНИ ЭТАПА ДЛЯ ПОТОКА (ГЕНЕРАТОРА)
+    ============================================
+    
+    Учитывается только время получения очередного элемента, а не
+    время, которое следующие этапы тратят на его обработку.
+    """
+    
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            count_metric('torgi_stage_seconds_total', time.perf_counter() - start, stage=stage)
+            return
+        count_metric('torgi_stage_seconds_total', time.perf_counter() - start, stage=stage)
+        yield item
+
+
+def format_metric_labels(labels):
+    """
+    МЕТКИ В ФОРМАТЕ PROMETHEUS: (('stage', 'fetch'),) → '{stage="fetch"}'
+    """
+    
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_metrics():
+    """
+    ВСЕ МЕТРИКИ В ТЕКСТОВОМ ФОРМАТЕ PROMETHEUS
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Строку вида:
+        # HELP torgi_rows_seen_total Строк таблиц с лотами просмотрено
+        # TYPE torgi_rows_seen_total counter
+        torgi_rows_seen_total 120
+    """
+    
+    with METRICS['lock']:
+        values = sorted(METRICS['values'].items())
+        histograms = sorted((key, dict(h, buckets=list(h['buckets'])))
+                            for key, h in METRICS['histograms'].items())
+    
+    # Группируем строки по имени метрики (HELP/TYPE выводятся один раз)
+    lines_by_name = {}
+    for (name, labels), value in values:
+        lines_by_name.setdefault(name, []).append(f"{name}{format_metric_labels(labels)} {value:g}")
+    
+    for (name, labels), histogram in histograms:
+        lines = lines_by_name.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip(HTTP_LATENCY_BUCKETS, histogram['buckets']):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{name}_bucket{format_metric_labels(labels + (('le', '+Inf'),))} {histogram['count']}")
+        lines.append(f"{name}_sum{format_metric_labels(labels)} {histogram['sum']:g}")
+        lines.append(f"{name}_count{format_metric_labels(labels)} {histogram['count']}")
+    
+    output = []
+    for name, lines in lines_by_name.items():
+        kind, help_text = METRIC_INFO.get(name, ('untyped', name))
+        output.append(f"# HELP {name} {help_text}")
+        output.append(f"# TYPE {name} {kind}")
+        output.extend(lines)
+    
+    return '\n'.join(output) + '\n'
+
+
+def write_metrics_file(path):
+    """
+    ЗАПИСЬ МЕТРИК В ФАЙЛ
+    ============================================
+    
+    Файл сначала пишется под временным именем и потом переименовывается,
+    поэтому сборщик метрик (например, textfile collector у node_exporter)
+    никогда не прочитает его наполовину записанным.
+    """
+    
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(format_metrics())
+    os.replace(tmp_path, path)
+
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    ОБРАБОТЧИК ЗАПРОСОВ К АДРЕСУ /metrics
+    """
+    
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = format_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Запросы сборщика метрик не выводим
+        pass
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """
+    ЗАПУСК HTTP-СЕРВЕРА МЕТРИК В ФОНОВОМ ПОТОКЕ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Объект сервера (остановка - server.shutdown())
+    """
+    
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def print_metrics_summary():
+    """
+    КРАТКАЯ СВОДКА: ВРЕМЯ ЭТАПОВ И ОТБРОШЕННЫЕ СТРОКИ
+    """
+    
+    with METRICS['lock']:
+        values = dict(METRICS['values'])
+        histograms = dict(METRICS['histograms'])
+    
+    print("\n⏱  ЭТАПЫ:")
+    for (name, labels), value in values.items():
+        if name == 'torgi_stage_seconds_total':
+            print(f"   {dict(labels)['stage']:<10} {value:8.3f} сек")
+    
+    def total(name):
+        return sum(v for (n, _), v in values.items() if n == name)
+    
+    print(f"📊 Строк просмотрено: {total('torgi_rows_seen_total'):g}, "
+          f"лотов: {total('torgi_lots_total'):g}, "
+          f"повторов пропущено: {total('torgi_duplicates_skipped_total'):g}, "
+          f"цен не разобрано: {total('torgi_price_parse_failures_total'):g}")
+    for (name, labels), value in values.items():
+        if name == 'torgi_rows_rejected_total':
+            print(f"   отброшено ({dict(labels)['reason']}): {value:g}")
+    
+    requests_count = sum(h['count'] for h in histograms.values())
+    if requests_count:
+        seconds = sum(h['sum'] for h in histograms.values())
+        print(f"🌐 Запросов: {requests_count}, скачано: "
+              f"{total('torgi_http_bytes_downloaded_total') / 1024:.1f} КБ, "
+              f"среднее время ответа: {seconds / requests_count:.3f} сек")
+
+
+def run_with_profile(mode, output, func, *args):
+    """
+    ЗАПУСК ФУНКЦИИ ПОД ПРОФИЛИРОВЩИКОМ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - mode: 'cprofile'    - время по функциям (cProfile); полные данные
+                            сохраняются в файл output (смотреть: python -m pstats)
+            'tracemalloc' - память: пик и строки кода, выделившие больше всего
+            None          - без профилирования
+    - output: файл для данных cProfile
+    - func, args: что запустить
+    
+    ВОЗВРАЩАЕТ:
+    - То, что вернула func
+    """
+    
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args)
+        finally:
+            profiler.dump_stats(output)
+            print(f"\n🧪 ПРОФИЛЬ (cProfile), полные данные: {output}", file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(15)
+    
+    if mode == 'tracemalloc':
+        tracemalloc.start()
+        try:
+            return func(*args)
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            set_metric('torgi_memory_peak_bytes', peak)
+            print(f"\n🧪 ПАМЯТЬ (tracemalloc): пик {peak / (1024 * 1024):.1f} МБ", file=sys.stderr)
+            for stat in snapshot.statistics('lineno')[:10]:
+                print(f"   {stat}", file=sys.stderr)
+    
+    return func(*args)
 
 
 def parse_price(price_text):
@@ -74,13 +494,140 @@ def parse_price(price_text):
     
     # Пытаемся преобразовать строку в число
     try:
-        return float(clean) if clean else 0
+        if clean:
+            return float(clean)
     except:
         # Если преобразование не удалось (например, странный формат)
-        return 0
+        pass
+    
+    # Текст был, а числа в нем не нашлось
+    count_metric('torgi_price_parse_failures_total')
+    return 0
+
+
+def make_absolute_url(href):
+    """
+    ПРЕОБРАЗОВАНИЕ ОТНОСИТЕЛЬНОЙ ССЫЛКИ В АБСОЛЮТНУЮ
+    ============================================
+    
+    ПРИМЕРЫ:
+    - "/page.php" → "https://torgi.org/page.php"
+    - "?id=123" → "https://torgi.org/index.php?id=123"
+    - "index.php?id=123" → "https://torgi.org/index.php?id=123"
+    
+    ВОЗВРАЩАЕТ:
+    - Абсолютный адрес или None, если формат ссылки не распознан
+    """
+    
+    if href.startswith('/'):
+        # Ссылка начинается с / → добавляем домен
+        return 'https://torgi.org' + href
+    elif href.startswith('?'):
+        # Ссылка начинается с ? → параметры запроса
+        return 'https://torgi.org/index.php' + href
+    elif href.startswith('index.php'):
+        # Ссылка начинается с index.php
+        return 'https://torgi.org/' + href
+    return None
+
+
+def find_data_in_text(text):
+    """
+    АНАЛИЗ ТЕКСТА ОДНОЙ ЯЧЕЙКИ
+    ============================================
+    
+    Определяет, что записано в ячейке:
+    1. Это цена? (текст с "руб" и цифрами)
+    2. Это название лота? (длинный текст без даты)
+    3. Это регион? (короткий текст с "обл", "г.", "Респ")
+    
+    Работает только с текстом, поэтому подходит для любого
+    парсера HTML (BeautifulSoup или lxml). Ссылку на лот
+    ищут вызывающие функции - им доступна сама ячейка.
+    
+    ПАРАМЕТРЫ:
+    - text: текст ячейки без лишних пробелов
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь с найденными данными (или пустой словарь)
+    """
+    
+    # Словарь для хранения найденных данных
+    data = {}
+    
+    # 1. ПОИСК ЦЕНЫ (шаблон PRICE_PATTERN: цифры, потом "руб")
+    # ========================================
+    if PRICE_PATTERN.search(text):
+        data['price_text'] = text              # Сохраняем исходный текст
+        data['price'] = parse_price(text)      # Преобразуем в число
+    
+    # 2. ПОИСК НАЗВАНИЯ ЛОТА
+    # ========================================
+    # Название должно удовлетворять ТРЕМ условиям:
+    # 1. len(text) > 30         - длинный текст (скорее всего описание)
+    # 2. 'price_text' not in data - еще не нашли цену в этой ячейке
+    # 3. нет даты формата ДД-ММ-ГГГГ (шаблон DATE_PATTERN)
+    elif is_name_text(text):
+        data['name'] = text  # Сохраняем название
+    
+    # 3. ПОИСК РЕГИОНА
+    # ========================================
+    # Регион должен удовлетворять ДВУМ условиям:
+    # 1. len(text) < 30 - короткий текст
+    # 2. есть "Московская обл", "Алтайский край"... (шаблон REGION_PATTERN)
+    elif is_region_text(text):
+        data['region'] = text  # Сохраняем регион
+    
+    return data
+
+
+def is_name_text(text):
+    """
+    ПОХОЖ ЛИ ТЕКСТ (НЕ ЦЕНА) НА НАЗВАНИЕ ЛОТА?
+    ============================================
+    
+    Длинный текст (больше 30 символов) без даты ДД-ММ-ГГГГ.
+    """
+    
+    return len(text) > 30 and not DATE_PATTERN.search(text)
+
+
+def is_region_text(text):
+    """
+    ПОХОЖ ЛИ ТЕКСТ НА РЕГИОН?
+    ============================================
+    
+    Короткий текст (меньше 30 символов) с "обл", "край", "респ" или "г.".
+    Справочник регионов (find_region_code) здесь не используется: он
+    нужен только для группировки и отбора лотов по регионам.
+    """
+    
+    return len(text) < 30 and REGION_PATTERN.search(text) is not None
+
+
+def get_cell_text(cell):
+    """
+    ТЕКСТ ЯЧЕЙКИ BEAUTIFULSOUP БЕЗ ЛИШНИХ ПРОБЕЛОВ
+    """
+    
+    return cell.get_text(strip=True)
+
+
+def get_cell_link(cell):
+    """
+    АДРЕС ПЕРВОЙ ССЫЛКИ В ЯЧЕЙКЕ BEAUTIFULSOUP
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Значение href как есть или None, если ссылки нет
+    """
+    
+    # <a href="...">...</a> - тег ссылки в HTML
+    link = cell.find('a', href=True)
+    return link.get('href') if link else None
 
 
-def find_data_in_cell(cell):
+def find_data_in_cell(cell, get_text=get_cell_text, get_link=get_cell_link):
     """
     АНАЛИЗ ОДНОЙ ЯЧЕЙКИ ТАБЛИЦЫ
     ============================================
@@ -94,6 +641,8 @@ def find_data_in_cell(cell):
     
     ПАРАМЕТРЫ:
     - cell: объект BeautifulSoup с ячейкой таблицы (<td> или <th>)
+    - get_text, get_link: функции чтения текста и ссылки из ячейки
+      (по умолчанию для BeautifulSoup; для lxml - get_lxml_text и get_lxml_link)
     
     ВОЗВРАЩАЕТ:
     - Словарь с найденными данными, например:
@@ -103,283 +652,4845 @@ def find_data_in_cell(cell):
     """
     
     # Получаем текст из ячейки, удаляя лишние пробелы
-    text = cell.get_text(strip=True)
+    text = get_text(cell)
     
-    # Словарь для хранения найденных данных
-    data = {}
+    # Определяем, что записано в ячейке
+    data = find_data_in_text(text)
+    
+    # Для названия лота ищем ссылку внутри этой ячейки
+    if 'name' in data:
+        href = get_link(cell)
+        url = make_absolute_url(href) if href else None
+        if url:
+            data['link'] = url
+    
+    return data
+
+
+# ЛОТ
+# ============================================================
+# Лот хранится не в словаре, а в объекте Lot с __slots__: у такого
+# объекта нет собственного словаря атрибутов, и он занимает в несколько
+# раз меньше памяти - это заметно, когда лотов миллионы.
+#
+# Еще две экономии:
+# - одинаковые регионы (и организаторы) хранятся одной строкой на все
+#   лоты (sys.intern), а не отдельной копией в каждом лоте;
+# - текст цены хранится, только если его нельзя восстановить из числа
+#   ("2 662 880.00 руб." получается из 2662880.0 - такой текст не хранится).
+#
+# Для остального кода лот выглядит как словарь: lot['price'],
+# lot.get('area'), dict(lot), lot.update(...) работают как раньше.
+
+# Поля лота (порядок полей в CSV и при передаче между процессами)
+LOT_FIELDS = ('name', 'region', 'price', 'link', 'price_text')
+
+# Поля, значения которых часто повторяются у разных лотов
+LOT_INTERNED_FIELDS = ('region', 'organizer')
+
+
+def format_price_text(price):
+    """
+    ТЕКСТ ЦЕНЫ В ФОРМАТЕ САЙТА: 2662880.0 → "2 662 880.00 руб."
+    """
+    
+    return f"{price:,.2f}".replace(',', ' ') + " руб."
+
+
+class Lot:
+    """
+    ЛОТ - КОМПАКТНАЯ ЗАМЕНА СЛОВАРЯ
+    ============================================
+    
+    Основные поля (LOT_FIELDS) - атрибуты объекта, остальные поля
+    (данные со страницы лота, old_price) - в словаре extra, который
+    создается, только когда такое поле появилось.
     
-    # 1. ПОИСК ЦЕНЫ
+    ПРИМЕР:
+        lot = make_lot({'name': 'Квартира', 'region': 'Тверская обл.',
+                        'price': 590000.0, 'link': '', 'price_text': '590 000.00 руб.'})
+        lot['price']      → 590000.0
+        lot.price_text    → '590 000.00 руб.' (вычисляется из цены)
+        dict(lot)         → обычный словарь
+    """
+    
+    __slots__ = ('name', 'region', 'price', 'link', 'raw_price_text', 'extra')
+    
+    def __init__(self, name='', region='', price=0, link='', price_text='', extra=None):
+        self.name = name
+        self.region = sys.intern(region) if region else region
+        self.price = price
+        self.link = link
+        # None - текст цены совпадает с format_price_text(price)
+        self.raw_price_text = None if price_text == format_price_text(price) else price_text
+        self.extra = extra
+    
+    @property
+    def price_text(self):
+        if self.raw_price_text is None:
+            return format_price_text(self.price)
+        return self.raw_price_text
+    
+    # ДОСТУП КАК К СЛОВАРЮ
     # ========================================
-    # Регулярное выражение ищет:
-    # \d        - начинается с цифры
-    # [\d\s.]*  - любые цифры, пробелы или точки
-    # руб       - слово "руб" (ре.И - без учета регистра)
-    if re.search(r'\d[\d\s.]*руб', text, re.I):
-        data['price_text'] = text              # Сохраняем исходный текст
-        data['price'] = parse_price(text)      # Преобразуем в число
+    def __getitem__(self, key):
+        if key in LOT_FIELDS:
+            return getattr(self, key)
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+    
+    def __setitem__(self, key, value):
+        if key == 'price_text':
+            self.raw_price_text = None if value == format_price_text(self.price) else value
+        elif key in LOT_FIELDS:
+            if key == 'region' and value:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if key in LOT_INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+    
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+    
+    def keys(self):
+        if self.extra is None:
+            return list(LOT_FIELDS)
+        return list(LOT_FIELDS) + list(self.extra)
+    
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+    
+    def update(self, other=(), **fields):
+        for key, value in dict(other, **fields).items():
+            self[key] = value
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(LOT_FIELDS) + (len(self.extra) if self.extra else 0)
+    
+    def __contains__(self, key):
+        return key in LOT_FIELDS or (self.extra is not None and key in self.extra)
+    
+    def __eq__(self, other):
+        if isinstance(other, (Lot, dict)):
+            return dict(self) == dict(other)
+        return NotImplemented
+    
+    # Лот изменяемый, поэтому ключом словаря или элементом множества быть не может
+    __hash__ = None
+    
+    def __repr__(self):
+        return f"Lot({dict(self)!r})"
+
+
+def make_lot(data):
+    """
+    ЛОТ ИЗ СЛОВАРЯ (например, из merge_cell_data или из кеша)
+    """
+    
+    lot = Lot(data['name'], data['region'], data['price'], data['link'], data['price_text'])
+    for key, value in data.items():
+        if key not in LOT_FIELDS:
+            lot[key] = value
+    return lot
+
+
+def merge_cell_data(found_cells):
+    """
+    СБОРКА ОДНОГО ЛОТА ИЗ ДАННЫХ ЯЧЕЕК СТРОКИ
+    ============================================
+    
+    Объединяет словари, найденные в ячейках строки
+    (результаты find_data_in_cell), в один словарь лота.
+    
+    ПАРАМЕТРЫ:
+    - found_cells: список словарей - по одному на ячейку
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь лота (поля могут остаться пустыми)
+    """
+    
+    # Словарь для хранения данных текущего лота
+    # Все поля инициализируем пустыми значениями
+    lot_data = {
+        'name': '',       # Название лота
+        'region': '',     # Регион
+        'price': 0,       # Цена как число
+        'link': '',       # Ссылка на лот
+        'price_text': ''  # Исходный текст цены
+    }
+    
+    for found in found_cells:
+        # Обновляем словарь lot_data найденными данными
+        for key in found:
+            if key == 'price' and found[key] > 0:
+                # Для цены сохраняем только если > 0
+                lot_data[key] = found[key]
+            elif key != 'price':
+                # Для остальных полей сохраняем как есть
+                lot_data[key] = found[key]
+    
+    return lot_data
+
+
+# ПОВТОРЯЮЩИЕСЯ ЛОТЫ
+# ============================================================
+# Один и тот же лот может встретиться дважды: в одной таблице,
+# на двух соседних страницах (если список сдвинулся во время обхода)
+# или в прошлом запуске. Лот узнается по "личности" (identity):
+# - номер лота (OID) из ссылки - он на сайте уникален;
+# - если ссылки нет - хеш названия, региона и цены (после приведения
+#   к нижнему регистру и удаления лишних пробелов).
+# Лоты с одинаковым названием, но разными номерами - разные лоты.
+#
+# Проверка "уже встречался?" занимает одно обращение к множеству (set),
+# как бы много лотов ни было.
+
+# Номер лота и раздел сайта в адресе ссылки:
+# ...?class=ArrestAuction&action=View&OID=169159
+# (регулярное выражение в разы быстрее полного разбора адреса,
+# а функция вызывается для каждой строки таблицы)
+LOT_ID_PATTERN = re.compile(r'[?&](?:OID|oid|id|ID|lotId)=(\d+)(?:&|#|$)')
+LOT_CLASS_PATTERN = re.compile(r'[?&]class=([^&#]*)')
+
+# Сколько хеш-функций у фильтра Блума (--bloom-mb)
+BLOOM_HASH_COUNT = 7
+
+
+def get_lot_identity(lot):
+    """
+    "ЛИЧНОСТЬ" ЛОТА - КЛЮЧ ДЛЯ ПОИСКА ПОВТОРОВ
+    ============================================
+    
+    ПРИМЕРЫ:
+    - ссылка ...?class=ArrestAuction&action=View&OID=169159
+      → 'oid:ArrestAuction:169159'
+    - ссылка без номера → 'link:' + адрес
+    - без ссылки → 'hash:' + SHA-1 от "название|регион|цена"
+    """
+    
+    link = lot['link']
+    if link:
+        match = LOT_ID_PATTERN.search(link)
+        if match:
+            section = LOT_CLASS_PATTERN.search(link)
+            return f"oid:{section.group(1) if section else ''}:{match.group(1)}"
+        return 'link:' + normalize_url(link)
+    
+    name = ' '.join(lot['name'].lower().replace('ё', 'е').split())
+    region = ' '.join(lot['region'].lower().split())
+    text = f"{name}|{region}|{lot['price']:.2f}"
+    return 'hash:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def create_bloom_filter(size_bytes, hash_count=BLOOM_HASH_COUNT):
+    """
+    ФИЛЬТР БЛУМА - КОМПАКТНОЕ "ПРИБЛИЗИТЕЛЬНОЕ МНОЖЕСТВО"
+    ============================================
+    
+    Занимает ровно size_bytes памяти, сколько бы ключей в нем ни было.
+    Ответ "ключа нет" всегда верен, ответ "ключ есть" иногда ошибочен
+    (тем чаще, чем больше ключей на байт), поэтому "есть" нужно
+    перепроверять по точному хранилищу.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь: биты (bytearray), их число и число хеш-функций
+    """
+    
+    size_bytes = max(1, int(size_bytes))
+    return {'bits': bytearray(size_bytes), 'size': size_bytes * 8, 'hash_count': hash_count}
+
+
+def get_bloom_positions(bloom, key):
+    """
+    НОМЕРА БИТОВ КЛЮЧА В ФИЛЬТРЕ БЛУМА
+    
+    Из одного хеша получаются все hash_count номеров:
+    h1, h1 + h2, h1 + 2*h2, ... (двойное хеширование).
+    """
+    
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % bloom['size'] for i in range(bloom['hash_count'])]
+
+
+def bloom_add(bloom, key):
+    """
+    ДОБАВЛЕНИЕ КЛЮЧА В ФИЛЬТР БЛУМА
+    """
+    
+    bits = bloom['bits']
+    for position in get_bloom_positions(bloom, key):
+        bits[position >> 3] |= 1 << (position & 7)
+
+
+def bloom_may_contain(bloom, key):
+    """
+    ПРОВЕРКА КЛЮЧА В ФИЛЬТРЕ БЛУМА
+    
+    ВОЗВРАЩАЕТ:
+    - False - ключа точно нет; True - ключ, возможно, есть
+    """
+    
+    bits = bloom['bits']
+    return all(bits[position >> 3] & (1 << (position & 7))
+               for position in get_bloom_positions(bloom, key))
+
+
+def create_lot_deduper(path=None, bloom_bytes=None):
+    """
+    ПРОВЕРКА ПОВТОРОВ ДЛЯ ВСЕГО ОБХОДА (И МЕЖДУ ЗАПУСКАМИ)
+    ============================================
+    
+    Без path "личности" лотов хранятся в памяти (множество set).
+    
+    С path они хранятся в файле SQLite (таблица seen_lots), поэтому
+    лоты, выданные в прошлых запусках, тоже считаются повторами.
+    В памяти при этом может быть только фильтр Блума размером
+    bloom_bytes: в базу заглядываем, лишь когда фильтр ответил
+    "возможно, есть" - для новых лотов это почти никогда.
+    
+    ПАРАМЕТРЫ:
+    - path: файл SQLite (или None - только в памяти)
+    - bloom_bytes: размер фильтра Блума в байтах (или None - без фильтра);
+      используется вместе с path
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь; проверка - is_duplicate_lot(), закрытие - close_lot_deduper()
+    """
+    
+    deduper = {'seen': None, 'conn': None, 'bloom': None, 'run': time.time()}
+    
+    if path is None:
+        deduper['seen'] = set()
+        return deduper
+    
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS seen_lots (
+            identity TEXT PRIMARY KEY,
+            run      REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    deduper['conn'] = conn
+    
+    if bloom_bytes:
+        # Заполняем фильтр ключами прошлых запусков (база читается потоком)
+        bloom = create_bloom_filter(bloom_bytes)
+        for (identity,) in conn.execute('SELECT identity FROM seen_lots'):
+            bloom_add(bloom, identity)
+        deduper['bloom'] = bloom
+    
+    return deduper
+
+
+def is_duplicate_lot(deduper, lot):
+    """
+    ВСТРЕЧАЛСЯ ЛИ ЛОТ РАНЬШЕ?
+    ============================================
+    
+    Новый лот запоминается, поэтому повторный вызов для него вернет повтор.
+    
+    ВОЗВРАЩАЕТ:
+    - None  - лот новый
+    - 'run' - лот уже был в этом запуске
+    - 'seen' - лот был в одном из прошлых запусков (только с файлом SQLite)
+    """
+    
+    identity = get_lot_identity(lot)
+    
+    seen = deduper['seen']
+    if seen is not None:
+        if identity in seen:
+            return 'run'
+        seen.add(identity)
+        return None
+    
+    bloom = deduper['bloom']
+    conn = deduper['conn']
+    if bloom is None or bloom_may_contain(bloom, identity):
+        row = conn.execute('SELECT run FROM seen_lots WHERE identity = ?', (identity,)).fetchone()
+        if row is not None:
+            return 'run' if row[0] == deduper['run'] else 'seen'
+    
+    conn.execute('INSERT INTO seen_lots (identity, run) VALUES (?, ?)', (identity, deduper['run']))
+    if bloom is not None:
+        bloom_add(bloom, identity)
+    return None
+
+
+def reset_lot_deduper(deduper):
+    """
+    НАЧАЛО НОВОГО ОБХОДА (НОВОГО СНИМКА ПРИ --replay)
+    ============================================
+    
+    Лоты, встреченные до этого, больше не считаются повторами "этого
+    запуска". С файлом SQLite они остаются в нем и считаются лотами
+    прошлых запусков - как и при следующем запуске программы.
+    """
+    
+    if deduper['seen'] is not None:
+        deduper['seen'] = set()
+    else:
+        deduper['run'] = max(time.time(), deduper['run'] + 1)
+
+
+def close_lot_deduper(deduper):
+    """
+    СОХРАНЕНИЕ И ЗАКРЫТИЕ ПРОВЕРКИ ПОВТОРОВ
+    """
+    
+    if deduper['conn'] is not None:
+        deduper['conn'].commit()
+        deduper['conn'].close()
+
+
+def add_lot(lots, lot_data, seen):
+    """
+    ДОБАВЛЕНИЕ ЛОТА В СПИСОК (С ПРОВЕРКАМИ)
+    ============================================
+    
+    Лот добавляется, только если у него есть название, цена > 0
+    и в списке еще нет этого же лота (см. get_lot_identity).
+    
+    ПАРАМЕТРЫ:
+    - lots: список лотов таблицы
+    - lot_data: словарь лота
+    - seen: множество "личностей" лотов, уже добавленных в lots
+    
+    ВОЗВРАЩАЕТ:
+    - True, если лот добавлен
+    """
+    
+    # ПРОВЕРКА: ЕСТЬ ЛИ ДОСТАТОЧНО ДАННЫХ ДЛЯ СОХРАНЕНИЯ ЛОТА?
+    # ========================================
+    # Для сохранения лота нужно:
+    # 1. lot_data['name'] не пустой (есть название)
+    # 2. lot_data['price'] > 0 (цена положительная)
+    if not lot_data['name']:
+        count_metric('torgi_rows_rejected_total', reason='no_name')
+        return False
+    if not lot_data['price'] > 0:
+        count_metric('torgi_rows_rejected_total', reason='no_price')
+        return False
+    
+    # ПРОВЕРКА НА ДУБЛИКАТЫ
+    # ========================================
+    # Поиск в множестве (set) не зависит от размера списка lots:
+    # "Есть ли уже этот лот?" - одна проверка, а не перебор всех лотов
+    identity = get_lot_identity(lot_data)
+    if identity in seen:
+        count_metric('torgi_duplicates_skipped_total', scope='page')
+        return False
+    seen.add(identity)
+    
+    # Добавляем лот в список (компактным объектом Lot)
+    # (вывод на экран - дело приемников, см. open_sink)
+    lots.append(make_lot(lot_data))
+    return True
+
+
+# СХЕМА КОЛОНОК ТАБЛИЦЫ
+# ============================================================
+# Угадывать по каждой ячейке, что в ней (до трех регулярных выражений
+# на ячейку), дорого и иногда ошибочно. Поэтому для таблицы один раз
+# определяется схема: в какой колонке название, в какой цена и регион.
+# Схема берется из строки заголовков или из первых строк с лотами,
+# проверяется на этих строках и запоминается по "подписи" таблицы.
+# Следующие строки (и следующие страницы с такой же таблицей) читаются
+# сразу по номерам колонок. Если строка не подходит под схему
+# или в ней пусто поле, которое было во всех строках образца (регион,
+# ссылка), для нее работает прежний поиск по всем ячейкам.
+#
+# Подпись таблицы с заголовками - тексты заголовков. У таблицы без
+# заголовков подпись - "рисунок" первой строки с лотом: какие поля
+# нашлись в каждой ячейке. Одного числа колонок мало: у разных таблиц
+# с тем же числом колонок название и цена могут стоять в других местах.
+# Готовая схема из кеша вдобавок проверяется на этой первой строке.
+
+# Запомненные схемы: подпись таблицы → схема колонок
+COLUMN_MAP_CACHE = {}
+
+# Сколько строк с лотами разобрать по-старому, чтобы вывести и проверить схему
+COLUMN_MAP_SAMPLE_ROWS = 5
+
+# Слова в заголовках колонок (в нижнем регистре)
+COLUMN_HEADER_KEYWORDS = {
+    'price': ('цена', 'стоимость'),
+    'region': ('регион', 'субъект', 'местонахождение'),
+    'name': ('наименование', 'название', 'предмет', 'описание'),
+}
+
+# Какие поля лота дает колонка каждого типа
+COLUMN_ROLE_KEYS = {
+    'name': ('name', 'link'),
+    'price': ('price_text', 'price'),
+    'region': ('region',),
+}
+
+
+def convert_price_cell(text):
+    """
+    ЧТЕНИЕ КОЛОНКИ С ЦЕНОЙ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - {'price_text': ..., 'price': ...} или None, если это не цена
+    """
+    
+    if not PRICE_PATTERN.search(text):
+        return None
+    price = parse_price(text)
+    if price <= 0:
+        return None
+    return {'price_text': text, 'price': price}
+
+
+def convert_name_cell(text):
+    """
+    ЧТЕНИЕ КОЛОНКИ С НАЗВАНИЕМ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - {'name': ...} или None, если текст не похож на название
+    """
+    
+    if PRICE_PATTERN.search(text) or not is_name_text(text):
+        return None
+    return {'name': text}
+
+
+def convert_region_cell(text):
+    """
+    ЧТЕНИЕ КОЛОНКИ С РЕГИОНОМ
+    ============================================
+    
+    Регион необязателен: если в ячейке не регион, возвращается {}.
+    """
+    
+    if is_region_text(text) and not PRICE_PATTERN.search(text):
+        return {'region': text}
+    return {}
+
+
+# Функция чтения для каждого типа колонки
+COLUMN_CONVERTERS = {
+    'name': convert_name_cell,
+    'price': convert_price_cell,
+    'region': convert_region_cell,
+}
+
+
+def detect_columns_from_header(header_texts):
+    """
+    СХЕМА КОЛОНОК ПО СТРОКЕ ЗАГОЛОВКОВ
+    ============================================
+    
+    Ищет в заголовках слова из COLUMN_HEADER_KEYWORDS:
+    "Начальная цена" → колонка с ценой, "Наименование" → название и т.д.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь {тип колонки: номер} или None, если не нашлись
+      колонки с названием и ценой
+    """
+    
+    roles = {}
+    
+    for index, text in enumerate(header_texts):
+        text = text.lower()
+        for role, keywords in COLUMN_HEADER_KEYWORDS.items():
+            if role not in roles and any(word in text for word in keywords):
+                roles[role] = index
+                break  # одна колонка - один тип
+    
+    if 'name' not in roles or 'price' not in roles:
+        return None
+    return roles
+
+
+def infer_columns_from_sample(sample):
+    """
+    СХЕМА КОЛОНОК ПО ПЕРВЫМ СТРОКАМ С ЛОТАМИ
+    ============================================
+    
+    Для каждого типа данных считает, в какой колонке его чаще всего
+    находил find_data_in_cell(). При равенстве берется колонка правее:
+    при старом поиске по ячейкам правая находка перезаписывает левую.
+    
+    ПАРАМЕТРЫ:
+    - sample: список строк; строка - список словарей find_data_in_cell()
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь {тип колонки: номер} или None
+    """
+    
+    roles = {}
+    
+    for role in COLUMN_ROLE_KEYS:
+        key = COLUMN_ROLE_KEYS[role][0]
+        
+        # Сколько раз данные этого типа встретились в каждой колонке
+        counts = {}
+        for found_cells in sample:
+            for index, found in enumerate(found_cells):
+                if key in found:
+                    counts[index] = counts.get(index, 0) + 1
+        
+        if counts:
+            index = max(counts, key=lambda i: (counts[i], i))
+            # Регион необязателен, но должен встречаться хотя бы в половине строк
+            if role != 'region' or counts[index] * 2 >= len(sample):
+                roles[role] = index
+    
+    if 'name' not in roles or 'price' not in roles:
+        return None
+    return roles
+
+
+def validate_column_map(roles, sample):
+    """
+    ПРОВЕРКА СХЕМЫ КОЛОНОК НА ПЕРВЫХ СТРОКАХ
+    ============================================
+    
+    Схема подходит, если для КАЖДОЙ строки образца чтение по номерам
+    колонок дает тот же лот, что и прежний поиск по всем ячейкам.
+    """
+    
+    for found_cells in sample:
+        if max(roles.values()) >= len(found_cells):
+            return False
+        
+        # Оставляем из каждой колонки только поля ее типа
+        parts = []
+        for role, index in roles.items():
+            found = found_cells[index]
+            parts.append({key: found[key] for key in COLUMN_ROLE_KEYS[role] if key in found})
+        
+        if merge_cell_data(parts) != merge_cell_data(found_cells):
+            return False
+    
+    return True
+
+
+def choose_column_map(header_texts, sample, columns):
+    """
+    ВЫБОР СХЕМЫ КОЛОНОК ДЛЯ ТАБЛИЦЫ
+    ============================================
+    
+    Сначала пробует схему по заголовкам, потом по первым строкам.
+    
+    ПАРАМЕТРЫ:
+    - header_texts: тексты строки заголовков (или None)
+    - sample: первые строки с лотами (см. infer_columns_from_sample)
+    - columns: сколько ячеек в строке с лотом
+    
+    ВОЗВРАЩАЕТ:
+    - Схема {'columns': ..., 'roles': {...}, 'required': (...)} или None,
+      если ни одна схема не прошла проверку. 'required' - необязательные
+      поля ('link', 'region'), которые были во всех строках образца
+    """
+    
+    candidates = []
+    if header_texts:
+        candidates.append(detect_columns_from_header(header_texts))
+    candidates.append(infer_columns_from_sample(sample))
+    
+    for roles in candidates:
+        if roles and validate_column_map(roles, sample):
+            merged = [merge_cell_data(found_cells) for found_cells in sample]
+            required = tuple(key for key in ('link', 'region')
+                             if all(lot_data[key] for lot_data in merged))
+            return {'columns': columns, 'roles': roles, 'required': required}
+    return None
+
+
+def decode_row_by_map(cells, column_map, get_text=get_cell_text, get_link=get_cell_link):
+    """
+    ЧТЕНИЕ СТРОКИ ПО СХЕМЕ КОЛОНОК
+    ============================================
+    
+    Читает только нужные ячейки (по номерам из схемы) и превращает
+    их в поля лота функциями из COLUMN_CONVERTERS.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь лота или None, если строка не подходит под схему
+      или в ней пусто поле из column_map['required'] (тогда ее нужно
+      разобрать прежним способом: поле может найтись в другой ячейке)
+    """
+    
+    parts = []
+    required = column_map['required']
+    
+    for role, index in column_map['roles'].items():
+        cell = cells[index]
+        found = COLUMN_CONVERTERS[role](get_text(cell))
+        if found is None:
+            return None
+        
+        if role == 'name':
+            href = get_link(cell)
+            url = make_absolute_url(href) if href else None
+            if url:
+                found['link'] = url
+            elif 'link' in required:
+                return None
+        elif not found and role in required:
+            return None
+        
+        parts.append(found)
+    
+    return merge_cell_data(parts)
+
+
+def parse_lot_rows(rows, get_text=get_cell_text, get_link=get_cell_link):
+    """
+    ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ СТРОК ТАБЛИЦЫ
+    ============================================
+    
+    Общая часть для BeautifulSoup и lxml.
+    
+    АЛГОРИТМ:
+    1. Строки, где меньше 6 ячеек, пропускаются
+    2. Первая строка без цены считается строкой заголовков
+    3. Первые строки с лотами разбираются по всем ячейкам
+       (find_data_in_cell) - по ним выводится схема колонок
+    4. Остальные строки читаются по схеме (decode_row_by_map);
+       строка, не подходящая под схему, разбирается по всем ячейкам
+    
+    ПАРАМЕТРЫ:
+    - rows: строки таблицы; каждая строка - список ячеек
+    - get_text, get_link: функции чтения текста и ссылки из ячейки
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов (Lot), каждый лот можно читать как словарь
+    """
+    
+    # Список для хранения найденных лотов
+    lots = []
+    
+    signature = None      # подпись таблицы (ключ в COLUMN_MAP_CACHE)
+    header_texts = None   # тексты строки заголовков
+    column_map = None     # схема колонок
+    sample = []           # первые строки с лотами для вывода схемы
+    seen_ids = set()      # "личности" добавленных лотов (см. add_lot)
+    decoded = 0           # строк прочитано по схеме
+    failed = 0            # строк, не подошедших под схему
+    seen = 0              # строк просмотрено (для метрик)
+    short = 0             # строк с малым количеством ячеек (для метрик)
+    
+    for cells in rows:
+        seen += 1
+        
+        # Пропускаем строки с малым количеством ячеек
+        # (это могут быть пустые строкы или заголовки)
+        if len(cells) < 6:
+            short += 1
+            continue
+        
+        # 1. БЫСТРЫЙ ПУТЬ: ЧТЕНИЕ ПО СХЕМЕ
+        # ========================================
+        if column_map is not None and len(cells) == column_map['columns']:
+            lot_data = decode_row_by_map(cells, column_map, get_text, get_link)
+            if lot_data is not None:
+                decoded += 1
+                add_lot(lots, lot_data, seen_ids)
+                continue
+            
+            # Если под схему не подходит большинство строк - она неверна
+            failed += 1
+            if failed >= COLUMN_MAP_SAMPLE_ROWS and failed > decoded:
+                COLUMN_MAP_CACHE.pop(signature, None)
+                column_map = None
+        
+        # 2. ПРЕЖНИЙ ПУТЬ: АНАЛИЗ КАЖДОЙ ЯЧЕЙКИ
+        # ========================================
+        found_cells = [find_data_in_cell(cell, get_text, get_link) for cell in cells]
+        lot_data = merge_cell_data(found_cells)
+        add_lot(lots, lot_data, seen_ids)
+        
+        # 3. ОПРЕДЕЛЕНИЕ СХЕМЫ КОЛОНОК
+        # ========================================
+        if signature is None:
+            # Первая строка без цены - это строка заголовков
+            if not any('price' in found for found in found_cells):
+                header_texts = [get_text(cell) for cell in cells]
+                signature = ('header', tuple(header_texts))
+            else:
+                signature = ('cells', tuple(tuple(sorted(found)) for found in found_cells))
+            
+            # Такая таблица уже встречалась - берем готовую схему
+            # (без заголовков - если она верна и для этой строки)
+            column_map = COLUMN_MAP_CACHE.get(signature)
+            if header_texts is not None:
+                continue
+            if column_map is not None and not validate_column_map(column_map['roles'], [found_cells]):
+                column_map = None
+        
+        # Пока схемы нет - копим строки с лотами для ее вывода
+        if column_map is None and decoded + failed == 0 and lot_data['name'] and lot_data['price'] > 0:
+            sample.append(found_cells)
+            if len(sample) == COLUMN_MAP_SAMPLE_ROWS:
+                column_map = choose_column_map(header_texts, sample, len(cells))
+                if column_map is not None:
+                    COLUMN_MAP_CACHE[signature] = column_map
+    
+    # Счетчики строк обновляются один раз на таблицу, а не на каждую строку
+    count_metric('torgi_rows_seen_total', seen)
+    count_metric('torgi_rows_rejected_total', short, reason='few_cells')
+    
+    return lots
+
+
+def parse_lots_from_table(table):
+    """
+    ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ ТАБЛИЦЫ
+    ============================================
+    
+    Эта функция проходит по ВСЕМ строкам таблицы и извлекает данные о лотах.
+    
+    АЛГОРИТМ:
+    1. Для каждой строки (<tr>) в таблице
+    2. Найти все ячейки (<td> или <th>)
+    3. Если ячеек достаточно (больше 5) - это строка с лотом
+    4. Прочитать ячейки по схеме колонок или проанализировать
+       каждую ячейку с помощью find_data_in_cell()
+    5. Собрать все данные в один словарь
+    6. Если есть название и цена > 0 - сохранить лот
+    
+    ПАРАМЕТРЫ:
+    - table: объект BeautifulSoup с таблицей (<table>)
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов (Lot), каждый лот можно читать как словарь
+    """
+    
+    # <tr> = table row (строка таблицы)
+    # <td> = table data (данные таблицы)
+    # <th> = table header (заголовок таблицы)
+    rows = (row.find_all(['td', 'th']) for row in table.find_all('tr'))
+    
+    return parse_lot_rows(rows)
+
+
+# БЫСТРЫЙ РАЗБОР ЧЕРЕЗ LXML
+# ============================================================
+# BeautifulSoup с 'html.parser' написан на чистом Python и строит дерево
+# ВСЕЙ страницы. lxml разбирает HTML на C, а iterparse позволяет
+# обрабатывать строки таблицы по мере разбора и остановиться сразу
+# после таблицы с лотами - остаток страницы даже не читается.
+
+# Теги, текст которых BeautifulSoup не включает в get_text()
+LXML_SKIP_TEXT_TAGS = ('script', 'style', 'template')
+
+
+def get_lxml_text(element, separator=''):
+    """
+    ТЕКСТ ЭЛЕМЕНТА LXML (КАК get_text(separator, strip=True) В BEAUTIFULSOUP)
+    ============================================
+    
+    Собирает все куски текста внутри элемента, обрезает пробелы
+    у каждого куска и склеивает непустые куски через separator
+    (по умолчанию - без разделителя).
+    Текст комментариев, <script> и <style> пропускается.
+    """
+    
+    parts = []
+    
+    def collect(node):
+        # У комментариев tag - это функция, а не строка
+        if isinstance(node.tag, str) and node.tag not in LXML_SKIP_TEXT_TAGS:
+            if node.text:
+                parts.append(node.text)
+            for child in node:
+                collect(child)
+                # tail - текст ПОСЛЕ закрывающего тега ребенка
+                if child.tail:
+                    parts.append(child.tail)
+    
+    collect(element)
+    return separator.join(part for part in (part.strip() for part in parts) if part)
+
+
+def get_lxml_link(cell):
+    """
+    АДРЕС ПЕРВОЙ ССЫЛКИ В ЯЧЕЙКЕ LXML (КАК cell.find('a', href=True))
+    """
+    
+    for link in cell.iter('a'):
+        href = link.get('href')
+        if href is not None:
+            return href
+    return None
+
+
+def is_nested_row(row, table):
+    """
+    ПРОВЕРКА: ЛЕЖИТ ЛИ СТРОКА ВНУТРИ ДРУГОЙ СТРОКИ ТАБЛИЦЫ?
+    ============================================
+    
+    Поднимается от строки row вверх до таблицы table и ищет
+    по дороге другой тег <tr>.
+    """
+    
+    for ancestor in row.iterancestors():
+        if ancestor is table:
+            return False
+        if ancestor.tag == 'tr':
+            return True
+    return False
+
+
+def iter_lot_table_rows_lxml(html, table_info=None):
+    """
+    ПОТОКОВОЕ ЧТЕНИЕ СТРОК ТАБЛИЦЫ С ЛОТАМИ ЧЕРЕЗ LXML
+    ============================================
+    
+    Разбирает HTML по кусочкам (iterparse) и выдает строки
+    ВТОРОЙ таблицы страницы сразу, как только строка разобрана.
+    Как только таблица закончилась, разбор останавливается.
+    
+    Строки выдаются в том же порядке и с теми же ячейками, что и
+    table.find_all('tr') / row.find_all(['td', 'th']) в BeautifulSoup
+    (включая строки вложенных таблиц).
+    
+    ПАРАМЕТРЫ:
+    - html: HTML-код страницы (строка)
+    - table_info: словарь (или None); в него записывается
+      table_info['found'] = True, если таблица с лотами найдена
+    
+    ВЫДАЕТ (yield):
+    - Список ячеек (<td>/<th>) одной строки
+    """
+    
+    source = io.BytesIO(html.encode('utf-8'))
+    events = etree.iterparse(source, events=('start', 'end'),
+                             html=True, encoding='utf-8')
+    
+    tables_seen = 0   # сколько таблиц уже начиналось
+    target = None     # элемент таблицы с лотами
+    
+    for event, element in events:
+        
+        if event == 'start':
+            if element.tag == 'table':
+                tables_seen += 1
+                if tables_seen == 2:
+                    target = element
+                    if table_info is not None:
+                        table_info['found'] = True
+            continue
+        
+        # Дальше только события 'end' (элемент разобран полностью)
+        if target is None:
+            continue
+        
+        if element is target:
+            # Таблица с лотами закончилась - дальше читать не нужно
+            break
+        
+        if element.tag != 'tr':
+            continue
+        
+        # Строки вложенных таблиц обработаем вместе с внешней строкой,
+        # чтобы сохранить порядок как в BeautifulSoup
+        if is_nested_row(element, target):
+            continue
+        
+        # iter('tr') выдает саму строку и вложенные строки по порядку
+        for row in element.iter('tr'):
+            yield list(row.iter('td', 'th'))
+        
+        # Освобождаем память: разобранные строки больше не нужны
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def parse_lots_from_html_lxml(html):
+    """
+    ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ HTML-КОДА ЧЕРЕЗ LXML
+    ============================================
+    
+    Возвращает ТОЧНО ТАКИЕ ЖЕ лоты, как parse_lots_from_table()
+    для второй таблицы страницы, но работает в разы быстрее.
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов или None, если таблица с лотами не найдена
+    """
+    
+    # На пустом документе lxml выдает ошибку, а не "таблицы нет"
+    if not html.strip():
+        return None
+    
+    table_info = {}
+    rows = iter_lot_table_rows_lxml(html, table_info)
+    
+    # Те же правила, что и в parse_lots_from_table()
+    lots = parse_lot_rows(rows, get_lxml_text, get_lxml_link)
+    
+    if not table_info.get('found'):
+        return None
+    return lots
+
+
+# ИНДЕКС ЦЕН
+# ============================================================
+# Чтобы не просматривать весь список при каждом запросе "лоты от X до Y",
+# цены лотов один раз раскладываются по возрастанию. В упорядоченном
+# списке границы диапазона находятся двоичным поиском (модуль bisect)
+# за log(N) шагов, а лоты между границами берутся срезом.
+#
+# Индекс - словарь из трех списков одинаковой длины:
+#   prices - цены по возрастанию
+#   seqs   - порядковые номера лотов (в каком порядке их добавляли)
+#   lots   - сами лоты
+# Лоты с одинаковой ценой лежат в порядке добавления.
+# Еще один словарь, order, хранит лоты в порядке добавления
+# ({номер: (цена, лот)}) - для запросов "в исходном порядке".
+#
+# Индекс рассчитан на "построить один раз - спрашивать много раз".
+# Добавление и удаление одного лота стоят O(n): место ищется за log(n),
+# но list.insert/del сдвигают хвост списков. Сдвиг - это копирование
+# указателей в памяти, поэтому на реальных списках torgi.org (тысячи -
+# десятки тысяч лотов) это единицы-десятки микросекунд на лот; около
+# миллиона лотов - уже миллисекунда. Структура с честным O(log n)
+# (упорядоченные блоки, skip list) замедлила бы подсчет и срезы -
+# основные запросы, ради которых индекс строится. Если лотов много
+# и они часто меняются, индекс дешевле построить заново.
+
+# Если запрос находит больше 1/PRICE_INDEX_SCAN_SHARE лотов индекса,
+# порядок добавления берется проходом по index['order'], а не сортировкой
+PRICE_INDEX_SCAN_SHARE = 8
+
+
+def create_price_index(lots=()):
+    """
+    ПОСТРОЕНИЕ ИНДЕКСА ЦЕН
+    ============================================
+    
+    Если лоты уже отсортированы по цене (после sort_lots), построение
+    почти ничего не стоит: сортировка Python узнает готовый порядок.
+    
+    ПАРАМЕТРЫ:
+    - lots: список или генератор лотов
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь индекса (см. описание выше)
+    """
+    
+    order = {seq: (lot['price'], lot) for seq, lot in enumerate(lots)}
+    entries = sorted(((price, seq, lot) for seq, (price, lot) in order.items()),
+                     key=lambda entry: (entry[0], entry[1]))
+    
+    return {
+        'prices': [entry[0] for entry in entries],
+        'seqs': [entry[1] for entry in entries],
+        'lots': [entry[2] for entry in entries],
+        'order': order,
+        'next_seq': len(entries),
+    }
+
+
+def add_to_price_index(index, lot):
+    """
+    ДОБАВЛЕНИЕ ЛОТА В ИНДЕКС
+    ============================================
+    
+    Место лота находится двоичным поиском; среди лотов с той же
+    ценой новый лот встает последним. Вставка в списки сдвигает их
+    хвост - O(n) (см. описание индекса выше).
+    """
+    
+    seq = index['next_seq']
+    position = bisect.bisect_right(index['prices'], lot['price'])
+    index['prices'].insert(position, lot['price'])
+    index['seqs'].insert(position, seq)
+    index['lots'].insert(position, lot)
+    index['order'][seq] = (lot['price'], lot)
+    index['next_seq'] += 1
+
+
+def remove_from_price_index(index, lot):
+    """
+    УДАЛЕНИЕ ЛОТА ИЗ ИНДЕКСА
+    ============================================
+    
+    Ищется среди лотов с той же ценой: сначала тот же объект,
+    затем равный по содержимому. Как и добавление, стоит O(n).
+    
+    ВОЗВРАЩАЕТ:
+    - True, если лот был в индексе и удален
+    """
+    
+    start = bisect.bisect_left(index['prices'], lot['price'])
+    end = bisect.bisect_right(index['prices'], lot['price'])
+    
+    candidates = index['lots'][start:end]
+    for i, other in enumerate(candidates):
+        if other is lot:
+            break
+    else:
+        for i, other in enumerate(candidates):
+            if other == lot:
+                break
+        else:
+            return False
+    
+    position = start + i
+    del index['order'][index['seqs'][position]]
+    del index['prices'][position]
+    del index['seqs'][position]
+    del index['lots'][position]
+    return True
+
+
+def get_price_index_bounds(index, min_price=None, max_price=None,
+                           include_min=True, include_max=True):
+    """
+    ГРАНИЦЫ ДИАПАЗОНА ЦЕН В ИНДЕКСЕ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - min_price, max_price: границы (None - без ограничения;
+      0 - тоже граница, а не "без ограничения")
+    - include_min, include_max: True - граница входит в диапазон (>=, <=),
+      False - не входит (>, <)
+    
+    ВОЗВРАЩАЕТ:
+    - Пару (start, end): подходящие лоты - index['lots'][start:end]
+    """
+    
+    prices = index['prices']
+    
+    if min_price is None:
+        start = 0
+    elif include_min:
+        start = bisect.bisect_left(prices, min_price)
+    else:
+        start = bisect.bisect_right(prices, min_price)
+    
+    if max_price is None:
+        end = len(prices)
+    elif include_max:
+        end = bisect.bisect_right(prices, max_price)
+    else:
+        end = bisect.bisect_left(prices, max_price)
+    
+    return start, max(start, end)
+
+
+def count_in_price_range(index, min_price=None, max_price=None,
+                         include_min=True, include_max=True):
+    """
+    ЧИСЛО ЛОТОВ В ДИАПАЗОНЕ ЦЕН (без перебора лотов)
+    """
+    
+    start, end = get_price_index_bounds(index, min_price, max_price, include_min, include_max)
+    return end - start
+
+
+def query_price_range(index, min_price=None, max_price=None,
+                      include_min=True, include_max=True, order='price-asc'):
+    """
+    ЛОТЫ В ДИАПАЗОНЕ ЦЕН
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - min_price, max_price, include_min, include_max -
+      как у get_price_index_bounds()
+    - order: 'price-asc'  - по возрастанию цены,
+             'price-desc' - по убыванию,
+             'none'       - в порядке добавления лотов
+      (лоты с одинаковой ценой - в порядке добавления,
+      как после sort_lots())
+    
+    ВОЗВРАЩАЕТ:
+    - Новый список лотов
+    """
+    
+    start, end = get_price_index_bounds(index, min_price, max_price, include_min, include_max)
+    
+    if order == 'none' and (end - start) * PRICE_INDEX_SCAN_SHARE > len(index['prices']):
+        # Найдена заметная часть индекса: один проход по лотам в порядке
+        # добавления дешевле, чем сортировать найденное по номерам
+        low, high = index['prices'][start], index['prices'][end - 1]
+        return [lot for price, lot in index['order'].values() if low <= price <= high]
+    
+    lots = index['lots'][start:end]
+    
+    if order == 'price-desc':
+        # Сортировка устойчива и узнает готовый порядок - это быстрый проход
+        return sorted(lots, key=lambda x: x['price'], reverse=True)
+    if order == 'none':
+        seqs = index['seqs'][start:end]
+        return [lot for _, lot in sorted(zip(seqs, lots), key=lambda pair: pair[0])]
+    return lots
+
+
+def top_by_price(index, n, largest=True):
+    """
+    N САМЫХ ДОРОГИХ (ИЛИ САМЫХ ДЕШЕВЫХ) ЛОТОВ
+    ============================================
+    
+    Лоты берутся с нужного края индекса, без сортировки.
+    
+    ВОЗВРАЩАЕТ:
+    - Список из не более чем n лотов (самый дорогой/дешевый - первый)
+    """
+    
+    if n <= 0:
+        return []
+    if not largest:
+        return index['lots'][:n]
+    
+    # Берем все лоты с ценой не ниже n-й с конца: лоты с такой же ценой
+    # идут в порядке добавления - как в sort_lots(lots, 'price-desc')[:n]
+    if n >= len(index['prices']):
+        return query_price_range(index, order='price-desc')
+    return query_price_range(index, min_price=index['prices'][-n], order='price-desc')[:n]
+
+
+def filter_lots_by_price(lots, min_price=None, max_price=None):
+    """
+    ФИЛЬТРАЦИЯ ЛОТОВ ПО ДИАПАЗОНУ ЦЕН
+    ============================================
+    
+    Эта функция отбирает только те лоты, цена которых находится
+    в указанном диапазоне [min_price, max_price].
+    
+    Лоты просматриваются один раз (O(n)). Если к одним и тем же лотам
+    будет много запросов, лучше один раз построить индекс
+    (create_price_index) и отбирать лоты через filter_price_index().
+    
+    ПАРАМЕТРЫ:
+    - lots: список лотов (список словарей)
+    - min_price: минимальная цена (или None - без ограничения снизу)
+    - max_price: максимальная цена (или None - без ограничения сверху)
+    
+    ВОЗВРАЩАЕТ:
+    - Новый список с отфильтрованными лотами
+    
+    ПРИМЕРЫ:
+    - filter_lots_by_price(lots, 1000000, 5000000) → лоты от 1млн до 5млн
+    - filter_lots_by_price(lots, None, 1000000) → лоты до 1млн
+    - filter_lots_by_price(lots, 500000, None) → лоты от 500тыс
+    """
+    
+    # Если список лотов пустой - возвращаем пустой список
+    if not lots:
+        return []
+    
+    # Проверяем КАЖДЫЙ лот (тот же фильтр, что iter_lots_in_price_range).
+    # None - граница не задана; 0 - тоже граница
+    return list(iter_lots_in_price_range(lots, min_price, max_price))
+
+
+def filter_price_index(index, min_price=None, max_price=None):
+    """
+    ФИЛЬТРАЦИЯ ЛОТОВ ПО ЦЕНЕ С ПОМОЩЬЮ ИНДЕКСА
+    ============================================
+    
+    Тот же результат, что filter_lots_by_price() для лотов индекса,
+    но границы ищутся двоичным поиском (O(log n) + число найденных лотов).
+    
+    ПАРАМЕТРЫ:
+    - index: индекс из create_price_index()
+    - min_price, max_price: границы (None - без ограничения)
+    
+    ВОЗВРАЩАЕТ:
+    - Новый список лотов в порядке добавления в индекс
+    """
+    
+    return query_price_range(index, min_price, max_price, order='none')
+
+
+def print_lots(lots, title):
+    """
+    КРАСИВЫЙ ВЫВОД СПИСКА ЛОТОВ
+    ============================================
+    
+    Эта функция форматирует и выводит список лотов в удобном виде.
+    Использует эмодзи и форматирование для лучшей читаемости.
+    
+    ПАРАМЕТРЫ:
+    - lots: список лотов для вывода
+    - title: заголовок для вывода (например "ВСЕ ЛОТЫ")
+    
+    ВЫВОДИТ:
+    - Заголовок с количеством лотов
+    - Горизонтальную линию
+    - Каждый лот в формате:
+        №. 💰 Цена руб
+           📍 Регион (если есть)
+           🏷  Название...
+           🔗 Ссылка (если есть)
+        ----------------------------
+    """
+    
+    # Если список пустой - выводим сообщение и выходим
+    if not lots:
+        print(f"❌ {title}: лоты не найдены")
+        return
+    
+    # ВЫВОД ЗАГОЛОВКА
+    # ========================================
+    print(f"\n{title}: Найдено {len(lots)} лотов")
+    print("=" * 100)  # Горизонтальная линия из 100 знаков "="
+    
+    # ВЫВОД КАЖДОГО ЛОТА
+    # ========================================
+    # enumerate(lots, 1) дает пары: (номер, лот)
+    # 1 - начать нумерацию с 1 (по умолчанию с 0)
+    for i, lot in enumerate(lots, 1):
+        print_lot(i, lot)
+
+
+def print_lot(i, lot, stream=None):
+    """
+    ВЫВОД ОДНОГО ЛОТА
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - i: номер лота в списке
+    - lot: словарь лота
+    - stream: куда выводить (по умолчанию - на экран)
+    """
+    
+    # Весь лот собираем в одну строку и выводим одной операцией
+    lines = []
+    
+    # 1. ВЫВОД ЦЕНЫ
+    # {i:2d} - номер шириной 2 символа, выравнивание по правому краю
+    # {lot['price']:12,.2f} - цена шириной 12 символов:
+    #   , - разделитель тысяч
+    #   .2f - 2 знака после точки
+    lines.append(f"{i:2d}. 💰 {lot['price']:12,.2f} руб")
+    
+    # 2. ВЫВОД РЕГИОНА (если есть)
+    if lot['region']:
+        lines.append(f"    📍 {lot['region']}")
+    
+    # 3. ВЫВОД НАЗВАНИЯ
+    # {lot['name'][:80]} - первые 80 символов названия
+    lines.append(f"    🏷  {lot['name'][:80]}...")
+    
+    # 4. ВЫВОД ССЫЛКИ (если есть)
+    if lot['link']:
+        lines.append(f"    🔗 {lot['link']}")
+    
+    # 5. ВЫВОД ДАННЫХ СО СТРАНИЦЫ ЛОТА (если лот дополнялся)
+    for field, label in DETAIL_FIELD_LABELS:
+        if lot.get(field):
+            lines.append(f"    {label}: {lot[field]}")
+    
+    # Разделитель между лотами
+    lines.append("-" * 100)
+    
+    print('\n'.join(lines), file=stream)
+
+
+# КОЛОНКИ ЦЕН (NUMPY)
+# ============================================================
+# Для больших объемов (разбор архива за месяцы, весь каталог)
+# цены обрабатываются не по одной, а целым столбцом: массив NumPy
+# разбирается, фильтруется и сортируется операциями над всем
+# массивом сразу, без цикла Python по лотам.
+#
+# Результаты совпадают с построчными функциями: parse_prices_batch()
+# дает те же числа, что parse_price(), а фильтр и сортировка - тот же
+# порядок лотов, что iter_lots_in_price_range() и sort_lots().
+
+# Сколько строк разбирать за один проход (ограничивает память
+# под двумерный массив символов)
+PRICE_BATCH_ROWS = 65536
+
+# Коды символов: цифры '0'-'9', точка, запятая
+CHAR_ZERO, CHAR_NINE, CHAR_DOT, CHAR_COMMA = ord('0'), ord('9'), ord('.'), ord(',')
+
+# Первая "не латинская" цифра Юникода (арабская ٠). Регулярное выражение
+# \d в parse_price понимает и такие цифры; строки с символами от этого
+# кода (кириллица и пробелы - раньше) разбираются построчно
+FIRST_UNICODE_DIGIT = 0x0660
+
+
+def parse_prices_batch(price_texts):
+    """
+    РАЗБОР СТОЛБЦА ЦЕН ЗА ОДИН ПРОХОД
+    ============================================
+    
+    Делает то же, что parse_price() для каждой строки, но над всем
+    столбцом сразу: строки превращаются в таблицу кодов символов,
+    лишние символы и лишние точки убираются сдвигом оставшихся
+    влево, а числа получаются одним преобразованием массива строк
+    в float.
+    
+    ПАРАМЕТРЫ:
+    - price_texts: список текстов цен (None и '' → 0)
+    
+    ВОЗВРАЩАЕТ:
+    - Массив numpy.float64 той же длины
+    
+    ОШИБКИ:
+    - RuntimeError, если NumPy не установлен
+    """
+    
+    if np is None:
+        raise RuntimeError("для разбора цен столбцом установите numpy: pip install numpy")
+    
+    texts = ['' if text is None else text for text in price_texts]
+    result = np.zeros(len(texts), dtype=np.float64)
+    failures = 0
+    
+    for start in range(0, len(texts), PRICE_BATCH_ROWS):
+        chunk = np.array(texts[start:start + PRICE_BATCH_ROWS], dtype=str)
+        if chunk.itemsize == 0:
+            continue
+        
+        # Таблица кодов символов: строка массива = строка текста
+        original = chunk.view(np.uint32).reshape(len(chunk), -1)
+        codes = original.copy()
+        
+        # 1. Запятые → точки; оставляем только цифры и точки
+        codes[codes == CHAR_COMMA] = CHAR_DOT
+        is_dot = codes == CHAR_DOT
+        keep = ((codes >= CHAR_ZERO) & (codes <= CHAR_NINE)) | is_dot
+        
+        # 2. Из точек остается только первая: "2662.880.00" → "2662.88000"
+        keep &= ~(is_dot & (np.cumsum(is_dot, axis=1) > 1))
+        
+        # 3. Оставленные символы сдвигаются влево (порядок сохраняется):
+        #    номер символа в новой строке - число оставленных до него,
+        #    хвост заполняется нулевым символом - концом строки
+        rows, cols = np.nonzero(keep)
+        packed = np.zeros_like(codes)
+        packed[rows, np.cumsum(keep, axis=1)[rows, cols] - 1] = codes[rows, cols]
+        clean = packed.view(chunk.dtype).reshape(len(chunk))
+        
+        # 4. Строки с "не латинскими" цифрами разбираются построчно (шаг 6)
+        scalar = original.max(axis=1) >= FIRST_UNICODE_DIGIT
+        
+        # 5. Пустая строка и одна точка - не число (0, как в parse_price)
+        invalid = (clean == '') | (clean == '.')
+        failures += int(np.count_nonzero(invalid & (chunk != '') & ~scalar))
+        clean[invalid] = '0'
+        values = clean.astype(np.float64)
+        
+        # 6. Построчный разбор сам считает свои ошибки
+        for i in np.flatnonzero(scalar):
+            values[i] = parse_price(texts[start + i])
+        
+        result[start:start + len(chunk)] = values
+    
+    if failures:
+        count_metric('torgi_price_parse_failures_total', failures)
+    
+    return result
+
+
+def create_lot_columns(lots):
+    """
+    СТОЛБЦЫ ЛОТОВ ДЛЯ ОБРАБОТКИ МАССИВАМИ
+    ============================================
+    
+    Столбец регионов строится только по запросу (get_region_column):
+    для фильтра и сортировки по цене он не нужен, а поиск региона
+    в справочнике - самая долгая часть.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь:
+      'lots'    - список лотов (в исходном порядке)
+      'prices'  - массив цен (numpy.float64)
+      'regions' - None (заполняется get_region_column)
+      'region_names' - None (заполняется get_region_column)
+    """
+    
+    lots = list(lots)
+    return {
+        'lots': lots,
+        'prices': np.fromiter((lot['price'] for lot in lots), dtype=np.float64, count=len(lots)),
+        'regions': None,
+        'region_names': None,
+    }
+
+
+def get_region_column(columns):
+    """
+    СТОЛБЕЦ РЕГИОНОВ (СТРОИТСЯ ПРИ ПЕРВОМ ОБРАЩЕНИИ)
+    ============================================
+    
+    Заполняет в columns:
+    - 'regions' - массив номеров регионов (numpy.int32)
+    - 'region_names' - названия регионов по номерам (единые названия
+                       из справочника REGIONS, см. get_region_name)
+    
+    ВОЗВРАЩАЕТ:
+    - Массив номеров регионов
+    """
+    
+    if columns['regions'] is None:
+        lots = columns['lots']
+        region_numbers = {}
+        columns['regions'] = np.fromiter(
+            (region_numbers.setdefault(get_region_name(lot['region']), len(region_numbers))
+             for lot in lots),
+            dtype=np.int32, count=len(lots))
+        columns['region_names'] = list(region_numbers)
+    return columns['regions']
+
+
+def get_price_mask(prices, min_price=None, max_price=None):
+    """
+    МАСКА ДИАПАЗОНА ЦЕН: True - цена от min_price до max_price включительно
+    (None - граница не задана)
+    """
+    
+    mask = np.ones(len(prices), dtype=bool)
+    if min_price is not None:
+        mask &= prices >= min_price
+    if max_price is not None:
+        mask &= prices <= max_price
+    return mask
+
+
+def select_lots_by_price(columns, min_price=None, max_price=None, order='price-desc'):
+    """
+    ФИЛЬТР И СОРТИРОВКА ЛОТОВ ПО СТОЛБЦУ ЦЕН
+    ============================================
+    
+    Дает тот же список, что sort_lots(iter_lots_in_price_range(...), order):
+    сортировка устойчивая, лоты с одинаковой ценой идут в исходном порядке.
+    
+    ПАРАМЕТРЫ:
+    - columns: словарь из create_lot_columns()
+    - min_price, max_price: границы цены (включительно; None - без границы)
+    - order: 'price-desc', 'price-asc' или 'none'
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов
+    """
+    
+    prices = columns['prices']
+    selected = np.flatnonzero(get_price_mask(prices, min_price, max_price))
+    
+    if order == 'price-asc':
+        selected = selected[np.argsort(prices[selected], kind='stable')]
+    elif order == 'price-desc':
+        selected = selected[np.argsort(-prices[selected], kind='stable')]
+    
+    lots = columns['lots']
+    return [lots[i] for i in selected]
+
+
+def get_region_price_stats(columns):
+    """
+    ЦЕНЫ ПО РЕГИОНАМ: ЧИСЛО ЛОТОВ, МИНИМУМ, МЕДИАНА, МАКСИМУМ
+    ============================================
+    
+    Лоты упорядочиваются по (регион, цена) одной сортировкой
+    (numpy.lexsort), после чего минимум, медиана и максимум каждого
+    региона - это элементы на известных местах его участка массива.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь: регион → {'count', 'min', 'median', 'max'}
+      (регионы - по убыванию числа лотов)
+    """
+    
+    prices = columns['prices']
+    if not len(prices):
+        return {}
+    regions = get_region_column(columns)
+    
+    order = np.lexsort((prices, regions))
+    sorted_prices = prices[order]
+    counts = np.bincount(regions, minlength=len(columns['region_names']))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    
+    present = np.flatnonzero(counts)
+    starts, counts = starts[present], counts[present]
+    ends = starts + counts - 1
+    medians = (sorted_prices[starts + (counts - 1) // 2] + sorted_prices[starts + counts // 2]) / 2
+    
+    stats = {}
+    for i in np.argsort(-counts, kind='stable'):
+        stats[columns['region_names'][present[i]]] = {
+            'count': int(counts[i]),
+            'min': float(sorted_prices[starts[i]]),
+            'median': float(medians[i]),
+            'max': float(sorted_prices[ends[i]]),
+        }
+    return stats
+
+
+def print_region_stats(stats):
+    """
+    ВЫВОД ЦЕН ПО РЕГИОНАМ
+    """
+    
+    print("\n📍 ЦЕНЫ ПО РЕГИОНАМ:")
+    print(f"   {'регион':<30}{'лотов':>7}{'минимум':>24}{'медиана':>24}{'максимум':>24}")
+    for region, row in stats.items():
+        print(f"   {(region or '(не указан)')[:29]:<30}{row['count']:>7}"
+              f"{format_price_text(row['min']):>24}{format_price_text(row['median']):>24}"
+              f"{format_price_text(row['max']):>24}")
+
+
+# ПОИСК ПО НАЗВАНИЯМ ЛОТОВ
+# ============================================================
+# Обратный индекс: для каждого слова (точнее, его основы) хранится
+# список лотов, в названии которых оно встречается, и места слова
+# в названии. Поиск не просматривает все лоты, а берет готовые
+# списки нужных слов и пересекает их:
+#     "земельный участок"  → лоты, где эти слова стоят рядом
+#     квартира москва      → лоты, где есть оба слова
+#     кадастр*             → слова, начинающиеся с "кадастр"
+#
+# Лоты нумеруются по порядку добавления, поэтому списки лотов
+# всегда упорядочены и пополняются добавлением в конец. Места слова
+# в названии хранятся одним числом-маской: бит p означает, что слово
+# стоит на месте p (маленькие числа не занимают лишней памяти, а
+# проверка фразы - это сдвиг и побитовое И).
+
+# Слово названия: буквы и цифры (после перевода в нижний регистр)
+SEARCH_TOKEN_PATTERN = re.compile(r'[0-9a-zа-я]+')
+
+# Часть запроса: фраза в кавычках или отдельное слово
+SEARCH_QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+# Окончания русских слов, которые отбрасываются при поиске (упрощенный
+# стемминг): "земельного участка" и "земельный участок" дают одни основы.
+# Проверяются от длинных к коротким, отбрасывается одно окончание
+RUSSIAN_ENDINGS = (
+    'иями', 'ями', 'ами', 'иям', 'иях', 'ием', 'ией',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ях', 'ах', 'ям', 'ам', 'ов', 'ев', 'ей', 'ий', 'ый', 'ой', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ых', 'их', 'ым', 'им', 'ом', 'ем',
+    'ию', 'ия', 'ии', 'ье', 'ья', 'ью', 'ьи',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+)
+# Те же окончания по длине: (длина, множество окончаний), от длинных к коротким
+RUSSIAN_ENDINGS_BY_LENGTH = tuple(
+    (length, frozenset(ending for ending in RUSSIAN_ENDINGS if len(ending) == length))
+    for length in sorted({len(ending) for ending in RUSSIAN_ENDINGS}, reverse=True)
+)
+
+# Основа слова не короче стольких букв ("дома" → "дом", но "дом" не режется)
+MIN_STEM_LENGTH = 3
+
+# Беглая гласная: "участок" - "участка", "продавец" - "продавца".
+# У основы с таким концом гласная выпадает, и обе формы дают "участк"
+FLEETING_VOWEL_PATTERN = re.compile(r'(?<=[а-я]{2})[ое](?=[кц]$)')
+
+# Уже найденные основы слов: в названиях лотов одни и те же слова
+# повторяются постоянно (размер ограничен STEM_CACHE_SIZE)
+STEM_CACHE = {}
+STEM_CACHE_SIZE = 200000
+
+
+def stem_word(word):
+    """
+    ОСНОВА СЛОВА: слово без окончания ("квартиры" → "квартир")
+    """
+    
+    stem = STEM_CACHE.get(word)
+    if stem is not None:
+        return stem
+    
+    # Числа (номера лотов, кадастровые номера) не меняются и не запоминаются
+    if word[0].isdigit():
+        return word
+    
+    stem = word
+    for length, endings in RUSSIAN_ENDINGS_BY_LENGTH:
+        if len(word) - length >= MIN_STEM_LENGTH and word[-length:] in endings:
+            stem = word[:-length]
+            break
+    stem = FLEETING_VOWEL_PATTERN.sub('', stem)
+    
+    if len(STEM_CACHE) < STEM_CACHE_SIZE:
+        STEM_CACHE[word] = stem
+    return stem
+
+
+def tokenize_name(text):
+    """
+    РАЗБИЕНИЕ НАЗВАНИЯ НА ОСНОВЫ СЛОВ
+    ============================================
+    
+    ПРИМЕР:
+    - "Земельный участок, 1/2 доли" → ['земельн', 'участк', '1', '2', 'дол']
+    
+    ВОЗВРАЩАЕТ:
+    - Список основ в порядке слов (буква ё считается как е)
+    """
+    
+    text = (text or '').lower().replace('ё', 'е')
+    return [stem_word(word) for word in SEARCH_TOKEN_PATTERN.findall(text)]
+
+
+def create_search_index(lots=()):
+    """
+    СОЗДАНИЕ ИНДЕКСА ДЛЯ ПОИСКА ПО НАЗВАНИЯМ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь:
+      'lots'     - лоты по номерам (None - лот удален из индекса)
+      'prices'   - цены лотов по номерам
+      'ids'      - постоянный номер лота (get_lot_identity) → номер в индексе
+      'postings' - основа слова → [номера лотов, маски мест слова в их названиях]
+      'terms'    - основы по алфавиту для поиска по началу слова
+                   (None - список устарел и будет построен заново)
+    """
+    
+    index = {
+        'lots': [],
+        'prices': [],
+        'ids': {},
+        'postings': {},
+        'terms': None,
+    }
+    add_to_search_index(index, lots)
+    return index
+
+
+def index_lot_name(index, doc, name):
+    """
+    ДОБАВЛЕНИЕ СЛОВ НАЗВАНИЯ ЛОТА С НОМЕРОМ doc В СПИСКИ
+    """
+    
+    places = {}
+    for position, term in enumerate(tokenize_name(name)):
+        places[term] = places.get(term, 0) | (1 << position)
+    
+    postings = index['postings']
+    for term, mask in places.items():
+        posting = postings.get(term)
+        if posting is None:
+            posting = postings[term] = [[], []]
+            index['terms'] = None
+        posting[0].append(doc)
+        posting[1].append(mask)
+
+
+def remove_from_search_index(index, doc):
+    """
+    УДАЛЕНИЕ ЛОТА С НОМЕРОМ doc ИЗ ИНДЕКСА
+    """
+    
+    lot = index['lots'][doc]
+    if lot is None:
+        return
+    
+    postings = index['postings']
+    for term in set(tokenize_name(lot['name'])):
+        docs, masks = postings[term]
+        i = bisect.bisect_left(docs, doc)
+        del docs[i], masks[i]
+        if not docs:
+            del postings[term]
+            index['terms'] = None
+    
+    index['lots'][doc] = None
+    index['ids'].pop(get_lot_identity(lot), None)
+
+
+def add_to_search_index(index, lots):
+    """
+    ДОБАВЛЕНИЕ ЛОТОВ В ИНДЕКС
+    ============================================
+    
+    Индекс пополняется по мере прихода лотов. Лот, который уже есть
+    в индексе (тот же get_lot_identity), заменяется: цена обновляется,
+    а при новом названии меняются и списки слов.
+    
+    ВОЗВРАЩАЕТ:
+    - Число новых лотов
+    """
+    
+    added = 0
+    for lot in lots:
+        identity = get_lot_identity(lot)
+        doc = index['ids'].get(identity)
+        if doc is not None:
+            if index['lots'][doc]['name'] == lot['name']:
+                index['lots'][doc] = lot
+                index['prices'][doc] = lot['price']
+                continue
+            remove_from_search_index(index, doc)
+        else:
+            added += 1
+        
+        doc = len(index['lots'])
+        index['lots'].append(lot)
+        index['prices'].append(lot['price'])
+        index['ids'][identity] = doc
+        index_lot_name(index, doc, lot['name'])
+    return added
+
+
+def intersect_doc_lists(first, second):
+    """
+    ПЕРЕСЕЧЕНИЕ ДВУХ УПОРЯДОЧЕННЫХ СПИСКОВ НОМЕРОВ ЛОТОВ
+    ============================================
+    
+    Если один список намного короче, его номера ищутся в длинном
+    двоичным поиском, иначе списки пересекаются как множества.
+    """
+    
+    if len(first) > len(second):
+        first, second = second, first
+    
+    if len(first) * 16 < len(second):
+        result = []
+        for doc in first:
+            i = bisect.bisect_left(second, doc)
+            if i < len(second) and second[i] == doc:
+                result.append(doc)
+        return result
+    
+    found = set(second)
+    return [doc for doc in first if doc in found]
+
+
+def find_phrase_docs(index, terms):
+    """
+    ЛОТЫ, В НАЗВАНИИ КОТОРЫХ ОСНОВЫ terms ИДУТ ПОДРЯД
+    """
+    
+    postings = [index['postings'].get(term) for term in terms]
+    if any(posting is None for posting in postings):
+        return []
+    
+    docs = postings[0][0]
+    for posting in postings[1:]:
+        docs = intersect_doc_lists(docs, posting[0])
+    if len(terms) == 1:
+        return docs
+    
+    # Маски мест в каждом лоте-кандидате: фраза начинается на месте p,
+    # если у слова i есть бит p + i. Маски кандидатов берутся проходом
+    # по списку слова, а если он намного длиннее - двоичным поиском
+    found = [-1] * len(docs)
+    candidates = set(docs)
+    for i, (posting_docs, masks) in enumerate(postings):
+        if len(posting_docs) > len(docs) * 16:
+            places = [masks[bisect.bisect_left(posting_docs, doc)] for doc in docs]
+        else:
+            places = [mask for doc, mask in zip(posting_docs, masks) if doc in candidates]
+        found = [mask & (place >> i) for mask, place in zip(found, places)]
+    return [doc for doc, mask in zip(docs, found) if mask]
+
+
+def find_prefix_docs(index, prefix):
+    """
+    ЛОТЫ СО СЛОВОМ, НАЧИНАЮЩИМСЯ С prefix
+    """
+    
+    if index['terms'] is None:
+        index['terms'] = sorted(index['postings'])
+    terms = index['terms']
+    
+    docs = set()
+    i = bisect.bisect_left(terms, prefix)
+    while i < len(terms) and terms[i].startswith(prefix):
+        docs.update(index['postings'][terms[i]][0])
+        i += 1
+    return sorted(docs)
+
+
+def parse_search_query(query):
+    """
+    РАЗБОР ПОИСКОВОГО ЗАПРОСА
+    ============================================
+    
+    ПРИМЕРЫ:
+    - 'квартира москва'     → [('phrase', ['квартир']), ('phrase', ['москв'])]
+    - '"земельный участок"' → [('phrase', ['земельн', 'участк'])]
+    - 'кадастр*'            → [('prefix', 'кадастр')]
+    
+    ВОЗВРАЩАЕТ:
+    - Список условий; лот должен подходить под все
+    """
+    
+    clauses = []
+    for phrase, word in SEARCH_QUERY_PATTERN.findall(query):
+        if word.endswith('*') and SEARCH_TOKEN_PATTERN.fullmatch(word[:-1].lower().replace('ё', 'е')):
+            clauses.append(('prefix', stem_word(word[:-1].lower().replace('ё', 'е'))))
+            continue
+        # Слово вроде "ул.Ленина" дает две основы и ищется как фраза
+        terms = tokenize_name(phrase or word)
+        if terms:
+            clauses.append(('phrase', terms))
+    return clauses
+
+
+def search_lots(index, query, min_price=None, max_price=None):
+    """
+    ПОИСК ЛОТОВ ПО НАЗВАНИЮ И ЦЕНЕ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - index: индекс из create_search_index()
+    - query: запрос (см. parse_search_query; пустой - все лоты)
+    - min_price, max_price: границы цены (включительно; None - без границы)
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов в порядке добавления в индекс
+    """
+    
+    docs = None
+    for kind, value in parse_search_query(query):
+        found = find_prefix_docs(index, value) if kind == 'prefix' else find_phrase_docs(index, value)
+        docs = found if docs is None else intersect_doc_lists(docs, found)
+        if not docs:
+            return []
+    
+    lots = index['lots']
+    prices = index['prices']
+    if docs is None:
+        docs = [doc for doc, lot in enumerate(lots) if lot is not None]
+    if min_price is not None:
+        docs = [doc for doc in docs if prices[doc] >= min_price]
+    if max_price is not None:
+        docs = [doc for doc in docs if prices[doc] <= max_price]
+    return [lots[doc] for doc in docs]
+
+
+def save_search_index(index, path):
+    """
+    СОХРАНЕНИЕ ИНДЕКСА В ФАЙЛ (JSON, сжатый gzip)
+    ============================================
+    
+    Запись идет во временный файл, который затем заменяет прежний:
+    прерванная запись не портит сохраненный индекс.
+    """
+    
+    data = {
+        'version': 1,
+        'lots': [None if lot is None else dict(lot) for lot in index['lots']],
+        'postings': index['postings'],
+    }
+    # json.dumps целиком быстрее, чем json.dump, который пишет по кусочку
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8', compresslevel=1) as f:
+        f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+    os.replace(path + '.tmp', path)
+
+
+def load_search_index(path):
+    """
+    ЗАГРУЗКА ИНДЕКСА ИЗ ФАЙЛА
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Индекс из файла или пустой индекс, если файла еще нет
+    """
+    
+    if not os.path.exists(path):
+        return create_search_index()
+    
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    lots = [None if lot is None else make_lot(lot) for lot in data['lots']]
+    return {
+        'lots': lots,
+        'prices': [0 if lot is None else lot['price'] for lot in lots],
+        'ids': {get_lot_identity(lot): doc for doc, lot in enumerate(lots) if lot is not None},
+        'postings': data['postings'],
+        'terms': None,
+    }
+
+
+# СПРАВОЧНИК РЕГИОНОВ
+# ============================================================
+# На сайте один и тот же регион записан по-разному: "Московская обл",
+# "Московская обл.", "Московская область"; "г. Москва", "Москва г.".
+# Справочник сводит все эти записи к одному коду субъекта РФ
+# (двузначный код, как в ИНН и кадастровых номерах: 50 - Московская
+# область, 77 - Москва).
+#
+# Названия и их варианты разбиваются на основы слов так же, как
+# названия лотов при поиске (tokenize_name), и складываются в дерево
+# (trie): от корня по первой основе, затем по второй и т.д. Текст
+# ячейки читается за один проход: с каждого слова спускаемся по
+# дереву и берем самое длинное совпадение ("Ямало-Ненецкий АО" - это
+# ЯНАО, а не Ненецкий АО). Тип региона ("обл", "край", "г.") для
+# поиска не нужен: "московск" - область, "москв" - город.
+#
+# Короткие слова (не длиннее REGION_EXACT_LENGTH букв: "Коми", "Тыва",
+# "СПб", "ХМАО") на основы не сокращаются и совпадают только целым
+# словом - иначе "Коми" превратилось бы в "ком" и нашлось бы в
+# "Комиссия" или "комната".
+
+# Субъекты РФ: (код, название, другие варианты написания)
+REGIONS = (
+    ('01', 'Республика Адыгея', ('Адыгея',)),
+    ('02', 'Республика Башкортостан', ('Башкортостан', 'Башкирия')),
+    ('03', 'Республика Бурятия', ('Бурятия',)),
+    ('04', 'Республика Алтай', ()),
+    ('05', 'Республика Дагестан', ('Дагестан',)),
+    ('06', 'Республика Ингушетия', ('Ингушетия',)),
+    ('07', 'Кабардино-Балкарская Республика', ('Кабардино-Балкария',)),
+    ('08', 'Республика Калмыкия', ('Калмыкия',)),
+    ('09', 'Карачаево-Черкесская Республика', ('Карачаево-Черкесия',)),
+    ('10', 'Республика Карелия', ('Карелия',)),
+    ('11', 'Республика Коми', ('Коми',)),
+    ('12', 'Республика Марий Эл', ('Марий Эл',)),
+    ('13', 'Республика Мордовия', ('Мордовия',)),
+    ('14', 'Республика Саха (Якутия)', ('Саха', 'Якутия')),
+    ('15', 'Республика Северная Осетия - Алания', ('Северная Осетия', 'Алания')),
+    ('16', 'Республика Татарстан', ('Татарстан',)),
+    ('17', 'Республика Тыва', ('Тыва', 'Тува')),
+    ('18', 'Удмуртская Республика', ('Удмуртия',)),
+    ('19', 'Республика Хакасия', ('Хакасия',)),
+    ('20', 'Чеченская Республика', ('Чечня',)),
+    ('21', 'Чувашская Республика - Чувашия', ()),
+    ('22', 'Алтайский край', ()),
+    ('23', 'Краснодарский край', ('Кубань',)),
+    ('24', 'Красноярский край', ()),
+    ('25', 'Приморский край', ('Приморье',)),
+    ('26', 'Ставропольский край', ()),
+    ('27', 'Хабаровский край', ()),
+    ('28', 'Амурская область', ()),
+    ('29', 'Архангельская область', ()),
+    ('30', 'Астраханская область', ()),
+    ('31', 'Белгородская область', ()),
+    ('32', 'Брянская область', ()),
+    ('33', 'Владимирская область', ()),
+    ('34', 'Волгоградская область', ()),
+    ('35', 'Вологодская область', ()),
+    ('36', 'Воронежская область', ()),
+    ('37', 'Ивановская область', ()),
+    ('38', 'Иркутская область', ()),
+    ('39', 'Калининградская область', ()),
+    ('40', 'Калужская область', ()),
+    ('41', 'Камчатский край', ()),
+    ('42', 'Кемеровская область - Кузбасс', ()),
+    ('43', 'Кировская область', ()),
+    ('44', 'Костромская область', ()),
+    ('45', 'Курганская область', ()),
+    ('46', 'Курская область', ()),
+    ('47', 'Ленинградская область', ()),
+    ('48', 'Липецкая область', ()),
+    ('49', 'Магаданская область', ()),
+    ('50', 'Московская область', ('Моск. обл.',)),
+    ('51', 'Мурманская область', ()),
+    ('52', 'Нижегородская область', ()),
+    ('53', 'Новгородская область', ()),
+    ('54', 'Новосибирская область', ()),
+    ('55', 'Омская область', ()),
+    ('56', 'Оренбургская область', ()),
+    ('57', 'Орловская область', ()),
+    ('58', 'Пензенская область', ()),
+    ('59', 'Пермский край', ()),
+    ('60', 'Псковская область', ()),
+    ('61', 'Ростовская область', ()),
+    ('62', 'Рязанская область', ()),
+    ('63', 'Самарская область', ()),
+    ('64', 'Саратовская область', ()),
+    ('65', 'Сахалинская область', ()),
+    ('66', 'Свердловская область', ()),
+    ('67', 'Смоленская область', ()),
+    ('68', 'Тамбовская область', ()),
+    ('69', 'Тверская область', ()),
+    ('70', 'Томская область', ()),
+    ('71', 'Тульская область', ()),
+    ('72', 'Тюменская область', ()),
+    ('73', 'Ульяновская область', ()),
+    ('74', 'Челябинская область', ()),
+    ('75', 'Забайкальский край', ()),
+    ('76', 'Ярославская область', ()),
+    ('77', 'Москва', ('Мск',)),
+    ('78', 'Санкт-Петербург', ('Петербург', 'СПб', 'С.-Петербург')),
+    ('79', 'Еврейская автономная область', ('Еврейская АО', 'ЕАО')),
+    ('83', 'Ненецкий автономный округ', ('Ненецкий АО', 'НАО')),
+    ('86', 'Ханты-Мансийский автономный округ - Югра', ('Ханты-Мансийский АО', 'ХМАО', 'Югра')),
+    ('87', 'Чукотский автономный округ', ('Чукотский АО', 'Чукотка')),
+    ('89', 'Ямало-Ненецкий автономный округ', ('Ямало-Ненецкий АО', 'ЯНАО')),
+    ('90', 'Запорожская область', ()),
+    ('91', 'Республика Крым', ('Крым',)),
+    ('92', 'Севастополь', ()),
+    ('93', 'Донецкая Народная Республика', ('Донецкая', 'ДНР')),
+    ('94', 'Луганская Народная Республика', ('Луганская', 'ЛНР')),
+    ('95', 'Херсонская область', ()),
+)
+
+# Код субъекта → название
+REGION_NAMES = {code: name for code, name, aliases in REGIONS}
+
+# Слова не длиннее этого числа букв сравниваются целиком, без основ
+REGION_EXACT_LENGTH = 5
+
+
+def get_region_terms(text):
+    """
+    СЛОВА ТЕКСТА ДЛЯ ПОИСКА РЕГИОНА
+    ============================================
+    
+    Как tokenize_name(), но короткие слова (до REGION_EXACT_LENGTH
+    букв) остаются целыми.
+    
+    ПРИМЕР:
+    - "Республика Коми" → ['республик', 'коми']
+    """
+    
+    text = (text or '').lower().replace('ё', 'е')
+    return [word if len(word) <= REGION_EXACT_LENGTH else stem_word(word)
+            for word in SEARCH_TOKEN_PATTERN.findall(text)]
+
+
+# Слова, которые означают только тип региона и сами по себе регион
+# не определяют ("Республика Алтай" ищется как "Алтай")
+REGION_TYPE_WORDS = frozenset(get_region_terms(
+    'республика респ область обл край автономный автономная округ ао г город народная'))
+
+# Ключ в узле дерева, под которым лежит код найденного региона
+# (основа слова не может быть пустой строкой)
+REGION_TRIE_CODE = ''
+
+# Уже разобранные тексты ячеек (размер ограничен REGION_CACHE_SIZE)
+REGION_CACHE = {}
+REGION_CACHE_SIZE = 100000
+
+# Быстрая проверка: регион записывается буквами
+REGION_LETTERS_PATTERN = re.compile(r'[А-Яа-яЁёA-Za-z]{2}')
+
+
+def get_region_keys(name):
+    """
+    ОСНОВЫ СЛОВ НАЗВАНИЯ РЕГИОНА БЕЗ СЛОВ-ТИПОВ
+    ============================================
+    
+    ПРИМЕР:
+    - "Республика Северная Осетия" → ['северн', 'осет']
+    """
+    
+    return [term for term in get_region_terms(name) if term not in REGION_TYPE_WORDS]
+
+
+def build_region_trie(regions):
+    """
+    ДЕРЕВО ПОИСКА РЕГИОНОВ
+    ============================================
+    
+    Узел дерева - словарь: основа слова → следующий узел; в узле,
+    где заканчивается название, под ключом REGION_TRIE_CODE лежит код.
+    
+    ПАРАМЕТРЫ:
+    - regions: список (код, название, варианты) - как REGIONS
+    
+    ВОЗВРАЩАЕТ:
+    - Корень дерева
+    
+    ОШИБКИ:
+    - ValueError, если одно и то же написание ведет к двум регионам
+    """
+    
+    root = {}
+    for code, name, aliases in regions:
+        # "Кемеровская область - Кузбасс": каждая часть - отдельный вариант
+        for text in (name + ' - ' + ' - '.join(aliases)).split(' - '):
+            keys = get_region_keys(text)
+            if not keys:
+                continue
+            node = root
+            for key in keys:
+                node = node.setdefault(key, {})
+            if node.get(REGION_TRIE_CODE, code) != code:
+                raise ValueError(f"регион {text!r} уже записан с кодом {node[REGION_TRIE_CODE]}")
+            node[REGION_TRIE_CODE] = code
+    return root
+
+
+# Дерево строится один раз при запуске программы
+REGION_TRIE = build_region_trie(REGIONS)
+
+
+def find_region_code(text):
+    """
+    КОД РЕГИОНА ПО ТЕКСТУ ЯЧЕЙКИ
+    ============================================
+    
+    ПРИМЕРЫ:
+    - "Московская обл." → '50'
+    - "г. Москва"       → '77'
+    - "Татарстан респ"  → '16'
+    - "Коми респ"       → '11' (а "Комиссия" - None)
+    - "Прием заявок"    → None
+    
+    ВОЗВРАЩАЕТ:
+    - Двузначный код субъекта или None, если регион не найден
+    """
+    
+    if not text:
+        return None
+    try:
+        return REGION_CACHE[text]
+    except KeyError:
+        pass
+    
+    code = None
+    if REGION_LETTERS_PATTERN.search(text):
+        terms = get_region_terms(text)
+        # Самое левое совпадение, из них - самое длинное
+        for start in range(len(terms)):
+            node = REGION_TRIE
+            for term in terms[start:]:
+                node = node.get(term)
+                if node is None:
+                    break
+                code = node.get(REGION_TRIE_CODE, code)
+            if code is not None:
+                break
+    
+    if len(REGION_CACHE) < REGION_CACHE_SIZE:
+        REGION_CACHE[text] = code
+    return code
+
+
+def get_region_name(text):
+    """
+    ЕДИНОЕ НАЗВАНИЕ РЕГИОНА: "Московская обл" → "Московская область"
+    (если регион не найден в справочнике - сам текст)
+    """
+    
+    code = find_region_code(text)
+    return REGION_NAMES[code] if code is not None else text
+
+
+def parse_region_arg(text):
+    """
+    КОД РЕГИОНА ИЗ АРГУМЕНТА --region: код ("50"), название или вариант
+    ("Московская обл", "спб"). None - регион не найден
+    """
+    
+    text = text.strip()
+    if text.isdigit() and text.zfill(2) in REGION_NAMES:
+        return text.zfill(2)
+    return find_region_code(text)
+
+
+# ИНДЕКС ЛОТОВ ПО РЕГИОНАМ
+# ============================================================
+# Для каждого кода региона хранится список номеров лотов, поэтому
+# число лотов в регионе и сами лоты региона берутся готовыми, без
+# просмотра всего списка. Лоты без распознанного региона лежат
+# под кодом None.
+
+def create_region_facets(lots=()):
+    """
+    СОЗДАНИЕ ИНДЕКСА ЛОТОВ ПО РЕГИОНАМ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь:
+      'lots'    - лоты по номерам
+      'regions' - код региона → номера его лотов (по возрастанию)
+    """
+    
+    facets = {'lots': [], 'regions': {}}
+    add_to_region_facets(facets, lots)
+    return facets
+
+
+def add_to_region_facets(facets, lots):
+    """
+    ДОБАВЛЕНИЕ ЛОТОВ В ИНДЕКС ПО РЕГИОНАМ
+    """
+    
+    regions = facets['regions']
+    for lot in lots:
+        code = find_region_code(lot['region'])
+        regions.setdefault(code, []).append(len(facets['lots']))
+        facets['lots'].append(lot)
+
+
+def remove_from_region_facets(facets, doc):
+    """
+    УДАЛЕНИЕ ЛОТА С НОМЕРОМ doc ИЗ ИНДЕКСА ПО РЕГИОНАМ
+    (номера остальных лотов не меняются)
+    """
+    
+    lot = facets['lots'][doc]
+    if lot is None:
+        return
+    
+    code = find_region_code(lot['region'])
+    docs = facets['regions'][code]
+    del docs[bisect.bisect_left(docs, doc)]
+    if not docs:
+        del facets['regions'][code]
+    facets['lots'][doc] = None
+
+
+def get_region_counts(facets):
+    """
+    ЧИСЛО ЛОТОВ ПО РЕГИОНАМ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Список (код, название, число лотов) по убыванию числа лотов
+      (код None - регион не распознан)
+    """
+    
+    counts = [(code, REGION_NAMES.get(code, '(не распознан)'), len(docs))
+              for code, docs in facets['regions'].items()]
+    counts.sort(key=lambda row: row[2], reverse=True)
+    return counts
+
+
+def get_region_lots(facets, codes):
+    """
+    ЛОТЫ ИЗ ЗАДАННЫХ РЕГИОНОВ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - facets: индекс из create_region_facets()
+    - codes: коды регионов
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов в исходном порядке
+    """
+    
+    lists = [facets['regions'].get(code, []) for code in set(codes)]
+    docs = lists[0] if len(lists) == 1 else sorted(doc for docs in lists for doc in docs)
+    lots = facets['lots']
+    return [lots[doc] for doc in docs]
+
+
+def print_region_counts(counts):
+    """
+    ВЫВОД ЧИСЛА ЛОТОВ ПО РЕГИОНАМ
+    """
+    
+    print("\n📍 ЛОТЫ ПО РЕГИОНАМ:")
+    for code, name, count in counts:
+        print(f"   {code or '--'}  {name:<45}{count:>7}")
+
+
+# ДЕТАЛИ ЛОТОВ
+# ============================================================
+# На странице лота (ссылка 'link') есть данные, которых нет в списке:
+# даты торгов, площадь, организатор, шаг аукциона. Страницы лотов
+# загружаются параллельно, а готовые лоты выдаются сразу, как только
+# пришла их страница, не дожидаясь остальных.
+
+# Поля страницы лота: поле → слова в подписи (в нижнем регистре).
+# Порядок важен: более точные подписи проверяются раньше.
+DETAIL_FIELD_KEYWORDS = (
+    ('application_start', ('начала приема', 'начала подачи', 'начало приема', 'начало подачи')),
+    ('application_end', ('окончания приема', 'окончания подачи', 'окончание приема', 'окончание подачи')),
+    ('auction_date', ('дата проведения', 'дата торгов', 'дата аукциона', 'время проведения')),
+    ('area', ('площадь',)),
+    ('organizer', ('организатор',)),
+    ('bid_step', ('шаг аукциона', 'шаг торгов', 'шаг повышения', 'шаг понижения')),
+)
+
+# Подписи полей страницы лота при выводе
+DETAIL_FIELD_LABELS = (
+    ('auction_date', '📅 Дата торгов'),
+    ('application_start', '📝 Начало приема заявок'),
+    ('application_end', '⏳ Окончание приема заявок'),
+    ('area', '📐 Площадь'),
+    ('organizer', '🏛  Организатор'),
+    ('bid_step', '📶 Шаг аукциона'),
+)
+
+# Через сколько часов данные со страницы лота считаются устаревшими
+DEFAULT_ENRICH_MAX_AGE_HOURS = 24
+
+
+def parse_lot_details(html):
+    """
+    РАЗБОР СТРАНИЦЫ ЛОТА
+    ============================================
+    
+    На странице лота данные записаны парами "подпись - значение"
+    в строках таблиц:
+        | Дата проведения торгов: | 12-05-2024 10:00 |
+        | Площадь:                | 2890 кв.м.       |
+    
+    Подпись сравнивается со словами из DETAIL_FIELD_KEYWORDS.
+    
+    Если установлен lxml, страница разбирается им напрямую (дерево
+    строится на C, без объектов BeautifulSoup - страниц лотов много).
+    Без lxml используется BeautifulSoup, как раньше.
+    
+    ПАРАМЕТРЫ:
+    - html: HTML-код страницы лота
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь найденных полей, например
+      {'auction_date': '12-05-2024 10:00', 'area': '2890 кв.м.'}
+    """
+    
+    details = {}
+    
+    for label, value in iter_detail_rows(html):
+        # Пробелы и переводы строк внутри текста схлопываем до одного
+        label = ' '.join(label.lower().split())
+        value = ' '.join(value.split())
+        if not label or not value:
+            continue
+        
+        for field, keywords in DETAIL_FIELD_KEYWORDS:
+            if field not in details and any(word in label for word in keywords):
+                details[field] = value
+                break
+    
+    return details
+
+
+def iter_detail_rows(html):
+    """
+    ПАРЫ "ПОДПИСЬ - ЗНАЧЕНИЕ" ИЗ СТРОК ТАБЛИЦ СТРАНИЦЫ ЛОТА
+    ============================================
+    
+    Берутся первые две ячейки (<td>/<th>) каждой строки <tr>,
+    включая строки вложенных таблиц.
+    
+    ВЫДАЕТ (yield):
+    - Пары (текст подписи, текст значения); куски текста внутри
+      ячейки склеиваются через пробел
+    """
+    
+    if etree is None:
+        soup = BeautifulSoup(html, 'html.parser')
+        for row in soup.find_all('tr'):
+            cells = row.find_all(['td', 'th'], recursive=False)
+            if len(cells) >= 2:
+                yield cells[0].get_text(' ', strip=True), cells[1].get_text(' ', strip=True)
+        return
+    
+    # На пустом документе lxml выдает ошибку, а не пустое дерево
+    if not html.strip():
+        return
+    
+    parser = etree.HTMLParser(encoding='utf-8')
+    root = etree.fromstring(html.encode('utf-8'), parser)
+    if root is None:
+        return
+    
+    for row in root.iter('tr'):
+        cells = [cell for cell in row if cell.tag in ('td', 'th')]
+        if len(cells) >= 2:
+            yield get_lxml_text(cells[0], ' '), get_lxml_text(cells[1], ' ')
+
+
+def get_recent_details(conn, link, max_age):
+    """
+    ДАННЫЕ СТРАНИЦЫ ЛОТА ИЗ ХРАНИЛИЩА (ЕСЛИ ОНИ СВЕЖИЕ)
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - conn: соединение из open_lot_store()
+    - link: ссылка на лот
+    - max_age: максимальный возраст данных в секундах
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь полей или None, если данных нет или они устарели
+    """
+    
+    row = conn.execute('SELECT data, fetched_at FROM lot_details WHERE link = ?',
+                       (link,)).fetchone()
+    if row is None or time.time() - row['fetched_at'] > max_age:
+        return None
+    return json.loads(row['data'])
+
+
+def save_lot_details(conn, link, details):
+    """
+    СОХРАНЕНИЕ ДАННЫХ СТРАНИЦЫ ЛОТА В ХРАНИЛИЩЕ
+    """
+    
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO lot_details (link, data, fetched_at) VALUES (?, ?, ?)',
+                     (link, json.dumps(details, ensure_ascii=False), time.time()))
+
+
+def fetch_with_host_limit(host_limits, session, url, limiter=None, in_flight=None, cache=None):
+    """
+    ЗАГРУЗКА СТРАНИЦЫ С ОГРАНИЧЕНИЕМ ОДНОВРЕМЕННЫХ ЗАПРОСОВ К САЙТУ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - host_limits: словарь {'per_host': N, 'semaphores': {}, 'lock': ...}
+      из enrich_lots(); к одному сайту идет не больше N запросов сразу
+    - остальные - как у fetch_page()
+    """
+    
+    host = urlsplit(url).netloc
+    with host_limits['lock']:
+        semaphore = host_limits['semaphores'].get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(host_limits['per_host'])
+            host_limits['semaphores'][host] = semaphore
+    
+    with semaphore:
+        return fetch_page(session, url, limiter, in_flight, cache)
+
+
+def enrich_lots(session, lots, workers=8, per_host=4, limiter=None, in_flight=None,
+                cache=None, store=None, max_age=DEFAULT_ENRICH_MAX_AGE_HOURS * 3600):
+    """
+    ДОПОЛНЕНИЕ ЛОТОВ ДАННЫМИ СО СТРАНИЦ ЛОТОВ
+    ============================================
+    
+    АЛГОРИТМ:
+    1. Лоты без ссылки выдаются сразу, без изменений
+    2. Одинаковые ссылки загружаются один раз
+    3. Если в хранилище есть свежие данные (моложе max_age) -
+       страница не загружается
+    4. Остальные страницы загружаются в пуле потоков; как только
+       пришла очередная страница, ее лоты выдаются (yield).
+       Одновременно загружается не больше workers страниц, и новая
+       загрузка начинается только на место завершившейся: если
+       получатель перестал брать лоты (--top, Ctrl+C, ошибка записи),
+       остаток списка не загружается, и выход не ждет сотен запросов
+    5. Если страницу не удалось загрузить или разобрать, ошибка
+       выводится, а лоты выдаются без дополнительных полей
+    
+    ПАРАМЕТРЫ:
+    - session: сессия из create_session()
+    - lots: список лотов
+    - workers: сколько страниц загружать одновременно
+    - per_host: сколько одновременных запросов к одному сайту
+    - limiter, in_flight, cache: как у fetch_page()
+    - store: хранилище из open_lot_store() (или None)
+    - max_age: возраст данных в секундах, после которого
+      страница лота загружается заново
+    
+    ВЫДАЕТ (yield):
+    - Лоты (словари) с дополнительными полями из DETAIL_FIELD_KEYWORDS
+    """
+    
+    # 1. ГРУППИРОВКА ЛОТОВ ПО ССЫЛКЕ
+    # ========================================
+    by_link = {}
+    for lot in lots:
+        if lot['link']:
+            by_link.setdefault(lot['link'], []).append(lot)
+        else:
+            yield lot
+    
+    # 2. СВЕЖИЕ ДАННЫЕ ИЗ ХРАНИЛИЩА
+    # ========================================
+    to_fetch = []
+    for link, link_lots in by_link.items():
+        details = get_recent_details(store, link, max_age) if store is not None else None
+        if details is None:
+            to_fetch.append(link)
+            continue
+        for lot in link_lots:
+            lot.update(details)
+            yield lot
+    
+    if not to_fetch:
+        return
+    
+    # 3. ПАРАЛЛЕЛЬНАЯ ЗАГРУЗКА СТРАНИЦ ЛОТОВ
+    # ========================================
+    host_limits = {'per_host': per_host, 'semaphores': {}, 'lock': threading.Lock()}
+    waiting = iter(to_fetch)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Словарь "задача → ссылка"; в нем не больше workers задач
+        running = {}
+        
+        def submit_next():
+            link = next(waiting, None)
+            if link is not None:
+                running[executor.submit(fetch_with_host_limit, host_limits, session, link,
+                                        limiter, in_flight, cache)] = link
+        
+        for _ in range(workers):
+            submit_next()
+        
+        while running:
+            # Ждем, пока завершится хотя бы одна загрузка
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            future = done.pop()
+            link = running.pop(future)
+            
+            # Новая загрузка - на место завершившейся, до выдачи лотов
+            submit_next()
+            
+            # Лот без деталей лучше, чем потерянный лот: ни ошибка сети,
+            # ни странная разметка одной страницы не останавливают остальные
+            try:
+                html = future.result()
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Не удалось загрузить страницу лота {link}: {e}")
+                details = {}
+            else:
+                try:
+                    details = parse_lot_details(html)
+                except Exception as e:
+                    print(f"❌ Не удалось разобрать страницу лота {link}: {e!r}")
+                    count_metric('torgi_detail_parse_failures_total')
+                    details = {}
+                else:
+                    if store is not None:
+                        save_lot_details(store, link, details)
+            
+            for lot in by_link[link]:
+                lot.update(details)
+                yield lot
+
+
+# ВЫВОД РЕЗУЛЬТАТОВ (ПРИЕМНИКИ)
+# ============================================================
+# "Приемник" (sink) получает лоты по одному, сразу как они готовы,
+# и записывает их в выбранном формате. Запись идет через буфер,
+# а не отдельной операцией на каждую строку.
+#
+# Приемник - это словарь с двумя функциями:
+# - sink['write'](lot)    - записать один лот
+# - sink['close'](ok)     - дописать остатки и закрыть файл; ok=False -
+#                           запуск не удался, файл не нужен
+#
+# Файл пишется под временным именем и получает свое имя, только когда
+# все лоты записаны: после неудачного запуска не остается файла с
+# частью лотов, который можно принять за полный результат.
+
+# Форматы вывода
+SINK_FORMATS = ('console', 'jsonl', 'csv', 'parquet', 'arrow', 'sqlite')
+
+# Форматы, которые пишутся только в файл (не в стандартный вывод)
+SINK_FILE_FORMATS = ('parquet', 'sqlite')
+
+# Размер буфера записи (байт) и пачки строк для Parquet/Arrow
+SINK_BUFFER_SIZE = 1024 * 1024
+SINK_BATCH_ROWS = 10000
+
+# Колонки CSV/Parquet: поля лота и поля со страницы лота
+SINK_FIELDS = LOT_FIELDS + tuple(field for field, label in DETAIL_FIELD_LABELS)
+
+
+def open_output_stream(path, stdout, binary=False):
+    """
+    ОТКРЫТИЕ ФАЙЛА ДЛЯ ЗАПИСИ (ИЛИ STDOUT, ЕСЛИ path == '-')
+    ============================================
+    
+    Файл пишется под именем path + '.tmp' (см. finish_output_file).
+    
+    ВОЗВРАЩАЕТ:
+    - Пару (поток, функция завершения finish(ok))
+    """
+    
+    if path == '-':
+        stream = stdout.buffer if binary else stdout
+        return stream, lambda ok=True: stream.flush()
+    
+    tmp_path = path + '.tmp'
+    if binary:
+        stream = open(tmp_path, 'wb', buffering=SINK_BUFFER_SIZE)
+    else:
+        stream = open(tmp_path, 'w', encoding='utf-8', newline='', buffering=SINK_BUFFER_SIZE)
+    
+    def finish(ok=True):
+        stream.close()
+        finish_output_file(path, ok)
+    
+    return stream, finish
+
+
+def finish_output_file(path, ok):
+    """
+    ЗАВЕРШЕНИЕ ЗАПИСИ ФАЙЛА
+    ============================================
+    
+    ok=True  - временный файл path + '.tmp' получает имя path
+    ok=False - временный файл удаляется (прежний файл path не трогаем)
+    """
+    
+    tmp_path = path + '.tmp'
+    if ok:
+        os.replace(tmp_path, path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+
+def open_sink(fmt, path='-', stdout=None):
+    """
+    СОЗДАНИЕ ПРИЕМНИКА ЛОТОВ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - fmt: формат из SINK_FORMATS:
+        'console' - красивый вывод, как print_lots()
+        'jsonl'   - один лот = одна строка JSON
+        'csv'     - таблица CSV с колонками SINK_FIELDS
+        'parquet' - колоночный формат Parquet (нужен pyarrow)
+        'arrow'   - поток Arrow IPC (нужен pyarrow)
+        'sqlite'  - таблица lots в файле SQLite
+    - path: путь к файлу или '-' для стандартного вывода
+    - stdout: поток стандартного вывода (по умолчанию sys.stdout)
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь {'write': функция(lot), 'close': функция(ok=True)}
+    
+    ОШИБКИ:
+    - ValueError для форматов SINK_FILE_FORMATS в стандартный вывод
+    """
+    
+    stdout = stdout or sys.stdout
+    
+    if fmt in SINK_FILE_FORMATS and path == '-':
+        raise ValueError(f"формат {fmt} можно записать только в файл: укажите --output")
+    if fmt in ('parquet', 'arrow'):
+        return open_arrow_sink(fmt, path, stdout)
+    if fmt == 'sqlite':
+        return open_sqlite_sink(path)
+    
+    stream, close = open_output_stream(path, stdout)
+    
+    # 1. JSONL
+    # ========================================
+    if fmt == 'jsonl':
+        def write(lot):
+            stream.write(json.dumps(dict(lot), ensure_ascii=False))
+            stream.write('\n')
+        return {'write': write, 'close': close}
+    
+    # 2. CSV
+    # ========================================
+    if fmt == 'csv':
+        # extrasaction='ignore' - лишние поля лота (например old_price) не пишем
+        writer = csv.DictWriter(stream, fieldnames=SINK_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        return {'write': writer.writerow, 'close': close}
+    
+    # 3. КОНСОЛЬ
+    # ========================================
+    if fmt == 'console':
+        counter = {'count': 0}
+        
+        def write(lot):
+            counter['count'] += 1
+            print_lot(counter['count'], lot, stream)
+        
+        def close_console(ok=True):
+            if ok:
+                print(f"\n📊 Всего лотов: {counter['count']}", file=stream)
+            close(ok)
+        
+        return {'write': write, 'close': close_console}
+    
+    raise ValueError(f"Неизвестный формат вывода: {fmt}")
+
+
+def open_arrow_sink(fmt, path, stdout):
+    """
+    ПРИЕМНИК В КОЛОНОЧНОМ ФОРМАТЕ (PARQUET ИЛИ ARROW)
+    ============================================
+    
+    Лоты копятся пачками по SINK_BATCH_ROWS штук; каждая пачка
+    превращается в колонки и дописывается в файл.
+    
+    ОШИБКИ:
+    - RuntimeError, если библиотека pyarrow не установлена
+    """
+    
+    if pa is None:
+        raise RuntimeError("для форматов parquet и arrow установите pyarrow: pip install pyarrow")
+    
+    # Все колонки - строки, кроме цены
+    schema = pa.schema([(field, pa.float64() if field == 'price' else pa.string())
+                        for field in SINK_FIELDS])
+    
+    stream, finish = open_output_stream(path, stdout, binary=True)
+    if fmt == 'parquet':
+        writer = pq.ParquetWriter(stream, schema)
+    else:
+        writer = pa.ipc.new_stream(stream, schema)
+    
+    batch = []
+    
+    def flush():
+        if batch:
+            columns = {field: [lot.get(field) for lot in batch] for field in SINK_FIELDS}
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            batch.clear()
+    
+    def write(lot):
+        batch.append(lot)
+        if len(batch) >= SINK_BATCH_ROWS:
+            flush()
+    
+    def close(ok=True):
+        # Без ok файл все равно удаляется - последнюю пачку не дописываем
+        if ok:
+            flush()
+        writer.close()
+        finish(ok)
+    
+    return {'write': write, 'close': close}
+
+
+def open_sqlite_sink(path):
+    """
+    ПРИЕМНИК В ФАЙЛ SQLITE (ТАБЛИЦА lots С КОЛОНКАМИ SINK_FIELDS)
+    ============================================
+    
+    Это выгрузка для других программ, а не хранилище --db: файл
+    каждый раз создается заново. Лоты записываются пачками по
+    SINK_BATCH_ROWS штук.
+    """
+    
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    conn = sqlite3.connect(tmp_path)
+    columns = ', '.join(f"{field} {'REAL' if field == 'price' else 'TEXT'}" for field in SINK_FIELDS)
+    conn.execute(f'CREATE TABLE lots ({columns})')
+    insert = f"INSERT INTO lots VALUES ({', '.join('?' * len(SINK_FIELDS))})"
+    
+    batch = []
+    
+    def flush():
+        if batch:
+            conn.executemany(insert, batch)
+            batch.clear()
+    
+    def write(lot):
+        batch.append(tuple(lot.get(field) for field in SINK_FIELDS))
+        if len(batch) >= SINK_BATCH_ROWS:
+            flush()
+    
+    def close(ok=True):
+        if ok:
+            flush()
+            conn.commit()
+        conn.close()
+        finish_output_file(path, ok)
+    
+    return {'write': write, 'close': close}
+
+
+def write_lots(lots, sink):
+    """
+    ЗАПИСЬ ЛОТОВ В ПРИЕМНИК
+    ============================================
+    
+    Если во время записи возникла ошибка (лоты - генератор, и ошибка
+    загрузки или разбора возникает прямо здесь), приемник закрывается
+    с ok=False, а ошибка передается дальше.
+    
+    ПАРАМЕТРЫ:
+    - lots: список или генератор лотов
+    - sink: приемник из open_sink()
+    
+    ВОЗВРАЩАЕТ:
+    - Количество записанных лотов
+    """
+    
+    count = 0
+    try:
+        for lot in lots:
+            sink['write'](lot)
+            count += 1
+    except BaseException:
+        sink['close'](False)
+        raise
+    sink['close']()
+    return count
+
+
+# ХРАНИЛИЩЕ ЛОТОВ (SQLITE)
+# ============================================================
+# Лоты прошлых запусков хранятся в локальной базе SQLite (один файл).
+# При каждом запуске новые данные сравниваются с базой, и программа
+# сообщает только об изменениях: новые лоты, снятые лоты, новые цены.
+
+def get_name_hash(name):
+    """
+    ХЕШ НАЗВАНИЯ ЛОТА
+    ============================================
+    
+    Название приводится к нижнему регистру, лишние пробелы убираются,
+    затем считается SHA-1. Одинаковые названия → одинаковый хеш.
+    """
+    
+    normalized = ' '.join(name.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+# Версия схемы хранилища (PRAGMA user_version):
+# 1 - ключ лота считается через get_lot_identity()
+LOT_STORE_VERSION = 1
+
+
+def get_lot_key(lot):
+    """
+    КЛЮЧ ЛОТА В ХРАНИЛИЩЕ
+    ============================================
+    
+    Тот же ключ, что и для поиска повторов (get_lot_identity):
+    номер лота из ссылки, иначе ссылка, иначе хеш названия,
+    региона и цены. Так --db, --seen-db и --watch узнают лот
+    одинаково.
+    """
+    
+    return get_lot_identity(lot)
+
+
+def migrate_lot_store(conn):
+    """
+    ПЕРЕХОД СТАРОГО ХРАНИЛИЩА НА НОВЫЕ КЛЮЧИ
+    ============================================
+    
+    В базах версии 0 ключом была ссылка или 'name:' + хеш названия.
+    Ключи всех строк пересчитываются через get_lot_key(); если
+    несколько старых строк получили один ключ, остается строка,
+    которая была видна последней.
+    """
+    
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= LOT_STORE_VERSION:
+        return
+    
+    with conn:
+        rows = {}
+        for row in conn.execute('SELECT * FROM lots ORDER BY last_seen'):
+            rows[get_lot_key(row_to_lot(row))] = dict(row)
+        
+        conn.execute('DELETE FROM lots')
+        conn.executemany('''
+            INSERT INTO lots (lot_key, link, name_hash, name, region, price, price_text,
+                              source, first_seen, last_seen, removed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(key, row['link'], row['name_hash'], row['name'], row['region'],
+               row['price'], row['price_text'], row['source'], row['first_seen'],
+               row['last_seen'], row['removed_at']) for key, row in rows.items()])
+        
+        conn.execute(f'PRAGMA user_version = {LOT_STORE_VERSION}')
+
+
+def open_lot_store(path):
+    """
+    ОТКРЫТИЕ (ИЛИ СОЗДАНИЕ) ХРАНИЛИЩА ЛОТОВ
+    ============================================
+    
+    Таблица lots:
+    - lot_key    - ключ лота (см. get_lot_key)
+    - link, name_hash, name, region, price, price_text - данные лота
+    - source     - адрес списка, с которого получен лот
+    - first_seen, last_seen - когда лот появился и когда был виден последний раз
+    - removed_at - когда лот пропал из списка (NULL - лот на месте)
+    
+    Индексы по ссылке, хешу названия и цене ускоряют поиск и сравнение.
+    Базы старых версий переводятся на новые ключи (migrate_lot_store).
+    
+    Таблица lot_details - данные со страниц лотов (см. enrich_lots):
+    - link - ссылка на лот, data - поля в формате JSON,
+    - fetched_at - когда страница лота была загружена
+    
+    ПАРАМЕТРЫ:
+    - path: путь к файлу базы (например "torgi_lots.db")
+    
+    ВОЗВРАЩАЕТ:
+    - Соединение sqlite3.Connection
+    """
+    
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row  # строки можно читать как словари
+    
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS lots (
+            lot_key    TEXT PRIMARY KEY,
+            link       TEXT NOT NULL,
+            name_hash  TEXT NOT NULL,
+            name       TEXT NOT NULL,
+            region     TEXT NOT NULL,
+            price      REAL NOT NULL,
+            price_text TEXT NOT NULL,
+            source     TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            last_seen  REAL NOT NULL,
+            removed_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_lots_link ON lots(link);
+        CREATE INDEX IF NOT EXISTS idx_lots_name_hash ON lots(name_hash);
+        CREATE INDEX IF NOT EXISTS idx_lots_price ON lots(price);
+        CREATE INDEX IF NOT EXISTS idx_lots_source ON lots(source, removed_at);
+        
+        CREATE TABLE IF NOT EXISTS lot_details (
+            link       TEXT PRIMARY KEY,
+            data       TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+    ''')
+    migrate_lot_store(conn)
+    
+    return conn
+
+
+def row_to_lot(row):
+    """
+    СТРОКА ХРАНИЛИЩА → ЛОТ (как в parse_lots_from_table)
+    """
+    
+    return Lot(row['name'], row['region'], row['price'], row['link'], row['price_text'])
+
+
+def update_lot_store(conn, lots, source, previous_sources=(), now=None):
+    """
+    ЗАПИСЬ ЛОТОВ В ХРАНИЛИЩЕ И ПОИСК ИЗМЕНЕНИЙ
+    ============================================
+    
+    АЛГОРИТМ:
+    1. Лоты текущего запуска кладутся во временную таблицу
+    2. Сравнение с базой делает сама SQLite (через индексы):
+       - новые: ключа нет в базе (или лот был снят и вернулся)
+       - с новой ценой: ключ есть, цена другая
+       - снятые: лот из того же списка (source) есть в базе,
+         но в текущем запуске его нет
+    3. Лоты добавляются/обновляются в базе, снятые помечаются
+    
+    ПАРАМЕТРЫ:
+    - conn: соединение из open_lot_store()
+    - lots: список лотов текущего запуска
+    - source: адрес списка или снимок --replay (снятыми считаются
+      только лоты этого списка)
+    - previous_sources: прошлые снимки того же списка - их лоты,
+      которых нет в текущем, тоже считаются снятыми
+    - now: время запуска (None - текущее; для снимка - его дата)
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь:
+      {'new': [лоты], 'changed': [лоты с полем 'old_price'], 'removed': [лоты]}
+    """
+    
+    if now is None:
+        now = time.time()
+    sources = (source,) + tuple(previous_sources)
+    source_marks = ', '.join('?' * len(sources))
+    
+    with conn:  # одна транзакция: либо все изменения, либо ничего
+        conn.execute('DROP TABLE IF EXISTS temp.current_run')
+        conn.execute('''
+            CREATE TEMP TABLE current_run (
+                lot_key TEXT PRIMARY KEY, link TEXT, name_hash TEXT, name TEXT,
+                region TEXT, price REAL, price_text TEXT
+            )
+        ''')
+        conn.executemany(
+            'INSERT OR REPLACE INTO current_run VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(get_lot_key(lot), lot['link'], get_name_hash(lot['name']), lot['name'],
+              lot['region'], lot['price'], lot['price_text']) for lot in lots])
+        
+        # 1. НОВЫЕ ЛОТЫ
+        new = [row_to_lot(row) for row in conn.execute('''
+            SELECT c.* FROM current_run c
+            LEFT JOIN lots l ON l.lot_key = c.lot_key
+            WHERE l.lot_key IS NULL OR l.removed_at IS NOT NULL
+        ''')]
+        
+        # 2. ЛОТЫ С ИЗМЕНИВШЕЙСЯ ЦЕНОЙ
+        changed = []
+        for row in conn.execute('''
+            SELECT c.*, l.price AS old_price FROM current_run c
+            JOIN lots l ON l.lot_key = c.lot_key
+            WHERE l.removed_at IS NULL AND l.price != c.price
+        '''):
+            lot = row_to_lot(row)
+            lot['old_price'] = row['old_price']
+            changed.append(lot)
+        
+        # 3. СНЯТЫЕ ЛОТЫ
+        removed = [row_to_lot(row) for row in conn.execute(f'''
+            SELECT * FROM lots
+            WHERE source IN ({source_marks}) AND removed_at IS NULL
+              AND lot_key NOT IN (SELECT lot_key FROM current_run)
+        ''', sources)]
+        
+        # ОБНОВЛЕНИЕ БАЗЫ
+        # ========================================
+        conn.execute(f'''
+            UPDATE lots SET removed_at = ?
+            WHERE source IN ({source_marks}) AND removed_at IS NULL
+              AND lot_key NOT IN (SELECT lot_key FROM current_run)
+        ''', (now,) + sources)
+        
+        # UPSERT: вставить новый лот или обновить существующий
+        conn.execute('''
+            INSERT INTO lots (lot_key, link, name_hash, name, region, price, price_text,
+                              source, first_seen, last_seen, removed_at)
+            SELECT lot_key, link, name_hash, name, region, price, price_text, ?, ?, ?, NULL
+            FROM current_run WHERE true
+            ON CONFLICT(lot_key) DO UPDATE SET
+                link = excluded.link,
+                name_hash = excluded.name_hash,
+                name = excluded.name,
+                region = excluded.region,
+                price = excluded.price,
+                price_text = excluded.price_text,
+                source = excluded.source,
+                last_seen = excluded.last_seen,
+                removed_at = NULL
+        ''', (source, now, now))
+        
+        conn.execute('DROP TABLE temp.current_run')
+    
+    return {'new': new, 'changed': changed, 'removed': removed}
+
+
+def print_changes(changes):
+    """
+    ВЫВОД ИЗМЕНЕНИЙ С ПРОШЛОГО ЗАПУСКА
+    ============================================
+    
+    Выводит количество новых, измененных и снятых лотов,
+    а также старую и новую цену для измененных лотов
+    и список снятых лотов.
+    """
+    
+    print(f"\n🗄  ИЗМЕНЕНИЯ С ПРОШЛОГО ЗАПУСКА: "
+          f"новых {len(changes['new'])}, "
+          f"с новой ценой {len(changes['changed'])}, "
+          f"снято {len(changes['removed'])}")
+    
+    if changes['changed']:
+        print("\n💱 ИЗМЕНИЛАСЬ ЦЕНА:")
+        for lot in changes['changed']:
+            print(f"    {lot['old_price']:,.2f} → {lot['price']:,.2f} руб - {lot['name'][:60]}...")
+    
+    if changes['removed']:
+        print_lots(changes['removed'], "🗑  СНЯТЫЕ ЛОТЫ")
+
+
+# КЕШ HTTP-ОТВЕТОВ
+# ============================================================
+# Загруженные страницы хранятся на диске в сжатом виде (gzip).
+# При повторной загрузке сервер спрашивают "изменилась ли страница?"
+# (заголовки If-None-Match / If-Modified-Since). Если сервер отвечает
+# 304 Not Modified - страница берется с диска. Если сервер такие
+# заголовки не поддерживает, страница скачивается, но сравнивается
+# с сохраненной по хешу содержимого - и для неизмененной страницы
+# можно взять уже разобранные лоты, не разбирая HTML заново.
+#
+# Файлы кеша:
+# - index.json          - сведения обо всех записях
+# - <ключ>.html.gz      - HTML страницы
+# - <ключ>.lots.json.gz - лоты, разобранные с этой страницы
+
+# Папка кеша и его размер по умолчанию
+DEFAULT_CACHE_DIR = '.torgi_cache'
+DEFAULT_CACHE_SIZE_MB = 200
+
+# Счетчики, которые считает разбор страницы. Они сохраняются вместе
+# с лотами, чтобы страница из кеша давала те же метрики, что и разобранная
+PARSE_METRIC_NAMES = ('torgi_rows_seen_total', 'torgi_rows_rejected_total',
+                      'torgi_duplicates_skipped_total', 'torgi_price_parse_failures_total')
+
+
+# Версия правил разбора страницы списка. Лоты в кеше, разобранные
+# другой версией, не используются. Число нужно увеличивать при любом
+# изменении, которое меняет лоты или счетчики разбора (find_data_in_cell,
+# схема колонок, parse_price, поля Lot); правки, не влияющие на
+# результат (вывод, кеш, наблюдение), версию не меняют:
+# 1 - схема колонок таблицы без заголовков - по рисунку первой строки
+PARSER_VERSION = 1
+
+# При переполнении кеш очищается до этой доли max_bytes: с запасом,
+# чтобы следующая же запись не запускала очистку снова
+CACHE_EVICT_TARGET = 0.9
+
+
+def open_response_cache(directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024,
+                        ttl=None):
+    """
+    ОТКРЫТИЕ КЕША HTTP-ОТВЕТОВ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - directory: папка для файлов кеша (создается при необходимости)
+    - max_bytes: максимальный размер кеша на диске; как только новая
+      запись его превышает, удаляются записи, которые дольше всех
+      не использовались (LRU)
+    - ttl: максимальный возраст записи в секундах (None - без ограничения)
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь с настройками, оглавлением и счетчиками кеша
+    """
+    
+    os.makedirs(directory, exist_ok=True)
+    
+    # Оглавление: ключ → сведения о записи
+    index_path = os.path.join(directory, 'index.json')
+    index = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            # Поврежденное оглавление - начинаем с пустого кеша
+            index = {}
+    
+    return {
+        'dir': directory,
+        'max_bytes': max_bytes,
+        'ttl': ttl,
+        'index': index,
+        'bytes': sum(meta['size'] for meta in index.values()),
+        'lock': threading.Lock(),
+        # Счетчики
+        'hits': 0,           # страница не изменилась (304 или тот же хеш)
+        'misses': 0,         # страница новая или изменилась
+        'not_modified': 0,   # из них ответов 304 Not Modified
+        'evictions': 0,      # удалено записей при очистке
+    }
+
+
+def get_cache_key(url):
+    """
+    КЛЮЧ ЗАПИСИ КЕША - ХЕШ SHA-256 ОТ АДРЕСА СТРАНИЦЫ
+    """
+    
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def get_cache_path(cache, key, suffix):
+    """
+    ПУТЬ К ФАЙЛУ ЗАПИСИ КЕША (suffix - '.html.gz' или '.lots.json.gz')
+    """
+    
+    return os.path.join(cache['dir'], key + suffix)
+
+
+def get_content_hash(text):
+    """
+    ХЕШ СОДЕРЖИМОГО СТРАНИЦЫ (SHA-256)
+    """
+    
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def get_cache_headers(cache, url):
+    """
+    ЗАГОЛОВКИ ДЛЯ УСЛОВНОГО ЗАПРОСА
+    ============================================
+    
+    Если страница уже есть в кеше, сервер можно спросить:
+    - If-None-Match: "отдай страницу, только если ее ETag другой"
+    - If-Modified-Since: "отдай страницу, только если она менялась после..."
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь заголовков (пустой, если страницы в кеше нет)
+    """
+    
+    key = get_cache_key(url)
+    with cache['lock']:
+        meta = cache['index'].get(key)
+    
+    headers = {}
+    if meta and os.path.exists(get_cache_path(cache, key, '.html.gz')):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+def store_cached_response(cache, url, response):
+    """
+    ОБРАБОТКА ОТВЕТА СЕРВЕРА С УЧЕТОМ КЕША
+    ============================================
+    
+    1. 304 Not Modified → страница берется с диска
+    2. 200 с тем же хешем содержимого → страница не изменилась,
+       сохраненный файл остается как есть
+    3. 200 с новым содержимым → страница сохраняется в кеш
+       (разобранные ранее лоты этой страницы удаляются); если кеш
+       стал больше max_bytes, он сразу очищается
+    
+    ВОЗВРАЩАЕТ:
+    - HTML-код страницы (строка) или None, если на ответ 304 копии
+      страницы уже нет: ее удалила очистка кеша, пока шел запрос
+    
+    ОШИБКИ:
+    - requests.exceptions.HTTPError для ответов с ошибкой
+    """
+    
+    key = get_cache_key(url)
+    html_path = get_cache_path(cache, key, '.html.gz')
+    now = time.time()
+    
+    # 1. СТРАНИЦА НЕ ИЗМЕНИЛАСЬ (304)
+    # ========================================
+    if response.status_code == 304:
+        try:
+            with gzip.open(html_path, 'rt', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        with cache['lock']:
+            meta = cache['index'].get(key)
+            if meta is None:
+                return None
+            meta['accessed_at'] = now
+            cache['hits'] += 1
+            cache['not_modified'] += 1
+        return text
+    
+    response.raise_for_status()
+    text = response.text
+    content_hash = get_content_hash(text)
+    
+    with cache['lock']:
+        meta = cache['index'].get(key)
+    
+    # 2. ТО ЖЕ СОДЕРЖИМОЕ (сервер не поддерживает условные запросы)
+    # ========================================
+    if meta and meta['content_hash'] == content_hash and os.path.exists(html_path):
+        with cache['lock']:
+            meta['etag'] = response.headers.get('ETag')
+            meta['last_modified'] = response.headers.get('Last-Modified')
+            meta['accessed_at'] = now
+            cache['hits'] += 1
+        return text
+    
+    # 3. НОВАЯ ИЛИ ИЗМЕНЕННАЯ СТРАНИЦА
+    # ========================================
+    # Сначала пишем во временный файл, потом переименовываем:
+    # так в кеше не окажется наполовину записанного файла
+    tmp_path = html_path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, html_path)
+    
+    # Лоты старой версии страницы больше не годятся
+    lots_path = get_cache_path(cache, key, '.lots.json.gz')
+    if os.path.exists(lots_path):
+        os.remove(lots_path)
+    
+    with cache['lock']:
+        old = cache['index'].get(key)
+        cache['index'][key] = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content_hash': content_hash,
+            'size': os.path.getsize(html_path),
+            'stored_at': now,
+            'accessed_at': now,
+            'lots_engine': None,
+            'lots_parser': None,
+        }
+        cache['bytes'] += cache['index'][key]['size'] - (old['size'] if old else 0)
+        cache['misses'] += 1
+        full = cache['bytes'] > cache['max_bytes']
+    
+    if full:
+        evict_cache_entries(cache, int(cache['max_bytes'] * CACHE_EVICT_TARGET))
+    return text
+
+
+def get_cached_lots(cache, url, html, engine):
+    """
+    ЛОТЫ, РАНЕЕ РАЗОБРАННЫЕ С ЭТОЙ ЖЕ СТРАНИЦЫ
+    ============================================
+    
+    Если содержимое страницы совпадает с сохраненным (по хешу),
+    а лоты разбирались тем же движком и той же версией программы
+    (PARSER_VERSION), повторный разбор не нужен. Счетчики разбора,
+    сохраненные вместе с лотами, добавляются к METRICS.
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов или None, если разбирать страницу придется заново
+    """
+    
+    key = get_cache_key(url)
+    with cache['lock']:
+        meta = cache['index'].get(key)
+    
+    if not meta or meta.get('lots_engine') != engine:
+        return None
+    if meta.get('lots_parser') != PARSER_VERSION:
+        return None
+    if meta['content_hash'] != get_content_hash(html):
+        return None
+    
+    try:
+        with gzip.open(get_cache_path(cache, key, '.lots.json.gz'), 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        lots = [make_lot(lot) for lot in data['lots']]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    
+    for name, labels, value in data.get('counters', ()):
+        count_metric(name, value, **dict(labels))
+    return lots
+
+
+def get_parse_counters():
+    """
+    ТЕКУЩИЕ ЗНАЧЕНИЯ СЧЕТЧИКОВ РАЗБОРА (PARSE_METRIC_NAMES)
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь (имя, метки) → значение
+    """
+    
+    with METRICS['lock']:
+        return {key: value for key, value in METRICS['values'].items()
+                if key[0] in PARSE_METRIC_NAMES}
+
+
+def get_counters_change(before, after):
+    """
+    НА СКОЛЬКО ВЫРОСЛИ СЧЕТЧИКИ: список ((имя, метки), прирост)
+    """
+    
+    return [(key, value - before.get(key, 0)) for key, value in after.items()
+            if value != before.get(key, 0)]
+
+
+def store_cached_lots(cache, url, html, lots, engine, counters=()):
+    """
+    СОХРАНЕНИЕ РАЗОБРАННЫХ ЛОТОВ СТРАНИЦЫ В КЕШ
+    ============================================
+    
+    Лоты сохраняются, только если страница есть в кеше
+    и ее содержимое не изменилось с момента загрузки.
+    
+    ПАРАМЕТРЫ:
+    - counters: счетчики разбора этой страницы - пары ((имя, метки), прирост)
+    """
+    
+    key = get_cache_key(url)
+    with cache['lock']:
+        meta = cache['index'].get(key)
+    
+    if not meta or meta['content_hash'] != get_content_hash(html):
+        return
+    
+    lots_path = get_cache_path(cache, key, '.lots.json.gz')
+    data = {
+        'lots': [dict(lot) for lot in lots],
+        'counters': [[name, labels, value] for (name, labels), value in counters
+                     if name in PARSE_METRIC_NAMES],
+    }
+    with gzip.open(lots_path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    
+    try:
+        size = os.path.getsize(get_cache_path(cache, key, '.html.gz')) + os.path.getsize(lots_path)
+    except OSError:
+        size = None
+    
+    with cache['lock']:
+        # Запись могла быть удалена очисткой кеша, пока лоты писались
+        stale = size is None or cache['index'].get(key) is not meta
+        if not stale:
+            meta['lots_engine'] = engine
+            meta['lots_parser'] = PARSER_VERSION
+            cache['bytes'] += size - meta['size']
+            meta['size'] = size
+        full = cache['bytes'] > cache['max_bytes']
+    
+    if stale:
+        if os.path.exists(lots_path):
+            os.remove(lots_path)
+    elif full:
+        evict_cache_entries(cache, int(cache['max_bytes'] * CACHE_EVICT_TARGET))
+
+
+def evict_cache_entries(cache, max_bytes=None):
+    """
+    ОЧИСТКА КЕША
+    ============================================
+    
+    1. Удаляются записи старше ttl
+    2. Если кеш все еще больше max_bytes, удаляются записи,
+       которые дольше всех не использовались (LRU)
+    
+    Вызывается при записи в кеш, как только он переполнен
+    (тогда max_bytes - CACHE_EVICT_TARGET от предела), и при
+    сохранении оглавления (max_bytes - сам предел cache['max_bytes']).
+    """
+    
+    now = time.time()
+    if max_bytes is None:
+        max_bytes = cache['max_bytes']
+    
+    with cache['lock']:
+        index = cache['index']
+        
+        # Сначала самые давно использованные
+        keys = sorted(index, key=lambda k: index[k]['accessed_at'])
+        total = sum(meta['size'] for meta in index.values())
+        
+        for key in keys:
+            expired = cache['ttl'] and now - index[key]['stored_at'] > cache['ttl']
+            if not expired and total <= max_bytes:
+                continue
+            
+            total -= index.pop(key)['size']
+            cache['evictions'] += 1
+            for suffix in ('.html.gz', '.lots.json.gz'):
+                path = get_cache_path(cache, key, suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+        
+        cache['bytes'] = total
+
+
+def save_response_cache(cache):
+    """
+    ОЧИСТКА КЕША И ЗАПИСЬ ОГЛАВЛЕНИЯ НА ДИСК
+    ============================================
+    
+    Оглавление пишется во временный файл и затем переименовывается:
+    если программа остановится во время записи, на диске останется
+    прежнее целое оглавление.
+    """
+    
+    evict_cache_entries(cache)
+    
+    index_path = os.path.join(cache['dir'], 'index.json')
+    with cache['lock']:
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(cache['index'], f, ensure_ascii=False)
+    os.replace(index_path + '.tmp', index_path)
+
+
+def close_response_cache(cache):
+    """
+    ЗАКРЫТИЕ КЕША: ОЧИСТКА И ЗАПИСЬ ОГЛАВЛЕНИЯ НА ДИСК
+    """
+    
+    save_response_cache(cache)
+
+
+def print_cache_stats(cache):
+    """
+    ВЫВОД СЧЕТЧИКОВ КЕША
+    """
+    
+    print(f"💾 Кеш: без изменений {cache['hits']} (из них 304: {cache['not_modified']}), "
+          f"загружено заново {cache['misses']}, удалено записей {cache['evictions']}")
+
+
+# ЗАГРУЗКА СТРАНИЦ
+# ============================================================
+
+def create_session(pool_size=10, retries=3, backoff=0.5):
+    """
+    СОЗДАНИЕ HTTP-СЕССИИ С ПУЛОМ СОЕДИНЕНИЙ
+    ============================================
+    
+    Одна сессия переиспользует TCP/TLS-соединения (keep-alive),
+    поэтому каждая следующая страница не платит за новое "рукопожатие".
+    
+    Неудачные запросы (обрыв связи, ответы 429 и 5xx) повторяются
+    автоматически с растущей паузой: backoff, 2*backoff, 4*backoff...
+    
+    ПАРАМЕТРЫ:
+    - pool_size: сколько соединений держать открытыми для одного сайта
+    - retries: сколько раз повторять неудачный запрос
+    - backoff: начальная пауза между повторами (секунды)
+    
+    ВОЗВРАЩАЕТ:
+    - Объект requests.Session
+    """
+    
+    session = requests.Session()
+    session.headers.update(REQUEST_HEADERS)
+    
+    # Правила повторов:
+    # status_forcelist - коды ответа, при которых повторяем запрос
+    # respect_retry_after_header - слушаемся сервера, если он просит подождать
+    retry = Retry(total=retries,
+                  backoff_factor=backoff,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True,
+                  raise_on_status=False)
+    
+    # Адаптер хранит пул соединений; подключаем его для http и https
+    adapter = HTTPAdapter(pool_connections=pool_size,
+                          pool_maxsize=pool_size,
+                          max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    
+    return session
+
+
+def create_rate_limiter(requests_per_second=None):
+    """
+    ОГРАНИЧИТЕЛЬ ЧАСТОТЫ ЗАПРОСОВ К ОДНОМУ САЙТУ
+    ============================================
+    
+    Хранит для каждого сайта (хоста) время, когда можно отправить
+    следующий запрос. Используется функцией wait_for_rate_limit().
+    
+    ПАРАМЕТРЫ:
+    - requests_per_second: не больше стольких запросов в секунду
+      на один сайт (None или 0 - без ограничения)
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь с настройками и состоянием ограничителя
+    """
+    
+    return {
+        'interval': 1.0 / requests_per_second if requests_per_second else 0,
+        'next_time': {},             # хост → время следующего разрешенного запроса
+        'lock': threading.Lock(),    # защита от одновременного изменения из потоков
+    }
+
+
+def wait_for_rate_limit(limiter, url):
+    """
+    ОЖИДАНИЕ ОЧЕРЕДИ НА ЗАПРОС
+    ============================================
+    
+    Если к сайту из url недавно уже обращались, функция "засыпает"
+    ровно на столько, чтобы не превысить заданную частоту.
+    
+    ПАРАМЕТРЫ:
+    - limiter: словарь из create_rate_limiter() (или None)
+    - url: адрес, к которому собираемся обратиться
+    """
+    
+    if not limiter or not limiter['interval']:
+        return
+    
+    host = urlsplit(url).netloc
+    
+    # Под блокировкой "бронируем" себе время запроса,
+    # а спим уже без блокировки, чтобы не мешать другим потокам
+    with limiter['lock']:
+        now = time.monotonic()
+        slot = max(now, limiter['next_time'].get(host, now))
+        limiter['next_time'][host] = slot + limiter['interval']
+    
+    delay = slot - now
+    if delay > 0:
+        time.sleep(delay)
+
+
+def fetch_page(session, url, limiter=None, in_flight=None, cache=None):
+    """
+    ЗАГРУЗКА ОДНОЙ СТРАНИЦЫ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - session: сессия из create_session()
+    - url: адрес страницы
+    - limiter: ограничитель частоты из create_rate_limiter() (или None)
+    - in_flight: семафор, ограничивающий число одновременных
+      запросов (или None - без ограничения)
+    - cache: кеш из open_response_cache() (или None - без кеша)
+    
+    ВОЗВРАЩАЕТ:
+    - HTML-код страницы (строка)
+    
+    ОШИБКИ:
+    - requests.exceptions.RequestException, если страницу загрузить не удалось
+    """
+    
+    # С кешем спрашиваем сервер, изменилась ли страница
+    headers = get_cache_headers(cache, url) if cache is not None else {}
+    response = send_page_request(session, url, headers, limiter, in_flight)
+    
+    if cache is not None:
+        text = store_cached_response(cache, url, response)
+        if text is None:
+            # Копию страницы удалила очистка кеша, пока шел запрос -
+            # загружаем страницу еще раз, уже без условий
+            response = send_page_request(session, url, {}, limiter, in_flight)
+            text = store_cached_response(cache, url, response)
+            if text is None:
+                raise requests.exceptions.HTTPError(f"Ответ 304 на безусловный запрос: {url}",
+                                                    response=response)
+        return text
+    
+    response.raise_for_status()
+    return response.text
+
+
+def send_page_request(session, url, headers, limiter=None, in_flight=None):
+    """
+    ОДИН GET-ЗАПРОС СТРАНИЦЫ (с ограничением частоты и числа запросов)
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Ответ сервера (ошибки HTTP не проверяются)
+    """
+    
+    wait_for_rate_limit(limiter, url)
+    
+    # Семафор - это "счетчик свободных мест": если все места заняты,
+    # поток ждет, пока кто-нибудь не закончит свой запрос
+    if in_flight is not None:
+        in_flight.acquire()
+    try:
+        start = time.perf_counter()
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    finally:
+        if in_flight is not None:
+            in_flight.release()
+    
+    # Время ответа (вместе с автоматическими повторами) и объем данных
+    host = urlsplit(url).netloc
+    observe_metric('torgi_http_request_seconds', time.perf_counter() - start, host=host)
+    count_metric('torgi_http_requests_total', host=host, status=response.status_code)
+    count_metric('torgi_http_bytes_downloaded_total', len(response.content), host=host)
+    return response
+
+
+def normalize_url(url):
+    """
+    ПРИВЕДЕНИЕ АДРЕСА К ЕДИНОМУ ВИДУ
+    ============================================
+    
+    Сортирует параметры запроса и убирает якорь (#...), чтобы
+    "?a=1&b=2" и "?b=2&a=1" считались одной и той же страницей.
+    """
+    
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+
+
+def get_page_number(url):
+    """
+    НОМЕР СТРАНИЦЫ ИЗ АДРЕСА
+    ============================================
+    
+    Ищет в адресе параметр из PAGE_PARAM_NAMES с числовым значением.
+    Для адреса без такого параметра (первая страница) возвращает 0.
+    """
+    
+    for key, value in parse_qsl(urlsplit(url).query):
+        if key in PAGE_PARAM_NAMES and value.isdigit():
+            return int(value)
+    return 0
+
+
+def get_page_key(url):
+    """
+    КЛЮЧ СТРАНИЦЫ ДЛЯ ОБХОДА
+    ============================================
+    
+    Первая страница открывается и без номера, и с номером:
+    "...&action=List" и "...&action=List&page=1" (или start=0) - это
+    одна страница. Ключ - адрес без параметра номера, если номер 0 или 1,
+    иначе - просто normalize_url(url).
+    """
+    
+    parts = urlsplit(url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    first = [(key, value) for key, value in params
+             if key in PAGE_PARAM_NAMES and value in ('0', '1')]
+    if not first:
+        return normalize_url(url)
+    
+    query = urlencode([param for param in params if param not in first])
+    return normalize_url(urlunsplit((parts.scheme, parts.netloc, parts.path, query, parts.fragment)))
+
+
+def iter_page_anchors(html):
+    """
+    ССЫЛКИ <a href> СТРАНИЦЫ (АДРЕС И ТЕКСТ)
+    ============================================
+    
+    Если установлен lxml, страница читается потоково (iterparse)
+    и разбираются только теги <a> - полное дерево BeautifulSoup
+    для каждой страницы обхода не строится.
+    Без lxml используется BeautifulSoup, как раньше.
+    
+    ВЫДАЕТ (yield):
+    - Кортеж (href, текст ссылки без пробелов по краям)
+    """
+    
+    if etree is None:
+        soup = BeautifulSoup(html, 'html.parser')
+        for a in soup.find_all('a', href=True):
+            yield a['href'], a.get_text(strip=True)
+        return
+    
+    source = io.BytesIO(html.encode('utf-8'))
+    events = etree.iterparse(source, events=('end',), tag='a',
+                             html=True, encoding='utf-8')
+    
+    for _, element in events:
+        href = element.get('href')
+        if href is not None:
+            yield href, get_lxml_text(element)
+        
+        # Освобождаем память: разобранная ссылка больше не нужна
+        element.clear(keep_tail=True)
+
+
+def find_page_links(html, page_url):
+    """
+    ПОИСК ССЫЛОК ПОСТРАНИЧНОЙ НАВИГАЦИИ
+    ============================================
+    
+    Ссылка считается ссылкой на другую страницу того же списка, если:
+    1. Она ведет на тот же раздел сайта (совпадают параметры class и action)
+    2. Текст ссылки - число ("2", "3", ...) ИЛИ в адресе есть параметр
+       с номером страницы (page=2, start=40, ...)
+    
+    ПАРАМЕТРЫ:
+    - html: HTML-код страницы списка
+    - page_url: адрес этой страницы (нужен для относительных ссылок)
+    
+    ВОЗВРАЩАЕТ:
+    - Список абсолютных адресов страниц (без повторов)
+    """
+    
+    # Раздел сайта текущей страницы, например ('Auction', 'List')
+    page_params = dict(parse_qsl(urlsplit(page_url).query))
+    section = (page_params.get('class'), page_params.get('action'))
+    
+    links = []
+    seen = {normalize_url(page_url)}
+    
+    for href, text in iter_page_anchors(html):
+        url = normalize_url(urljoin(page_url, href))
+        params = dict(parse_qsl(urlsplit(url).query))
+        
+        # Другой раздел сайта - это не навигация по списку
+        if (params.get('class'), params.get('action')) != section:
+            continue
+        
+        has_page_param = any(key in params for key in PAGE_PARAM_NAMES)
+        if not (text.isdigit() or has_page_param):
+            continue
+        
+        if url not in seen:
+            seen.add(url)
+            links.append(url)
+    
+    return links
+
+
+def iter_crawled_pages(session, start_url, workers=8, limiter=None,
+                       max_in_flight=None, max_pages=None, cache=None):
+    """
+    ОБХОД ВСЕХ СТРАНИЦ СПИСКА ЛОТОВ (ПОТОКОМ)
+    ============================================
+    
+    АЛГОРИТМ:
+    1. Загружаем первую страницу
+    2. На каждой загруженной странице ищем ссылки на другие страницы
+    3. Новые ссылки отправляем в пул потоков - страницы
+       загружаются одновременно через общий пул соединений
+    4. Загруженная страница сразу выдается дальше (yield)
+    
+    Навигация на сайте часто показывает только "окно" из нескольких
+    номеров (1 2 3 ... 10 »), поэтому ссылки ищутся на каждой странице,
+    а не только на первой.
+    
+    Одновременно загружается не больше workers страниц. Пока следующий
+    этап (разбор) занят страницей, новые загрузки не начинаются -
+    скачанные, но не разобранные страницы не копятся в памяти.
+    
+    ПАРАМЕТРЫ:
+    - session: сессия из create_session()
+    - start_url: адрес первой страницы
+    - workers: сколько страниц загружать одновременно
+    - limiter: ограничитель частоты из create_rate_limiter() (или None)
+    - max_in_flight: предел одновременных запросов (или None)
+    - max_pages: максимум страниц для обхода (или None - все)
+    - cache: кеш из open_response_cache() (или None)
+    
+    ВЫДАЕТ (yield):
+    - Пары (адрес, HTML) в порядке загрузки
+    """
+    
+    in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+    
+    queued = {get_page_key(start_url)}  # ключи страниц, уже отправленных на загрузку
+    waiting = collections.deque()       # найденные адреса, ждущие свободного потока
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Словарь "задача → адрес", чтобы знать, какая страница загрузилась
+        running = {executor.submit(fetch_page, session, start_url, limiter, in_flight, cache): start_url}
+        
+        while running:
+            # Ждем, пока завершится хотя бы одна загрузка
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            
+            for future in done:
+                url = running.pop(future)
+                
+                try:
+                    html = future.result()
+                except requests.exceptions.RequestException as e:
+                    # Одна неудачная страница не должна останавливать весь обход
+                    print(f"❌ Не удалось загрузить {url}: {e}")
+                    html = None
+                
+                # Запоминаем страницы, которых еще не видели
+                if html is not None:
+                    for link in find_page_links(html, url):
+                        key = get_page_key(link)
+                        if key in queued:
+                            continue
+                        if max_pages and len(queued) >= max_pages:
+                            break
+                        queued.add(key)
+                        waiting.append(link)
+                
+                # Новые загрузки - только на место завершившихся
+                while waiting and len(running) < workers:
+                    link = waiting.popleft()
+                    running[executor.submit(fetch_page, session, link, limiter, in_flight, cache)] = link
+                
+                if html is not None:
+                    yield url, html
+
+
+def crawl_listing_pages(session, start_url, workers=8, limiter=None,
+                        max_in_flight=None, max_pages=None, cache=None):
+    """
+    ОБХОД ВСЕХ СТРАНИЦ СПИСКА ЛОТОВ
+    ============================================
+    
+    То же, что iter_crawled_pages(), но страницы возвращаются
+    все сразу, упорядоченные по номеру страницы.
+    
+    ВОЗВРАЩАЕТ:
+    - Список пар (адрес, HTML), упорядоченный по номеру страницы
+    """
+    
+    pages = list(iter_crawled_pages(session, start_url, workers, limiter,
+                                    max_in_flight, max_pages, cache))
+    
+    # Упорядочиваем страницы по номеру: 1, 2, 3...
+    return sorted(pages, key=lambda item: get_page_number(item[0]))
+
+
+def extract_lots_from_html(html, engine=DEFAULT_ENGINE):
+    """
+    ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ HTML-КОДА СТРАНИЦЫ
+    ============================================
+    
+    Разбирает страницу, берет вторую таблицу (первая часто бывает
+    меню или шапкой) и извлекает из нее лоты.
+    
+    ПАРАМЕТРЫ:
+    - html: HTML-код страницы списка
+    - engine: 'lxml' - быстрый потоковый разбор (parse_lots_from_html_lxml)
+              'bs4'  - прежний разбор всей страницы через BeautifulSoup
+    
+    ВОЗВРАЩАЕТ:
+    - Список лотов или None, если таблица с лотами не найдена
+    """
+    
+    if engine == 'lxml':
+        return parse_lots_from_html_lxml(html)
+    
+    # BeautifulSoup превращает HTML-код в дерево объектов
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Ищем ВСЕ таблицы на странице
+    tables = soup.find_all('table')
+    
+    # Проверка: нашлось ли достаточно таблиц
+    if len(tables) < 2:
+        return None
+    
+    # tables[1] - вторая таблица (первая часто бывает меню или шапка)
+    return parse_lots_from_table(tables[1])
+
+
+# ПОВТОРНЫЙ РАЗБОР СОХРАНЕННЫХ СТРАНИЦ
+# ============================================================
+# Сохраненные копии страниц списка (например, ежедневные) можно
+# разобрать заново без интернета - после изменения правил разбора
+# или чтобы заполнить историю. Страницы читаются из файлов, папок
+# и архивов tar/zip и проходят тот же путь, что и загруженные:
+# разбор (можно в нескольких процессах), фильтр, приемники.
+#
+# Файлы читаются через отображение в память (mmap): ОС подгружает
+# файл по мере чтения, без лишнего копирования. Архивы tar читаются
+# потоком - от начала к концу, не распаковываясь на диск.
+
+# Расширения файлов со страницами
+REPLAY_PAGE_SUFFIXES = ('.html', '.htm', '.html.gz', '.htm.gz')
+
+# Расширения архивов
+REPLAY_TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+REPLAY_ZIP_SUFFIXES = ('.zip',)
+
+# Кодировка страницы из <meta charset=...> (ищется в начале файла)
+CHARSET_PATTERN = re.compile(rb'charset\s*=\s*["\']?([\w-]+)', re.I)
+
+# Дата снимка в пути страницы: 2024-05-01, 2024_05_01 или 20240501
+SNAPSHOT_DATE_PATTERN = re.compile(r'(?<!\d)(\d{4})[-_]?(\d{2})[-_]?(\d{2})(?!\d)')
+
+
+def decode_page_bytes(data):
+    """
+    ТЕКСТ СТРАНИЦЫ ИЗ БАЙТОВ
+    ============================================
+    
+    Кодировка берется из <meta charset=...> в начале страницы
+    (на русских сайтах бывает windows-1251), по умолчанию - UTF-8.
+    Неверные байты заменяются, чтобы одна испорченная страница
+    не останавливала разбор всего архива.
+    
+    ПАРАМЕТРЫ:
+    - data: байты (bytes, mmap или memoryview)
+    """
+    
+    match = CHARSET_PATTERN.search(data[:4096])
+    encoding = match.group(1).decode('ascii') if match else 'utf-8'
+    try:
+        return str(data, encoding, 'replace')
+    except LookupError:
+        return str(data, 'utf-8', 'replace')
+
+
+def read_page_file(path):
+    """
+    ЧТЕНИЕ ОДНОЙ СОХРАНЕННОЙ СТРАНИЦЫ
+    ============================================
+    
+    Обычный файл отображается в память (mmap), сжатый (.gz)
+    читается потоком.
+    
+    ВОЗВРАЩАЕТ:
+    - HTML-код страницы (пустой файл - пустая строка)
+    """
+    
+    if path.endswith('.gz'):
+        with gzip.open(path, 'rb') as f:
+            return decode_page_bytes(f.read())
+    
+    with open(path, 'rb') as f:
+        # Пустой файл отобразить в память нельзя
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return decode_page_bytes(mapped)
+
+
+def iter_archive_pages(path):
+    """
+    СТРАНИЦЫ ИЗ АРХИВА TAR ИЛИ ZIP
+    ============================================
+    
+    ВЫДАЕТ (yield):
+    - Пары (имя "архив:файл", HTML) в порядке файлов в архиве
+    """
+    
+    if path.endswith(REPLAY_ZIP_SUFFIXES):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(REPLAY_PAGE_SUFFIXES):
+                    data = archive.read(info)
+                    if info.filename.lower().endswith('.gz'):
+                        data = gzip.decompress(data)
+                    yield f"{path}:{info.filename}", decode_page_bytes(data)
+        return
+    
+    # 'r|*' - последовательное чтение с любым сжатием (без перемотки назад)
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.lower().endswith(REPLAY_PAGE_SUFFIXES):
+                data = archive.extractfile(member).read()
+                if member.name.lower().endswith('.gz'):
+                    data = gzip.decompress(data)
+                yield f"{path}:{member.name}", decode_page_bytes(data)
+
+
+def iter_replay_pages(paths):
+    """
+    СОХРАНЕННЫЕ СТРАНИЦЫ ИЗ ФАЙЛОВ, ПАПОК И АРХИВОВ
+    ============================================
+    
+    Папки обходятся целиком (вместе с вложенными), файлы в папке
+    берутся по алфавиту - так страницы с датой в имени идут по порядку.
+    
+    ПАРАМЕТРЫ:
+    - paths: список путей к файлам .html/.htm(.gz), архивам
+      .tar(.gz/.bz2/.xz)/.zip или папкам с ними
+    
+    ВЫДАЕТ (yield):
+    - Пары (имя страницы, HTML) - как загруженные страницы (адрес, HTML)
+    """
+    
+    for path in paths:
+        if os.path.isdir(path):
+            files = []
+            for folder, _, names in os.walk(path):
+                files.extend(os.path.join(folder, name) for name in names)
+            files.sort()
+        else:
+            files = [path]
+        
+        for file_path in files:
+            name = file_path.lower()
+            if name.endswith(REPLAY_TAR_SUFFIXES + REPLAY_ZIP_SUFFIXES):
+                yield from iter_archive_pages(file_path)
+            elif name.endswith(REPLAY_PAGE_SUFFIXES):
+                yield file_path, read_page_file(file_path)
+            elif file_path == path:
+                # Файл назван явно - читаем, даже если расширение другое
+                yield file_path, read_page_file(file_path)
+
+
+def get_snapshot_name(page_name):
+    """
+    К КАКОМУ СНИМКУ ОТНОСИТСЯ СТРАНИЦА
+    ============================================
+    
+    Снимок - состояние списка лотов на один момент. Если в пути
+    страницы есть дата, снимок - это дата: страницы
+    "2024-05-01/p1.html" и "2024-05-01/p2.html" - один снимок.
+    Иначе каждый файл (или файл в архиве) - отдельный снимок.
+    
+    ПРИМЕРЫ:
+    - "snapshots/2024-05-01/p1.html" → "2024-05-01"
+    - "archive.tar:20240502.html"    → "2024-05-02"
+    - "page.html"                    → "page.html"
+    """
+    
+    for match in SNAPSHOT_DATE_PATTERN.finditer(page_name):
+        date = '-'.join(match.groups())
+        try:
+            time.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            continue
+        return date
+    return page_name
+
+
+def get_snapshot_time(snapshot):
+    """
+    ВРЕМЯ СНИМКА (секунды, как time.time()) ИЛИ None, ЕСЛИ СНИМОК БЕЗ ДАТЫ
+    """
+    
+    try:
+        return time.mktime(time.strptime(snapshot, '%Y-%m-%d'))
+    except ValueError:
+        return None
+
+
+def iter_snapshot_lots(pages, engine=DEFAULT_ENGINE, page_info=None, deduper=None, pool=None):
+    """
+    ЛОТЫ СОХРАНЕННЫХ СТРАНИЦ ПО СНИМКАМ
+    ============================================
+    
+    Как iter_lots_from_pages(), но повторы ищутся только внутри
+    снимка (см. get_snapshot_name): лот, который есть в снимках
+    за несколько дней, выдается для каждого дня - с ценой этого дня.
+    Страницы разбираются одним потоком (в пуле процессов, если он есть),
+    снимки идут по порядку страниц.
+    
+    ВЫДАЕТ (yield):
+    - Пары (снимок, список лотов снимка)
+    """
+    
+    if deduper is None:
+        deduper = create_lot_deduper()
+    
+    parsed_pages = iter_parsed_pages(pages, engine, None, pool)
+    for snapshot, snapshot_pages in itertools.groupby(parsed_pages,
+                                                      key=lambda page: get_snapshot_name(page[0])):
+        reset_lot_deduper(deduper)
+        yield snapshot, list(iter_new_page_lots(snapshot_pages, page_info, deduper))
+
+
+# ПАРАЛЛЕЛЬНЫЙ РАЗБОР СТРАНИЦ
+# ============================================================
+# Разбор HTML нагружает процессор, а Python выполняет код одного
+# процесса на одном ядре. Поэтому с флагом --parse-workers страницы
+# разбираются в нескольких процессах одновременно (ProcessPoolExecutor).
+#
+# Процесс получает HTML страницы и возвращает лоты компактно:
+# кортежи значений в порядке LOT_FIELDS, а не словари - так имена
+# полей не передаются между процессами для каждого лота.
+
+def parse_page_worker(html, engine):
+    """
+    РАЗБОР ОДНОЙ СТРАНИЦЫ В ОТДЕЛЬНОМ ПРОЦЕССЕ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Пару (строки, метрики):
+      строки - список кортежей лотов (или None, если таблицы нет),
+      метрики - счетчики, накопленные при разборе этой страницы
+      (в главном процессе они добавляются к METRICS)
+    """
+    
+    # У процесса свои METRICS: перед страницей обнуляем счетчики
+    with METRICS['lock']:
+        METRICS['values'].clear()
+    
+    lots = extract_lots_from_html(html, engine)
+    rows = None if lots is None else [tuple(lot[field] for field in LOT_FIELDS) for lot in lots]
+    
+    with METRICS['lock']:
+        counters = list(METRICS['values'].items())
+    
+    return rows, counters
+
+
+def create_parse_pool(workers):
+    """
+    ПУЛ ПРОЦЕССОВ ДЛЯ РАЗБОРА СТРАНИЦ
+    ============================================
+    
+    Процессы запускаются сразу, до начала загрузки, и создаются
+    способом spawn (новый интерпретатор), а не копированием (fork):
+    к этому моменту в программе уже могут работать потоки (адрес
+    --metrics-port, загрузка), и копия процесса с чужими
+    захваченными блокировками может зависнуть.
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь {'executor': ProcessPoolExecutor, 'workers': число процессов}
+      (закрытие - close_parse_pool())
+    """
+    
+    executor = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+    for future in [executor.submit(int) for _ in range(workers)]:
+        future.result()
+    return {'executor': executor, 'workers': workers}
+
+
+def close_parse_pool(pool):
+    """
+    ОСТАНОВКА ПУЛА ПРОЦЕССОВ (неразобранные страницы отменяются)
+    """
+    
+    pool['executor'].shutdown(cancel_futures=True)
+
+
+def iter_parsed_pages(pages, engine=DEFAULT_ENGINE, cache=None, pool=None):
+    """
+    РАЗБОР СТРАНИЦ (В ЭТОМ ПРОЦЕССЕ ИЛИ В ПУЛЕ ПРОЦЕССОВ)
+    ============================================
+    
+    Неизмененные страницы берутся из кеша без разбора.
+    
+    С пулом одновременно разбирается не больше 2 страниц на процесс.
+    Следующая страница берется из pages, только когда готова самая
+    старая из отправленных; если pages - поток загрузки
+    (iter_crawled_pages), загрузка тоже ждет и не обгоняет разбор.
+    
+    ПАРАМЕТРЫ:
+    - pages: пары (адрес, HTML)
+    - engine: движок разбора ('lxml' или 'bs4')
+    - cache: кеш из open_response_cache() (или None)
+    - pool: пул из create_parse_pool() (или None - разбор в этом процессе)
+    
+    ВЫДАЕТ (yield):
+    - Тройки (адрес, HTML, лоты или None) в том же порядке, что и pages
+    """
+    
+    window = collections.deque()  # страницы в работе: (адрес, HTML, лоты, задача пула)
+    limit = pool['workers'] * 2 if pool is not None else 0
+    
+    for page_url, html in pages:
+        # Неизмененную страницу не разбираем - берем лоты из кеша
+        page_lots = get_cached_lots(cache, page_url, html, engine) if cache else None
+        if page_lots is not None:
+            count_metric('torgi_cache_events_total', result='lots_hit')
+            window.append((page_url, html, page_lots, None))
+        elif pool is not None:
+            window.append((page_url, html, None, pool['executor'].submit(parse_page_worker, html, engine)))
+        else:
+            counters = get_parse_counters() if cache else None
+            with measure_stage('parse'):
+                page_lots = extract_lots_from_html(html, engine)
+            if cache and page_lots is not None:
+                store_cached_lots(cache, page_url, html, page_lots, engine,
+                                  get_counters_change(counters, get_parse_counters()))
+            window.append((page_url, html, page_lots, None))
+        
+        # Выдаем страницы по порядку: первая в очереди уже готова
+        # или очередь заполнена (тогда ждем первую)
+        while window and (len(window) > limit or window[0][3] is None or window[0][3].done()):
+            yield finish_parsed_page(window.popleft(), engine, cache)
+    
+    while window:
+        yield finish_parsed_page(window.popleft(), engine, cache)
+
+
+def finish_parsed_page(entry, engine, cache):
+    """
+    ГОТОВАЯ СТРАНИЦА ИЗ ОЧЕРЕДИ iter_parsed_pages()
+    ============================================
+    
+    Для страницы, отправленной в пул, ждет результат, добавляет
+    метрики процесса к METRICS, превращает кортежи обратно в словари
+    лотов и сохраняет лоты в кеш.
+    
+    ВОЗВРАЩАЕТ:
+    - Тройку (адрес, HTML, лоты или None)
+    """
+    
+    page_url, html, page_lots, future = entry
+    if future is None:
+        return page_url, html, page_lots
+    
+    # Время ожидания результата - это время, на которое разбор
+    # задержал программу (сам разбор идет параллельно)
+    with measure_stage('parse'):
+        rows, counters = future.result()
+    
+    for (name, labels), value in counters:
+        count_metric(name, value, **dict(labels))
+    
+    if rows is None:
+        return page_url, html, None
+    
+    page_lots = [Lot(*row) for row in rows]
+    if cache:
+        store_cached_lots(cache, page_url, html, page_lots, engine, counters)
+    return page_url, html, page_lots
+
+
+def iter_lots_from_pages(pages, engine=DEFAULT_ENGINE, cache=None, page_info=None, deduper=None,
+                         pool=None):
+    """
+    ЛОТЫ СО ВСЕХ ЗАГРУЖЕННЫХ СТРАНИЦ (ПОТОКОМ)
+    ============================================
+    
+    Разбирает страницы по очереди и выдает лоты сразу после разбора
+    каждой страницы. Неизмененные страницы берутся из кеша без разбора.
+    Лот, уже встречавшийся на предыдущей странице (или, с файлом
+    SQLite у deduper, в прошлом запуске), пропускается.
+    
+    ПАРАМЕТРЫ:
+    - pages: список пар (адрес, HTML)
+    - engine: движок разбора ('lxml' или 'bs4')
+    - cache: кеш из open_response_cache() (или None)
+    - page_info: словарь (или None); в него записывается
+      page_info['tables_found'] = True, если хоть на одной странице
+      нашлась таблица с лотами, и page_info['pages'] - сколько
+      страниц разобрано
+    - deduper: проверка повторов из create_lot_deduper()
+      (или None - повторы ищутся только в этом обходе)
+    - pool: пул процессов из create_parse_pool() (или None - разбор
+      в этом процессе)
+    
+    ВЫДАЕТ (yield):
+    - Лоты (словари)
+    """
+    
+    if deduper is None:
+        deduper = create_lot_deduper()
+    
+    return iter_new_page_lots(iter_parsed_pages(pages, engine, cache, pool), page_info, deduper)
+
+
+def iter_new_page_lots(parsed_pages, page_info, deduper):
+    """
+    ЛОТЫ РАЗОБРАННЫХ СТРАНИЦ БЕЗ ПОВТОРОВ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - parsed_pages: тройки (адрес, HTML, лоты) из iter_parsed_pages()
+    - page_info, deduper: как у iter_lots_from_pages()
+    
+    ВЫДАЕТ (yield):
+    - Лоты, которых еще не было
+    """
+    
+    for page_url, html, page_lots in parsed_pages:
+        if page_info is not None:
+            page_info['pages'] = page_info.get('pages', 0) + 1
+        if page_lots is None:
+            continue
+        
+        count_metric('torgi_lots_total', len(page_lots))
+        
+        if page_info is not None:
+            page_info['tables_found'] = True
+        
+        # Один и тот же лот может попасть на две соседние страницы,
+        # если список сдвинулся во время обхода
+        for lot in page_lots:
+            repeat = is_duplicate_lot(deduper, lot)
+            if repeat is None:
+                yield lot
+            else:
+                count_metric('torgi_duplicates_skipped_total',
+                             scope='crawl' if repeat == 'run' else 'previous_runs')
+
+
+def iter_lots_in_price_range(lots, min_price=None, max_price=None):
+    """
+    ПОТОКОВЫЙ ФИЛЬТР ПО ЦЕНЕ
+    ============================================
+    
+    То же, что filter_lots_by_price(), но для генератора лотов:
+    лоты проверяются и выдаются по одному. None - граница не задана.
+    """
+    
+    for lot in lots:
+        if min_price is not None and lot['price'] < min_price:
+            continue
+        if max_price is not None and lot['price'] > max_price:
+            continue
+        yield lot
+
+
+def sort_lots(lots, order):
+    """
+    СОРТИРОВКА ЛОТОВ ПО ЦЕНЕ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - lots: список или генератор лотов
+    - order: 'price-desc' - по убыванию цены,
+             'price-asc'  - по возрастанию,
+             'none'       - без сортировки (лоты идут потоком)
+    
+    ВОЗВРАЩАЕТ:
+    - Отсортированный список (или сам lots для 'none')
+    """
+    
+    if order == 'none':
+        return lots
+    return sorted(lots, key=lambda x: x['price'], reverse=(order == 'price-desc'))
+
+
+def top_lots(lots, n, order='price-desc'):
+    """
+    ПЕРВЫЕ N ЛОТОВ ПО ЦЕНЕ БЕЗ СОРТИРОВКИ ВСЕГО СПИСКА
+    ============================================
+    
+    Лоты читаются потоком, в памяти держится куча (heapq) не больше
+    чем из n лотов: каталог любого размера требует памяти только на n.
+    Результат тот же, что sort_lots(lots, order)[:n] (лоты с одинаковой
+    ценой идут в исходном порядке).
+    
+    ПАРАМЕТРЫ:
+    - lots: список или генератор лотов
+    - n: сколько лотов оставить
+    - order: 'price-desc' - самые дорогие, 'price-asc' - самые дешевые,
+             'none' - первые n лотов по порядку
+    
+    ВОЗВРАЩАЕТ:
+    - Список не более чем из n лотов
+    """
+    
+    if order == 'price-desc':
+        return heapq.nlargest(n, lots, key=lambda x: x['price'])
+    if order == 'price-asc':
+        return heapq.nsmallest(n, lots, key=lambda x: x['price'])
+    return list(itertools.islice(lots, n))
+
+
+# ВНЕШНЯЯ СОРТИРОВКА
+# ============================================================
+# Если лотов так много, что все сразу они не помещаются в память,
+# сортировка идет частями: очередные run_size лотов сортируются
+# в памяти и записываются во временный файл ("отрезок"). Затем
+# отрезки сливаются (heapq.merge): из каждого файла читается
+# по одной пачке лотов, и на выход идет лот с лучшей ценой.
+# В памяти - одна часть при сортировке и по пачке на отрезок при слиянии.
+
+# Сколько лотов сортировать в памяти за раз (--external-sort)
+DEFAULT_SORT_RUN_SIZE = 100000
+
+# Сколько лотов записывать и читать одной пачкой (pickle)
+SORT_BATCH_SIZE = 1000
+
+
+def write_sort_run(lots, temp_dir=None):
+    """
+    ЗАПИСЬ ОТСОРТИРОВАННОЙ ЧАСТИ ВО ВРЕМЕННЫЙ ФАЙЛ
+    ============================================
+    
+    ВОЗВРАЩАЕТ:
+    - Открытый временный файл (удаляется при закрытии)
+    """
+    
+    run = tempfile.TemporaryFile(dir=temp_dir)
+    for start in range(0, len(lots), SORT_BATCH_SIZE):
+        pickle.dump(lots[start:start + SORT_BATCH_SIZE], run, protocol=pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    count_metric('torgi_sort_runs_total')
+    return run
+
+
+def iter_sort_run(run):
+    """
+    ЧТЕНИЕ ЛОТОВ ИЗ ВРЕМЕННОГО ФАЙЛА ПАЧКАМИ
+    """
+    
+    while True:
+        try:
+            batch = pickle.load(run)
+        except EOFError:
+            return
+        yield from batch
+
+
+def external_sort_lots(lots, order, run_size=DEFAULT_SORT_RUN_SIZE, temp_dir=None):
+    """
+    СОРТИРОВКА ЛОТОВ ПО ЦЕНЕ С ПОМОЩЬЮ ВРЕМЕННЫХ ФАЙЛОВ
+    ============================================
+    
+    Дает тот же порядок, что sort_lots(lots, order), но держит
+    в памяти не больше run_size лотов. Если все лоты поместились
+    в одну часть, временные файлы не создаются.
+    
+    ПАРАМЕТРЫ:
+    - lots: список или генератор лотов
+    - order: 'price-desc', 'price-asc' или 'none' (лоты идут как есть)
+    - run_size: сколько лотов сортировать в памяти за раз
+    - temp_dir: папка для временных файлов (None - системная)
     
-    # 2. ПОИСК НАЗВАНИЯ ЛОТА
-    # ========================================
-    # Название должно удовлетворять ТРЕМ условиям:
-    # 1. len(text) > 30         - длинный текст (скорее всего описание)
-    # 2. 'price_text' not in data - еще не нашли цену в этой ячейке
-    # 3. not re.search(r'\d{2}-\d{2}-\d{4}', text) - не дата формата ДД-ММ-ГГГГ
-    elif len(text) > 30 and 'price_text' not in data and not re.search(r'\d{2}-\d{2}-\d{4}', text):
-        data['name'] = text  # Сохраняем название
-        
-        # Ищем ссылку внутри этой ячейки
-        # <a href="...">...</a> - тег ссылки в HTML
-        link = cell.find('a', href=True)
-        
-        if link and link.get('href'):
-            href = link.get('href')  # Получаем адрес ссылки
-            
-            # Преобразуем относительные ссылки в абсолютные:
-            if href.startswith('/'):
-                # Ссылка начинается с / → добавляем домен
-                # Пример: "/page.php" → "https://torgi.org/page.php"
-                data['link'] = 'https://torgi.org' + href
-            elif href.startswith('?'):
-                # Ссылка начинается с ? → параметры запроса
-                # Пример: "?id=123" → "https://torgi.org/index.php?id=123"
-                data['link'] = 'https://torgi.org/index.php' + href
-            elif href.startswith('index.php'):
-                # Ссылка начинается с index.php
-                # Пример: "index.php?id=123" → "https://torgi.org/index.php?id=123"
-                data['link'] = 'https://torgi.org/' + href
+    ВЫДАЕТ (yield):
+    - Лоты по порядку
+    """
     
-    # 3. ПОИСК РЕГИОНА
-    # ========================================
-    # Регион должен удовлетворять ДВУМ условиям:
-    # 1. len(text) < 30 - короткий текст
-    # 2. re.search(r'[А-Я][а-я]+\s*(обл|край|респ|г\.)', text) - содержит:
-    #    [А-Я][а-я]+     - заглавная буква, потом маленькие ("Московская")
-    #    \s*             - пробелы
-    #    (обл|край|респ|г\.) - "обл" ИЛИ "край" ИЛИ "респ" ИЛИ "г."
-    elif len(text) < 30 and re.search(r'[А-Я][а-я]+\s*(обл|край|респ|г\.)', text):
-        data['region'] = text  # Сохраняем регион
+    if order == 'none':
+        yield from lots
+        return
     
-    return data
+    lots = iter(lots)
+    runs = []
+    try:
+        while True:
+            part = sort_lots(itertools.islice(lots, run_size), order)
+            if len(part) < run_size and not runs:
+                # Все лоты поместились в память
+                yield from part
+                return
+            if part:
+                runs.append(write_sort_run(part, temp_dir))
+            if len(part) < run_size:
+                break
+            del part
+        
+        # Отрезки идут в порядке лотов, и heapq.merge при равной цене
+        # берет лот из более раннего отрезка - порядок как у sorted()
+        yield from heapq.merge(*(iter_sort_run(run) for run in runs),
+                               key=lambda x: x['price'], reverse=(order == 'price-desc'))
+    finally:
+        for run in runs:
+            run.close()
 
 
-def parse_lots_from_table(table):
+def report_progress(lots, total, label):
     """
-    ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ ТАБЛИЦЫ
+    ВЫВОД ПРОГРЕССА ДЛЯ ПОТОКА ЛОТОВ
     ============================================
     
-    Эта функция проходит по ВСЕМ строкам таблицы и извлекает данные о лотах.
+    Пропускает лоты дальше без изменений и обновляет строку
+    "label: N/total" на экране.
+    """
     
-    АЛГОРИТМ:
-    1. Для каждой строки (<tr>) в таблице
-    2. Найти все ячейки (<td> или <th>)
-    3. Если ячеек достаточно (больше 5) - это строка с лотом
-    4. Проанализировать каждую ячейку с помощью find_data_in_cell()
-    5. Собрать все данные в один словарь
-    6. Если есть название и цена > 0 - сохранить лот
+    count = 0
+    for lot in lots:
+        count += 1
+        print(f"\r{label}: {count}/{total}", end='', flush=True)
+        yield lot
+    print()
+
+
+def compare_engines(html):
+    """
+    СРАВНЕНИЕ РЕЗУЛЬТАТОВ ДВУХ ДВИЖКОВ РАЗБОРА
+    ============================================
     
-    ПАРАМЕТРЫ:
-    - table: объект BeautifulSoup с таблицей (<table>)
+    Разбирает одну и ту же страницу через BeautifulSoup и через lxml
+    и выводит лоты, которые получились разными.
     
     ВОЗВРАЩАЕТ:
-    - Список словарей, каждый словарь - один лот
+    - True, если оба движка дали одинаковые лоты
     """
     
-    # Список для хранения найденных лотов
-    lots = []
+    bs4_lots = extract_lots_from_html(html, engine='bs4')
+    lxml_lots = extract_lots_from_html(html, engine='lxml')
     
-    # Цикл по ВСЕМ строкам таблицы
-    # <tr> = table row (строка таблицы)
-    for row in table.find_all('tr'):
-        
-        # Находим ВСЕ ячейки в строке
-        # <td> = table data (данные таблицы)
-        # <th> = table header (заголовок таблицы)
-        cells = row.find_all(['td', 'th'])
-        
-        # Пропускаем строки с малым количеством ячеек
-        # (это могут быть пустые строкы или заголовки)
-        if len(cells) < 6:
-            continue  # continue переходит к следующей итерации цикла
-        
-        # Словарь для хранения данных текущего лота
-        # Все поля инициализируем пустыми значениями
-        lot_data = {
-            'name': '',       # Название лота
-            'region': '',     # Регион
-            'price': 0,       # Цена как число
-            'link': '',       # Ссылка на лот
-            'price_text': ''  # Исходный текст цены
-        }
-        
-        # АНАЛИЗ КАЖДОЙ ЯЧЕЙКИ В СТРОКЕ
-        # ========================================
-        for cell in cells:
-            # Используем функцию find_data_in_cell для анализа ячейки
-            found = find_data_in_cell(cell)
-            
-            # Обновляем словарь lot_data найденными данными
-            for key in found:
-                if key == 'price' and found[key] > 0:
-                    # Для цены сохраняем только если > 0
-                    lot_data[key] = found[key]
-                elif key != 'price':
-                    # Для остальных полей сохраняем как есть
-                    lot_data[key] = found[key]
-        
-        # ПРОВЕРКА: ЕСТЬ ЛИ ДОСТАТОЧНО ДАННЫХ ДЛЯ СОХРАНЕНИЯ ЛОТА?
-        # ========================================
-        # Для сохранения лота нужно:
-        # 1. lot_data['name'] не пустой (есть название)
-        # 2. lot_data['price'] > 0 (цена положительная)
-        if lot_data['name'] and lot_data['price'] > 0:
-            
-            # ПРОВЕРКА НА ДУБЛИКАТЫ
-            # ========================================
-            # any() возвращает True если ХОТЯ БЫ ОДИН элемент списка lots
-            # удовлетворяет условию в скобках
-            # Условие: l['name'] == lot_data['name']
-            # "Есть ли уже лот с таким же названием?"
-            if not any(l['name'] == lot_data['name'] for l in lots):
-                
-                # Добавляем лот в список
-                lots.append(lot_data)
-                
-                # Выводим информацию о найденном лоте
-                # {lot_data['price']:,.2f} - форматирование цены:
-                #   , - разделитель тысяч
-                #   .2f - 2 знака после точки
-                # {lot_data['name'][:50]} - первые 50 символов названия
-                print(f"✅ Лот {len(lots)}: {lot_data['price']:,.2f} руб - {lot_data['name'][:50]}...")
+    if bs4_lots == lxml_lots:
+        print(f"✅ Движки совпадают: {len(bs4_lots or [])} лотов")
+        return True
     
-    return lots
+    bs4_lots = bs4_lots or []
+    lxml_lots = lxml_lots or []
+    print(f"❌ Движки различаются: bs4 - {len(bs4_lots)} лотов, lxml - {len(lxml_lots)} лотов")
+    
+    # Показываем первые различающиеся лоты
+    for i in range(max(len(bs4_lots), len(lxml_lots))):
+        old = bs4_lots[i] if i < len(bs4_lots) else None
+        new = lxml_lots[i] if i < len(lxml_lots) else None
+        if old != new:
+            print(f"   Лот {i + 1}:\n     bs4:  {old}\n     lxml: {new}")
+    
+    return False
 
 
-def filter_lots_by_price(lots, min_price=None, max_price=None):
+def parse_args(argv=None):
     """
-    ФИЛЬТРАЦИЯ ЛОТОВ ПО ДИАПАЗОНУ ЦЕН
+    РАЗБОР АРГУМЕНТОВ КОМАНДНОЙ СТРОКИ
     ============================================
     
-    Эта функция отбирает только те лоты, цена которых находится
-    в указанном диапазоне [min_price, max_price].
+    Без аргументов программа работает как раньше: загружает
+    одну страницу списка и спрашивает диапазон цен.
+    С флагом --crawl обходит все страницы, с флагом --replay
+    разбирает сохраненные страницы без обращения к сайту.
     
-    ПАРАМЕТРЫ:
-    - lots: список лотов (список словарей)
-    - min_price: минимальная цена (или None - без ограничения снизу)
-    - max_price: максимальная цена (или None - без ограничения сверху)
+    Если задан --format, --min-price или --max-price, программа
+    работает в пакетном режиме: ничего не спрашивает и пишет лоты
+    в выбранный приемник (удобно для cron и конвейеров).
+    """
     
-    ВОЗВРАЩАЕТ:
-    - Новый список с отфильтрованными лотами
+    parser = argparse.ArgumentParser(description="Парсер лотов с сайта torgi.org")
     
-    ПРИМЕРЫ:
-    - filter_lots_by_price(lots, 1000000, 5000000) → лоты от 1млн до 5млн
-    - filter_lots_by_price(lots, None, 1000000) → лоты до 1млн
-    - filter_lots_by_price(lots, 500000, None) → лоты от 500тыс
-    """
+    parser.add_argument('--url', default=LIST_URL,
+                        help="адрес страницы со списком лотов")
+    parser.add_argument('--replay', nargs='+', default=None, metavar='PATH',
+                        help="разобрать сохраненные страницы вместо загрузки: файлы .html/.htm(.gz), "
+                             "папки или архивы .tar(.gz/.bz2/.xz)/.zip")
+    parser.add_argument('--crawl', action='store_true',
+                        help="обойти все страницы списка, а не только первую")
+    parser.add_argument('--workers', type=int, default=8,
+                        help="сколько страниц загружать одновременно (по умолчанию 8)")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="разбирать страницы в стольких процессах одновременно "
+                             "(по умолчанию 0 - в основном процессе)")
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help="предел одновременных запросов (по умолчанию = --workers)")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="не больше стольких запросов в секунду к одному сайту")
+    parser.add_argument('--retries', type=int, default=3,
+                        help="сколько раз повторять неудачный запрос (по умолчанию 3)")
+    parser.add_argument('--backoff', type=float, default=0.5,
+                        help="начальная пауза между повторами, секунды (по умолчанию 0.5)")
+    parser.add_argument('--max-pages', type=int, default=None,
+                        help="максимум страниц при обходе (по умолчанию - все)")
+    parser.add_argument('--db', default=None,
+                        help="файл хранилища SQLite: лоты сравниваются с прошлым запуском")
+    parser.add_argument('--changes-only', action='store_true',
+                        help="вместе с --db: работать только с новыми лотами и лотами с новой ценой")
+    parser.add_argument('--seen-db', default=None,
+                        help="файл SQLite с уже выданными лотами: лоты из прошлых запусков "
+                             "пропускаются (выдаются только новые)")
+    parser.add_argument('--bloom-mb', type=float, default=None,
+                        help="вместе с --seen-db: держать в памяти только фильтр Блума "
+                             "такого размера, МБ (для очень больших обходов)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help=f"папка кеша загруженных страниц (по умолчанию {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size', type=float, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"максимальный размер кеша, МБ (по умолчанию {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument('--cache-ttl', type=float, default=None,
+                        help="удалять из кеша записи старше стольких часов")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="не использовать кеш, всегда загружать страницы заново")
+    parser.add_argument('--enrich', action='store_true',
+                        help="загрузить страницы лотов и дополнить лоты датами, площадью, "
+                             "организатором и шагом аукциона")
+    parser.add_argument('--per-host', type=int, default=4,
+                        help="вместе с --enrich: одновременных запросов к одному сайту (по умолчанию 4)")
+    parser.add_argument('--enrich-max-age', type=float, default=DEFAULT_ENRICH_MAX_AGE_HOURS,
+                        help="вместе с --enrich и --db: не загружать страницы лотов, "
+                             f"дополненных за последние N часов (по умолчанию {DEFAULT_ENRICH_MAX_AGE_HOURS})")
+    parser.add_argument('--format', choices=SINK_FORMATS, default=None,
+                        help="пакетный режим: формат вывода лотов "
+                             "(console, jsonl, csv, parquet, arrow, sqlite)")
+    parser.add_argument('--output', default='-',
+                        help="файл для вывода ('-' - стандартный вывод, по умолчанию)")
+    parser.add_argument('--min-price', type=float, default=None,
+                        help="пакетный режим: минимальная цена, руб")
+    parser.add_argument('--max-price', type=float, default=None,
+                        help="пакетный режим: максимальная цена, руб")
+    parser.add_argument('--sort', choices=('price-desc', 'price-asc', 'none'), default='price-desc',
+                        help="порядок лотов: по убыванию цены (по умолчанию), "
+                             "по возрастанию или none - без сортировки, сразу по мере разбора")
+    parser.add_argument('--search', default=None, metavar='ЗАПРОС',
+                        help="оставить лоты, в названии которых есть все слова запроса "
+                             "(\"слова в кавычках\" - фраза, слово* - начало слова)")
+    parser.add_argument('--search-index', default=None, metavar='ФАЙЛ',
+                        help="хранить индекс поиска в файле: лоты каждого запуска добавляются, "
+                             "а --search ищет по всем сохраненным лотам")
+    parser.add_argument('--search-only', action='store_true',
+                        help="вместе с --search-index: только искать, страницы не загружать")
+    parser.add_argument('--region', action='append', default=None, metavar='РЕГИОН',
+                        help="оставить лоты из региона: код (50), название или вариант "
+                             "написания (\"Московская обл\", \"спб\"); можно несколько раз")
+    parser.add_argument('--region-facets', action='store_true',
+                        help="вывести число лотов по регионам (регионы сведены по справочнику)")
+    parser.add_argument('--region-stats', action='store_true',
+                        help="вывести число лотов и минимальную, медианную и максимальную "
+                             "цену по каждому региону (нужен numpy)")
+    parser.add_argument('--top', type=int, default=None, metavar='N',
+                        help="оставить только N первых лотов в порядке --sort (по умолчанию - "
+                             "N самых дорогих); в памяти держится не больше N лотов")
+    parser.add_argument('--external-sort', type=int, nargs='?', const=DEFAULT_SORT_RUN_SIZE,
+                        default=None, metavar='ЛОТОВ',
+                        help=f"сортировать через временные файлы, держа в памяти не больше "
+                             f"ЛОТОВ лотов (по умолчанию {DEFAULT_SORT_RUN_SIZE}); для выгрузки "
+                             f"очень больших списков")
+    parser.add_argument('--sort-temp-dir', default=None,
+                        help="папка для временных файлов --external-sort (по умолчанию системная)")
+    parser.add_argument('--engine', choices=('lxml', 'bs4', 'compare'), default=DEFAULT_ENGINE,
+                        help="движок разбора HTML: lxml (быстрый), bs4 (прежний) "
+                             "или compare - сравнить оба на каждой странице")
+    parser.add_argument('--watch', action='store_true',
+                        help="работать постоянно: проверять список снова и снова "
+                             "и сообщать о новых лотах и изменениях цен")
+    parser.add_argument('--watch-url', action='append', default=None,
+                        help="вместе с --watch: еще один список для наблюдения (можно несколько раз)")
+    parser.add_argument('--interval', type=float, default=DEFAULT_WATCH_INTERVAL,
+                        help=f"вместе с --watch: начальная пауза между проверками, секунды "
+                             f"(по умолчанию {DEFAULT_WATCH_INTERVAL})")
+    parser.add_argument('--min-interval', type=float, default=DEFAULT_WATCH_MIN_INTERVAL,
+                        help=f"самая короткая пауза (по умолчанию {DEFAULT_WATCH_MIN_INTERVAL})")
+    parser.add_argument('--max-interval', type=float, default=DEFAULT_WATCH_MAX_INTERVAL,
+                        help=f"самая длинная пауза (по умолчанию {DEFAULT_WATCH_MAX_INTERVAL})")
+    parser.add_argument('--publish', action='append', default=None, metavar='ВИД:АДРЕС',
+                        help="куда сообщать о событиях: console, file:ФАЙЛ, spool:ПАПКА, "
+                             "webhook:АДРЕС (можно несколько раз; по умолчанию console)")
+    parser.add_argument('--watch-polls', type=int, default=0,
+                        help="остановиться после стольких проверок (по умолчанию 0 - не останавливаться)")
+    parser.add_argument('--timings', action='store_true',
+                        help="в конце вывести время этапов и число отброшенных строк")
+    parser.add_argument('--metrics-file', default=None,
+                        help="записать метрики в файл в формате Prometheus")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="отдавать метрики по адресу http://localhost:ПОРТ/metrics во время работы")
+    parser.add_argument('--profile', choices=('cprofile', 'tracemalloc'), default=None,
+                        help="профилировать запуск: cprofile - время по функциям, "
+                             "tracemalloc - память")
+    parser.add_argument('--profile-output', default='torgi.prof',
+                        help="файл для данных cProfile (по умолчанию torgi.prof)")
     
-    # Если список лотов пустой - возвращаем пустой список
-    if not lots:
-        return []
+    args = parser.parse_args(argv)
     
-    # Список для отфильтрованных лотов
-    filtered = []
+    for spec in args.publish or []:
+        if spec.partition(':')[0] not in PUBLISHER_KINDS:
+            parser.error(f"--publish: неизвестный вид {spec!r} "
+                         f"(нужен один из {', '.join(PUBLISHER_KINDS)})")
+    if args.watch and args.engine == 'compare':
+        parser.error("--engine compare нельзя использовать вместе с --watch")
     
-    # Проверяем КАЖДЫЙ лот
-    for lot in lots:
-        
-        # Проверка НИЖНЕЙ границы
-        # Если min_price задана И цена лота меньше min_price
-        # → пропускаем этот лот (continue)
-        if min_price and lot['price'] < min_price:
-            continue  # Переходим к следующему лоту
-        
-        # Проверка ВЕРХНЕЙ границы  
-        # Если max_price задана И цена лота больше max_price
-        # → пропускаем этот лот
-        if max_price and lot['price'] > max_price:
-            continue
-        
-        # Если лот прошел ВСЕ проверки → добавляем в filtered
-        filtered.append(lot)
+    if args.search_only and not (args.search_index and args.search is not None):
+        parser.error("--search-only работает только вместе с --search-index и --search")
+    # Регионы --region сразу переводятся в коды справочника
+    if args.region:
+        codes = []
+        for text in args.region:
+            code = parse_region_arg(text)
+            if code is None:
+                parser.error(f"--region: регион {text!r} не найден в справочнике")
+            codes.append(code)
+        args.region = codes
+    if args.top is not None and args.top <= 0:
+        parser.error("--top: нужно число больше 0")
+    if args.external_sort is not None and args.external_sort <= 0:
+        parser.error("--external-sort: нужно число больше 0")
+    if args.top is not None and args.external_sort is not None:
+        parser.error("--top и --external-sort нельзя использовать вместе "
+                     "(для --top в памяти и так не больше N лотов)")
+    # Статистике по регионам нужны все лоты сразу - это и есть то,
+    # от чего избавляют --top и --external-sort
+    if args.region_stats and (args.top is not None or args.external_sort is not None):
+        parser.error("--region-stats нельзя использовать вместе с --top и --external-sort")
+    if args.region_stats and np is None:
+        parser.error("для --region-stats установите numpy: pip install numpy")
+    if args.bloom_mb and not args.seen_db:
+        parser.error("--bloom-mb работает только вместе с --seen-db")
+    # Хранилище --db сравнивает ВСЕ лоты с прошлым запуском: если убрать
+    # уже виденные лоты, оно посчитает их снятыми с торгов
+    if args.seen_db and args.db:
+        parser.error("--seen-db нельзя использовать вместе с --db "
+                     "(для новых лотов используйте --db --changes-only)")
     
-    return filtered
+    return args
 
 
-def print_lots(lots, title):
+def main(argv=None):
     """
-    КРАСИВЫЙ ВЫВОД СПИСКА ЛОТОВ
+    ГЛАВНАЯ ФУНКЦИЯ ПРОГРАММЫ
     ============================================
     
-    Эта функция форматирует и выводит список лотов в удобном виде.
-    Использует эмодзи и форматирование для лучшей читаемости.
-    
-    ПАРАМЕТРЫ:
-    - lots: список лотов для вывода
-    - title: заголовок для вывода (например "ВСЕ ЛОТЫ")
+    Разбирает аргументы командной строки (argv; None - sys.argv)
+    и запускает парсер. Если запуск не удался, программа завершается
+    с кодом 1 - так сбой видят cron и скрипты, читающие вывод.
     
-    ВЫВОДИТ:
-    - Заголовок с количеством лотов
-    - Горизонтальную линию
-    - Каждый лот в формате:
-        №. 💰 Цена руб
-           📍 Регион (если есть)
-           🏷  Название...
-           🔗 Ссылка (если есть)
-        ----------------------------
+    В пакетном режиме со стандартным выводом (--output -) в stdout
+    идут только данные (лоты), а все сообщения программы -
+    в поток ошибок stderr. Так вывод можно передать другой программе:
+        python parse_trades.py --format jsonl | jq ...
     """
     
-    # Если список пустой - выводим сообщение и выходим
-    if not lots:
-        print(f"❌ {title}: лоты не найдены")
-        return
+    # Аргументы командной строки (--crawl, --workers, ...)
+    args = parse_args(argv)
     
-    # ВЫВОД ЗАГОЛОВКА
-    # ========================================
-    print(f"\n{title}: Найдено {len(lots)} лотов")
-    print("=" * 100)  # Горизонтальная линия из 100 знаков "="
+    # Пакетный режим: все параметры заданы аргументами, вопросов нет
+    # (--external-sort нужна только для выгрузки лотов - это тоже пакетный режим)
+    batch = (args.format is not None or args.min_price is not None or args.max_price is not None
+             or args.external_sort is not None)
     
-    # ВЫВОД КАЖДОГО ЛОТА
-    # ========================================
-    # enumerate(lots, 1) дает пары: (номер, лот)
-    # 1 - начать нумерацию с 1 (по умолчанию с 0)
-    for i, lot in enumerate(lots, 1):
-        
-        # 1. ВЫВОД ЦЕНЫ
-        # {i:2d} - номер шириной 2 символа, выравнивание по правому краю
-        # {lot['price']:12,.2f} - цена шириной 12 символов:
-        #   , - разделитель тысяч
-        #   .2f - 2 знака после точки
-        print(f"{i:2d}. 💰 {lot['price']:12,.2f} руб")
-        
-        # 2. ВЫВОД РЕГИОНА (если есть)
-        if lot['region']:
-            print(f"    📍 {lot['region']}")
-        
-        # 3. ВЫВОД НАЗВАНИЯ
-        # {lot['name'][:80]} - первые 80 символов названия
-        print(f"    🏷  {lot['name'][:80]}...")
-        
-        # 4. ВЫВОД ССЫЛКИ (если есть)
-        if lot['link']:
-            print(f"    🔗 {lot['link']}")
-        
-        # Разделитель между лотами
-        print("-" * 100)
+    # Поток для данных запоминаем ДО перенаправления сообщений
+    data_stream = sys.stdout
+    
+    # Метрики доступны по HTTP все время работы
+    metrics_server = start_metrics_server(args.metrics_port) if args.metrics_port else None
+    
+    ok = True
+    try:
+        if args.watch:
+            # Сообщения - в поток ошибок, в stdout - только события
+            with contextlib.redirect_stdout(sys.stderr):
+                run_watch(args, data_stream)
+        elif batch and args.output == '-':
+            with contextlib.redirect_stdout(sys.stderr):
+                ok = run_with_profile(args.profile, args.profile_output, run_parser, args, batch, data_stream)
+        else:
+            ok = run_with_profile(args.profile, args.profile_output, run_parser, args, batch, data_stream)
+    finally:
+        if args.metrics_file:
+            write_metrics_file(args.metrics_file)
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    
+    if ok is False:
+        sys.exit(1)
 
 
-def main():
+def run_parser(args, batch, data_stream):
     """
-    ГЛАВНАЯ ФУНКЦИЯ ПРОГРАММЫ
+    ЗАПУСК ПАРСЕРА
     ============================================
     
     Эта функция управляет ВСЕЙ работой парсера:
-    1. Загружает страницу
+    1. Загружает страницу (или все страницы списка с флагом --crawl,
+       или читает сохраненные страницы с флагом --replay)
     2. Ищет таблицу с лотами
     3. Извлекает данные
     4. Сортирует лоты
     5. Фильтрует по цене
-    6. Выводит результаты
+    6. Выводит результаты (на экран или в приемник --format)
     
     ВСЕ ошибки обрабатываются в блоке try-except.
+    
+    ПАРАМЕТРЫ:
+    - args: аргументы из parse_args()
+    - batch: True - пакетный режим (без вопросов пользователю)
+    - data_stream: поток для вывода лотов в пакетном режиме
+    
+    ВОЗВРАЩАЕТ:
+    - False, если запуск не удался (ошибка сети, чтения, разбора;
+      в пакетном режиме - и если таблица с лотами не найдена),
+      иначе True. По False программа завершается с кодом 1
     """
     
     # ВЫВОД ЗАГОЛОВКА ПРОГРАММЫ
@@ -387,41 +5498,234 @@ def main():
     print("=" * 50)
     
     # URL страницы с лотами
-    url = "https://torgi.org/index.php?class=Auction&action=List&mod=Open&AuctionType=All"
+    url = args.url
+    
+    # Кеш загруженных страниц (если не отключен флагом --no-cache;
+    # сохраненным страницам --replay он нужен только для --enrich)
+    cache = None
+    if not args.no_cache and (args.enrich or not args.replay):
+        cache = open_response_cache(args.cache_dir,
+                                    max_bytes=int(args.cache_size * 1024 * 1024),
+                                    ttl=args.cache_ttl * 3600 if args.cache_ttl else None)
+    
+    # Хранилище лотов (если указан файл --db)
+    store = open_lot_store(args.db) if args.db else None
+    
+    # Пул процессов для разбора (--parse-workers)
+    parse_pool = None
+    
+    # Проверка повторов: в памяти или в файле --seen-db (между запусками)
+    deduper = create_lot_deduper(args.seen_db,
+                                 bloom_bytes=int(args.bloom_mb * 1024 * 1024) if args.bloom_mb else None)
     
     # БЛОК ОБРАБОТКИ ОШИБОК
     try:
-        # 1. ЗАГРУЗКА СТРАНИЦЫ
+        # 1. ЗАГРУЗКА СТРАНИЦ
         # ========================================
-        # requests.get() отправляет HTTP-запрос к сайту
-        # headers={'User-Agent': 'Mozilla/5.0'} - имитация браузера
-        # timeout=10 - ждать ответа максимум 10 секунд
-        response = requests.get(url, 
-                              headers={'User-Agent': 'Mozilla/5.0'}, 
-                              timeout=10)
+        # Одна сессия на весь запуск: соединения с сайтом переиспользуются
+        session = create_session(pool_size=args.workers,
+                                 retries=args.retries,
+                                 backoff=args.backoff)
+        limiter = create_rate_limiter(args.rate)
+        
+        # Индекс поиска из файла (--search-index): к нему добавятся лоты этого запуска
+        search_index = load_search_index(args.search_index) if args.search_index else None
+        
+        # Процессы для разбора запускаются до начала загрузки.
+        # Сохраненные страницы (--replay) по умолчанию разбираются
+        # на всех ядрах процессора
+        parse_workers = args.parse_workers or (os.cpu_count() or 1 if args.replay else 0)
+        if parse_workers:
+            parse_pool = create_parse_pool(parse_workers)
         
-        # Проверка статуса ответа (200 - OK, 404 - не найдено, 500 - ошибка сервера)
-        response.raise_for_status()
+        # С процессами разбора страницы разбираются по мере загрузки.
+        # Порядок страниц при этом - порядок загрузки, поэтому для
+        # --sort none (лоты в порядке страниц) и сравнения движков
+        # страницы по-прежнему сначала загружаются все.
+        # Сохраненные страницы всегда читаются по порядку и потоком
+        stream_pages = ((args.crawl and parse_pool is not None and args.sort != 'none'
+                         or args.replay) and args.engine != 'compare')
         
-        print("✅ Страница загружена")
+        if args.search_only:
+            # Только поиск по сохраненному индексу
+            pages = []
+        elif args.replay:
+            # Страницы с диска, без обращения к сайту
+            pages = iter_measured(iter_replay_pages(args.replay), 'read')
+            if not stream_pages:
+                pages = list(pages)
+                print(f"✅ Прочитано страниц: {len(pages)}")
+        elif stream_pages:
+            pages = iter_measured(iter_crawled_pages(session, url,
+                                                     workers=args.workers,
+                                                     limiter=limiter,
+                                                     max_in_flight=args.max_in_flight,
+                                                     max_pages=args.max_pages,
+                                                     cache=cache),
+                                  'fetch')
+        elif args.crawl:
+            # Обходим все страницы списка одновременно
+            with measure_stage('fetch'):
+                pages = crawl_listing_pages(session, url,
+                                            workers=args.workers,
+                                            limiter=limiter,
+                                            max_in_flight=args.max_in_flight,
+                                            max_pages=args.max_pages,
+                                            cache=cache)
+            print(f"✅ Загружено страниц: {len(pages)}")
+        else:
+            # Только одна страница
+            with measure_stage('fetch'):
+                pages = [(url, fetch_page(session, url, limiter, cache=cache))]
+            print("✅ Страница загружена")
         
-        # 2. ПАРСИНГ HTML
+        # 2-3. ПАРСИНГ HTML И ИЗВЛЕЧЕНИЕ ЛОТОВ
         # ========================================
-        # BeautifulSoup превращает HTML-код в дерево объектов
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if args.engine == 'compare':
+            # Режим проверки: сравниваем движки, дальше работаем с прежним
+            for page_url, html in pages:
+                print(f"🔍 Сравнение движков: {page_url}")
+                compare_engines(html)
+        engine = 'bs4' if args.engine == 'compare' else args.engine
         
-        # Ищем ВСЕ таблицы на странице
-        tables = soup.find_all('table')
+        # Лоты идут потоком: страница разобрана - ее лоты идут дальше
+        page_info = {}
+        # Сохраненные страницы не связаны с кешем загрузок
+        # Сохраненные страницы идут по снимкам (например, по дням):
+        # повторы ищутся и хранилище сравнивается внутри каждого снимка
+        if args.replay:
+            snapshots = iter_snapshot_lots(pages, engine, page_info, deduper, parse_pool)
+            lots = (lot for snapshot, snapshot_lots in snapshots for lot in snapshot_lots)
+        else:
+            snapshots = None
+            lots = iter_lots_from_pages(pages, engine, cache, page_info, deduper, parse_pool)
+        if args.search_only:
+            page_info['tables_found'] = True
         
-        # Проверка: нашлось ли достаточно таблиц
-        if len(tables) < 2:
-            print("❌ Не найдено таблиц с лотами")
-            return  # Выходим из функции
+        # СРАВНЕНИЕ С ПРОШЛЫМ ЗАПУСКОМ
+        # ========================================
+        if store is not None:
+            # Обычный запуск - один "снимок" списка по его адресу
+            if snapshots is None:
+                snapshots = [(normalize_url(url), list(lots))]
+            
+            lots = []
+            compared = []
+            for source, snapshot_lots in snapshots:
+                # Пустой результат (например, сайт поменял разметку)
+                # не должен пометить все лоты в базе как снятые
+                if not snapshot_lots:
+                    continue
+                if args.replay:
+                    print(f"\n📅 Снимок {source}")
+                with measure_stage('store'):
+                    changes = update_lot_store(store, snapshot_lots, source=source,
+                                               previous_sources=compared,
+                                               now=get_snapshot_time(source) if args.replay else None)
+                compared.append(source)
+                print_changes(changes)
+                
+                # Дальше работаем только с изменениями
+                if args.changes_only:
+                    snapshot_lots = changes['new'] + changes['changed']
+                lots.extend(snapshot_lots)
+            
+            if compared and args.changes_only and not lots:
+                print("✅ Новых лотов и изменений цен нет")
+                if not batch:
+                    return
+        
+        # ПОИСК ПО НАЗВАНИЯМ
+        # ========================================
+        # Ищем до загрузки страниц лотов: их нужно загрузить только для найденных
+        if args.search is not None or search_index is not None:
+            lots = list(lots)
+            with measure_stage('search'):
+                if search_index is None:
+                    search_index = create_search_index(lots)
+                elif lots:
+                    added = add_to_search_index(search_index, lots)
+                    save_search_index(search_index, args.search_index)
+                    print(f"✅ Индекс поиска: новых лотов {added}, всего {len(search_index['ids'])}")
+                if args.search is not None:
+                    lots = search_lots(search_index, args.search, args.min_price, args.max_price)
+            if args.search is not None:
+                print(f"🔎 Найдено по запросу: {len(lots)}")
+        
+        # РЕГИОНЫ
+        # ========================================
+        if args.region or args.region_facets:
+            lots = list(lots)
+            with measure_stage('regions'):
+                facets = create_region_facets(lots)
+                if args.region:
+                    lots = get_region_lots(facets, args.region)
+            if args.region_facets:
+                print_region_counts(get_region_counts(facets))
+            if args.region:
+                print(f"📍 Лотов в выбранных регионах: {len(lots)}")
+        
+        # ДАННЫЕ СО СТРАНИЦ ЛОТОВ
+        # ========================================
+        if args.enrich:
+            lots = list(lots)
+            # Лоты приходят по мере загрузки - показываем прогресс
+            lots = report_progress(iter_measured(enrich_lots(session, lots,
+                                                             workers=args.workers,
+                                                             per_host=args.per_host,
+                                                             limiter=limiter,
+                                                             cache=cache,
+                                                             store=store,
+                                                             max_age=args.enrich_max_age * 3600),
+                                                 'enrich'),
+                                   len(lots), "🔎 Страницы лотов")
         
-        # 3. ИЗВЛЕЧЕНИЕ ЛОТОВ ИЗ ТАБЛИЦЫ
+        # ПАКЕТНЫЙ РЕЖИМ: ФИЛЬТР → СОРТИРОВКА → ПРИЕМНИК
         # ========================================
-        # tables[1] - вторая таблица (первая часто бывает меню или шапка)
-        lots = parse_lots_from_table(tables[1])
+        # Лоты идут потоком, поэтому время фильтра и сортировки
+        # входит в этап 'output' (разбор и загрузка считаются отдельно)
+        if batch:
+            with measure_stage('output'):
+                # Лучшие N лотов и внешняя сортировка не держат в памяти
+                # все лоты; обычной сортировке они все равно нужны,
+                # поэтому при numpy фильтр и порядок считаются по столбцу цен
+                if args.top is not None:
+                    lots = top_lots(iter_lots_in_price_range(lots, args.min_price, args.max_price),
+                                    args.top, args.sort)
+                elif args.external_sort is not None:
+                    lots = external_sort_lots(iter_lots_in_price_range(lots, args.min_price, args.max_price),
+                                              args.sort, args.external_sort, args.sort_temp_dir)
+                elif np is not None and (args.sort != 'none' or args.region_stats):
+                    columns = create_lot_columns(lots)
+                    lots = select_lots_by_price(columns, args.min_price, args.max_price, args.sort)
+                else:
+                    lots = sort_lots(iter_lots_in_price_range(lots, args.min_price, args.max_price),
+                                     args.sort)
+                # Приемник открывается последним: если сбой случился
+                # раньше, файл вывода не создается вовсе
+                count = write_lots(lots, open_sink(args.format or 'console', args.output, data_stream))
+            
+            if args.region_stats:
+                print_region_stats(get_region_price_stats(columns))
+            if stream_pages:
+                print(f"✅ {'Прочитано' if args.replay else 'Загружено'} страниц: {page_info.get('pages', 0)}")
+            if not page_info.get('tables_found'):
+                # Для cron это сбой: скорее всего, изменилась разметка сайта
+                print("❌ Не найдено таблиц с лотами")
+                return False
+            print(f"✅ Записано лотов: {count}")
+            return True
+        
+        # ИНТЕРАКТИВНЫЙ РЕЖИМ
+        # ========================================
+        lots = list(lots)
+        if stream_pages:
+            print(f"✅ {'Прочитано' if args.replay else 'Загружено'} страниц: {page_info.get('pages', 0)}")
+        
+        # Проверка: нашлось ли достаточно таблиц
+        if not page_info.get('tables_found'):
+            print("❌ Не найдено таблиц с лотами")
+            return False  # Выходим из функции
         
         # Проверка: нашли ли хотя бы один лот
         if not lots:
@@ -434,11 +5738,21 @@ def main():
         # key=lambda x: x['price'] - сортировать по полю 'price'
         # lambda x: x['price'] - короткая функция: "возьми x, верни x['price']"
         # reverse=True - по убыванию (от большей цены к меньшей)
-        lots.sort(key=lambda x: x['price'], reverse=True)
+        with measure_stage('sort'):
+            if args.top is not None:
+                lots = top_lots(lots, args.top, args.sort)
+            else:
+                lots = sort_lots(lots, args.sort)
+        
+        # Индекс цен строится один раз, фильтр ищет по нему границы
+        with measure_stage('index'):
+            price_index = create_price_index(lots)
         
         # 5. ВЫВОД ВСЕХ ЛОТОВ
         # ========================================
         print_lots(lots, "📊 ВСЕ ЛОТЫ")
+        if args.region_stats:
+            print_region_stats(get_region_price_stats(create_lot_columns(lots)))
         
         # 6. ФИЛЬТРАЦИЯ ПО ЦЕНЕ
         # ========================================
@@ -463,7 +5777,8 @@ def main():
             
             # ФИЛЬТРАЦИЯ ЛОТОВ
             # ========================================
-            filtered = filter_lots_by_price(lots, min_price, max_price)
+            with measure_stage('filter'):
+                filtered = filter_price_index(price_index, min_price, max_price)
             
             # ВЫВОД РЕЗУЛЬТАТОВ ФИЛЬТРАЦИИ
             # ========================================
@@ -478,10 +5793,382 @@ def main():
     except requests.exceptions.RequestException as e:
         # Ошибки сети: нет интернета, сайт недоступен, таймаут
         print(f"❌ Ошибка сети: {e}")
+        return False
     
     # ОБРАБОТКА ЛЮБЫХ ДРУГИХ ОШИБОК
     except Exception as e:
         print(f"❌ Ошибка: {e}")
+        return False
+    
+    # В любом случае сохраняем кеш на диск и закрываем хранилище
+    finally:
+        if cache is not None:
+            close_response_cache(cache)
+            print_cache_stats(cache)
+            set_metric('torgi_cache_events_total', cache['hits'], result='hit')
+            set_metric('torgi_cache_events_total', cache['misses'], result='miss')
+            set_metric('torgi_cache_events_total', cache['not_modified'], result='not_modified')
+        if store is not None:
+            store.close()
+        close_lot_deduper(deduper)
+        if parse_pool is not None:
+            close_parse_pool(parse_pool)
+        if args.timings:
+            print_metrics_summary()
+
+
+# НАБЛЮДЕНИЕ ЗА СПИСКОМ ЛОТОВ (--watch)
+# ============================================================
+# Вместо запуска по расписанию (cron) программа работает постоянно:
+# сессия с открытыми соединениями, кеш, схемы колонок и процессы
+# разбора остаются "теплыми", а страницы списка проверяются снова
+# и снова. Неизмененная страница (ответ 304 или тот же хеш) не
+# разбирается вовсе.
+#
+# Пауза между проверками подстраивается под список:
+# - лоты изменились → проверяем чаще (пауза × WATCH_SPEEDUP)
+# - ничего не изменилось → реже (пауза × WATCH_SLOWDOWN)
+# - ошибка сервера → еще реже (пауза × WATCH_ERROR_SLOWDOWN)
+# Пауза всегда остается между --min-interval и --max-interval
+# и случайно сдвигается на ±WATCH_JITTER, чтобы проверки разных
+# списков (и разных копий программы) не совпадали по времени.
+#
+# Новые лоты и лоты с новой ценой передаются "издателям" (--publish):
+# в консоль, в файл JSONL, в папку-очередь или на адрес (webhook).
+
+# Пауза между проверками по умолчанию и ее пределы (секунды)
+DEFAULT_WATCH_INTERVAL = 300
+DEFAULT_WATCH_MIN_INTERVAL = 30
+DEFAULT_WATCH_MAX_INTERVAL = 3600
+
+# Во сколько раз меняется пауза
+WATCH_SPEEDUP = 0.5
+WATCH_SLOWDOWN = 1.5
+WATCH_ERROR_SLOWDOWN = 2.0
+
+# Случайный сдвиг паузы: ±10%
+WATCH_JITTER = 0.1
+
+# Виды издателей для --publish ВИД:АДРЕС
+PUBLISHER_KINDS = ('console', 'file', 'spool', 'webhook')
+
+
+def open_publisher(spec, session=None, stdout=None):
+    """
+    СОЗДАНИЕ ИЗДАТЕЛЯ СОБЫТИЙ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - spec: строка "вид:адрес":
+        'console'              - вывод лотов на экран (как print_lots)
+        'file:events.jsonl'    - дописывать события в файл, одно в строке
+                                 ('file:-' - стандартный вывод)
+        'spool:events/'        - папка-очередь: каждое событие - отдельный
+                                 файл JSON; файл появляется целиком
+                                 (сначала пишется .tmp, потом переименовывается)
+        'webhook:http://...'   - отправлять события POST-запросом (JSON)
+    - session: сессия для webhook
+    - stdout: поток стандартного вывода
+    
+    Событие - словарь {'event': 'new' или 'changed', 'source': адрес списка,
+    'time': время, 'lot': лот} (для 'changed' в лоте есть 'old_price').
+    
+    ВОЗВРАЩАЕТ:
+    - Словарь {'publish': функция(список событий), 'close': функция()}
+    """
+    
+    kind, _, target = spec.partition(':')
+    stdout = stdout or sys.stdout
+    
+    if kind not in PUBLISHER_KINDS:
+        raise ValueError(f"Неизвестный вид издателя: {kind} (нужен один из {', '.join(PUBLISHER_KINDS)})")
+    
+    # 1. КОНСОЛЬ
+    # ========================================
+    if kind == 'console':
+        def publish(events):
+            for i, event in enumerate(events, 1):
+                label = "🆕 Новый лот" if event['event'] == 'new' else "💱 Новая цена"
+                print(f"\n{label} ({time.strftime('%H:%M:%S', time.localtime(event['time']))})",
+                      file=stdout)
+                print_lot(i, event['lot'], stdout)
+            stdout.flush()
+        return {'publish': publish, 'close': lambda: None}
+    
+    # 2. ФАЙЛ JSONL (дописывается)
+    # ========================================
+    if kind == 'file':
+        stream = stdout if target in ('', '-') else open(target, 'a', encoding='utf-8')
+        
+        def publish(events):
+            for event in events:
+                stream.write(json.dumps(event, ensure_ascii=False))
+                stream.write('\n')
+            # Читатель файла должен увидеть событие сразу
+            stream.flush()
+        
+        def close():
+            if stream is not stdout:
+                stream.close()
+        
+        return {'publish': publish, 'close': close}
+    
+    # 3. ПАПКА-ОЧЕРЕДЬ
+    # ========================================
+    if kind == 'spool':
+        os.makedirs(target, exist_ok=True)
+        counter = {'count': 0}
+        
+        def publish(events):
+            for event in events:
+                counter['count'] += 1
+                # Имена файлов упорядочены по времени: обработчик очереди
+                # берет их по алфавиту и удаляет после обработки
+                name = f"{event['time']:.6f}-{os.getpid()}-{counter['count']:06d}.json"
+                tmp_path = os.path.join(target, name + '.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(event, f, ensure_ascii=False)
+                os.replace(tmp_path, os.path.join(target, name))
+        
+        return {'publish': publish, 'close': lambda: None}
+    
+    # 4. WEBHOOK
+    # ========================================
+    session = session or create_session()
+    
+    def publish(events):
+        # Все события одной проверки - одним запросом.
+        # Недоступный адрес не должен останавливать наблюдение
+        try:
+            response = session.post(target, json={'events': events}, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"❌ Не удалось отправить события на {target}: {e}")
+    
+    return {'publish': publish, 'close': lambda: None}
+
+
+def get_next_watch_interval(interval, status, min_interval, max_interval):
+    """
+    НОВАЯ ПАУЗА ПОСЛЕ ПРОВЕРКИ
+    ============================================
+    
+    ПАРАМЕТРЫ:
+    - interval: текущая пауза (секунды)
+    - status: итог проверки: 'changed', 'static' или 'error'
+    
+    ВОЗВРАЩАЕТ:
+    - Пару (новая пауза без сдвига, пауза со случайным сдвигом)
+    """
+    
+    factor = {'changed': WATCH_SPEEDUP,
+              'static': WATCH_SLOWDOWN,
+              'error': WATCH_ERROR_SLOWDOWN}[status]
+    interval = min(max_interval, max(min_interval, interval * factor))
+    
+    delay = interval * random.uniform(1 - WATCH_JITTER, 1 + WATCH_JITTER)
+    return interval, delay
+
+
+def poll_listing(state, session, limiter, cache, pool, store, args):
+    """
+    ОДНА ПРОВЕРКА СПИСКА ЛОТОВ
+    ============================================
+    
+    АЛГОРИТМ:
+    1. Загружаем страницу (или все страницы с --crawl)
+    2. Если HTML всех страниц не изменился - список тот же, разбор не нужен
+    3. Разбираем лоты и сравниваем с прошлой проверкой:
+       с хранилищем --db, а без него - с лотами в памяти
+       (первая проверка без хранилища только запоминает лоты)
+    4. После каждой проверки (и при ошибке тоже) кеш очищается,
+       а его оглавление записывается на диск - наблюдение работает
+       сутками, и кеш не должен расти или теряться при остановке
+    
+    ПАРАМЕТРЫ:
+    - state: состояние списка: {'url', 'content_hash', 'known', ...}
+    - остальные - как в run_parser()
+    
+    ВОЗВРАЩАЕТ:
+    - Пару (итог: 'changed'/'static'/'error', список событий)
+    """
+    
+    try:
+        return check_listing(state, session, limiter, cache, pool, store, args)
+    finally:
+        if cache is not None:
+            save_response_cache(cache)
+
+
+def check_listing(state, session, limiter, cache, pool, store, args):
+    """
+    ЗАГРУЗКА, РАЗБОР И СРАВНЕНИЕ СПИСКА (шаги 1-3 poll_listing())
+    """
+    
+    url = state['url']
+    
+    with measure_stage('fetch'):
+        if args.crawl:
+            pages = crawl_listing_pages(session, url,
+                                        workers=args.workers,
+                                        limiter=limiter,
+                                        max_in_flight=args.max_in_flight,
+                                        max_pages=args.max_pages,
+                                        cache=cache)
+        else:
+            pages = [(url, fetch_page(session, url, limiter, cache=cache))]
+    
+    content_hash = get_content_hash(''.join(html for _, html in pages))
+    if content_hash == state['content_hash']:
+        return 'static', []
+    
+    lots = list(iter_lots_from_pages(pages, args.engine, cache, {}, None, pool))
+    
+    # Пустой список - скорее сбой (или смена разметки), чем "все лоты сняты"
+    if not lots:
+        print(f"❌ Лоты не найдены: {url}")
+        return 'error', []
+    
+    now = time.time()
+    
+    if store is not None:
+        with measure_stage('store'):
+            changes = update_lot_store(store, lots, source=normalize_url(url))
+        new, changed = changes['new'], changes['changed']
+    else:
+        known = state['known']
+        new, changed = [], []
+        if known is not None:
+            for lot in lots:
+                old = known.get(get_lot_identity(lot))
+                if old is None:
+                    new.append(lot)
+                elif old['price'] != lot['price']:
+                    changed.append(dict(lot, old_price=old['price']))
+        state['known'] = {get_lot_identity(lot): lot for lot in lots}
+    
+    # Хеш запоминается только после сравнения: если оно не удалось,
+    # следующая проверка разберет тот же список заново
+    state['content_hash'] = content_hash
+    
+    # Издателям - только лоты из заданного диапазона цен
+    events = [{'event': kind, 'source': url, 'time': now, 'lot': dict(lot)}
+              for kind, group in (('new', new), ('changed', changed))
+              for lot in iter_lots_in_price_range(group, args.min_price, args.max_price)]
+    
+    return ('changed' if new or changed else 'static'), events
+
+
+def stop_on_signal(signum, frame):
+    """
+    ОБРАБОТЧИК SIGTERM: ОСТАНОВКА КАК ПО Ctrl+C
+    """
+    
+    raise KeyboardInterrupt
+
+
+def run_watch(args, data_stream):
+    """
+    ПОСТОЯННОЕ НАБЛЮДЕНИЕ ЗА СПИСКАМИ ЛОТОВ
+    ============================================
+    
+    Списки (--url и --watch-url) проверяются по очереди ближайшего
+    времени (heapq): у каждого списка своя пауза. Работает, пока не
+    нажато Ctrl+C, не получен сигнал SIGTERM (systemd, docker stop)
+    или до --watch-polls проверок. В любом случае кеш, хранилище
+    и издатели закрываются как положено.
+    
+    ПАРАМЕТРЫ:
+    - args: аргументы из parse_args()
+    - data_stream: поток для издателей 'console' и 'file:-'
+    """
+    
+    print("👀 НАБЛЮДЕНИЕ ЗА ЛОТАМИ TORGI.ORG (Ctrl+C - остановить)")
+    print("=" * 50)
+    
+    urls = list(dict.fromkeys([args.url] + (args.watch_url or [])))
+    
+    cache = None
+    if not args.no_cache:
+        cache = open_response_cache(args.cache_dir,
+                                    max_bytes=int(args.cache_size * 1024 * 1024),
+                                    ttl=args.cache_ttl * 3600 if args.cache_ttl else None)
+    store = open_lot_store(args.db) if args.db else None
+    
+    # Все "теплое" создается один раз на все время работы
+    session = create_session(pool_size=args.workers, retries=args.retries, backoff=args.backoff)
+    limiter = create_rate_limiter(args.rate)
+    pool = create_parse_pool(args.parse_workers) if args.parse_workers else None
+    publishers = [open_publisher(spec, session, data_stream) for spec in (args.publish or ['console'])]
+    
+    # Очередь проверок: (время проверки, номер списка)
+    states = [{'url': url, 'interval': args.interval, 'content_hash': None, 'known': None}
+              for url in urls]
+    schedule = [(time.monotonic(), i) for i in range(len(states))]
+    heapq.heapify(schedule)
+    polls = 0
+    
+    # SIGTERM останавливает наблюдение так же, как Ctrl+C
+    previous_handler = signal.signal(signal.SIGTERM, stop_on_signal)
+    
+    try:
+        while schedule:
+            when, i = heapq.heappop(schedule)
+            delay = when - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            
+            state = states[i]
+            # Сбой одной проверки (сеть, разбор, база, издатель) не должен
+            # останавливать наблюдение: проверка считается ошибкой,
+            # и пауза до следующей растет
+            try:
+                status, events = poll_listing(state, session, limiter, cache, pool, store, args)
+            except requests.exceptions.RequestException as e:
+                print(f"❌ Ошибка сети ({state['url']}): {e}")
+                status, events = 'error', []
+            except Exception as e:
+                print(f"❌ Ошибка проверки ({state['url']}): {e!r}")
+                status, events = 'error', []
+            
+            for publisher in publishers if events else ():
+                try:
+                    publisher['publish'](events)
+                except Exception as e:
+                    print(f"❌ Ошибка издателя ({state['url']}): {e!r}")
+                    status = 'error'
+            
+            count_metric('torgi_watch_polls_total', status=status)
+            count_metric('torgi_watch_events_total', len(events))
+            
+            state['interval'], delay = get_next_watch_interval(state['interval'], status,
+                                                               args.min_interval, args.max_interval)
+            print(f"{time.strftime('%H:%M:%S')} {status:<8} событий: {len(events):<4} "
+                  f"следующая проверка через {delay:.0f} сек - {state['url']}")
+            
+            # Метрики в файле обновляются после каждой проверки
+            if args.metrics_file:
+                write_metrics_file(args.metrics_file)
+            
+            polls += 1
+            if args.watch_polls and polls >= args.watch_polls:
+                break
+            heapq.heappush(schedule, (time.monotonic() + delay, i))
+    
+    except KeyboardInterrupt:
+        print("\n⏹  Наблюдение остановлено")
+    
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        for publisher in publishers:
+            publisher['close']()
+        if pool is not None:
+            close_parse_pool(pool)
+        if cache is not None:
+            close_response_cache(cache)
+        if store is not None:
+            store.close()
+        session.close()
 
 
 # ТОЧКА ВХОДА ПРОГРАММЫ
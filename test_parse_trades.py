@@ -0,0 +1,1802 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ПРОВЕРКИ ПАРСЕРА TORGI.ORG
+========================================
+
+Проверки не ходят в интернет: страницы берутся из папки
+bench_fixtures/ (сохраненные страницы torgi.org) или создаются
+генератором из bench_trades.py.
+
+Каждая проверка сравнивает быстрый путь с простым (lxml с
+BeautifulSoup, столбец цен с построчным разбором и т.д.) - они
+должны давать одинаковый результат.
+
+ЗАПУСК:
+    python -m pytest -q
+"""
+
+# ИМПОРТ БИБЛИОТЕК
+# ============================================================
+import csv                # Для чтения вывода CSV
+import glob               # Для поиска сохраненных страниц
+import io                 # Для перехвата вывода издателей
+import json               # Для чтения вывода JSONL
+import multiprocessing    # Для подсчета процессов пула разбора
+import os                 # Для работы с путями
+import pickle             # Для проверки сериализации лотов
+import sqlite3            # Для чтения вывода SQLite
+import statistics         # Для проверки медианы цен
+
+import pytest
+
+import bench_trades as bt
+import parse_trades as pt
+
+
+# ДАННЫЕ ДЛЯ ПРОВЕРОК
+# ============================================================
+
+# Сохраненные страницы torgi.org
+FIXTURE_PATHS = sorted(glob.glob(os.path.join(bt.FIXTURES_DIR, '*.html')))
+
+
+def read_fixture(path):
+    """
+    HTML-КОД СОХРАНЕННОЙ СТРАНИЦЫ
+    """
+
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def make_listing_html(count=300, seed=1):
+    """
+    СИНТЕТИЧЕСКАЯ СТРАНИЦА СПИСКА ИЗ count ЛОТОВ
+    """
+
+    return bt.generate_listing_html(bt.generate_lot_rows(count, seed))
+
+
+def extract(html, engine):
+    """
+    ЛОТЫ СТРАНИЦЫ ВЫБРАННЫМ ДВИЖКОМ (без запомненных схем колонок)
+    """
+
+    pt.COLUMN_MAP_CACHE.clear()
+    return pt.extract_lots_from_html(html, engine)
+
+
+# ДВИЖКИ РАЗБОРА (lxml И BeautifulSoup)
+# ============================================================
+
+@pytest.mark.skipif(pt.etree is None, reason='нужен lxml')
+@pytest.mark.parametrize('path', FIXTURE_PATHS, ids=os.path.basename)
+def test_engines_agree_on_fixtures(path):
+    """lxml и BeautifulSoup находят одни и те же лоты на сохраненной странице"""
+
+    html = read_fixture(path)
+    lots = extract(html, 'bs4')
+    assert lots
+    assert [dict(lot) for lot in extract(html, 'lxml')] == [dict(lot) for lot in lots]
+
+
+@pytest.mark.skipif(pt.etree is None, reason='нужен lxml')
+def test_engines_agree_on_synthetic_page():
+    """lxml и BeautifulSoup одинаково разбирают большую синтетическую страницу"""
+
+    html = make_listing_html(500)
+    lots = extract(html, 'bs4')
+    assert len(lots) == 500
+    assert [dict(lot) for lot in extract(html, 'lxml')] == [dict(lot) for lot in lots]
+
+
+@pytest.mark.parametrize('engine', ['bs4'] + (['lxml'] if pt.etree is not None else []))
+def test_page_without_lot_table(engine):
+    """Страница без второй таблицы - None, а не пустой список"""
+
+    assert extract('<html><body><table><tr><td>меню</td></tr></table></body></html>', engine) is None
+
+
+# СХЕМА КОЛОНОК
+# ============================================================
+# Строки для parse_lot_rows() - списки ячеек (текст, ссылка):
+# так схему можно проверить без HTML и без движка разбора.
+
+HEADER_CELLS = [('№', None), ('Наименование лота', None), ('Регион', None), ('Дата торгов', None),
+                ('Начальная цена', None), ('Статус', None), ('Форма торгов', None)]
+
+
+def get_test_cell_text(cell):
+    return cell[0]
+
+
+def get_test_cell_link(cell):
+    return cell[1]
+
+
+def make_lot_rows(count=60, layout=('number', 'name', 'region', 'date', 'price', 'status', 'form')):
+    """
+    СТРОКИ ТАБЛИЦЫ С ЛОТАМИ: КОЛОНКИ В ПОРЯДКЕ layout (ссылки - как на сайте)
+    """
+
+    rows = []
+    for i, lot in enumerate(extract(make_listing_html(count), pt.DEFAULT_ENGINE)):
+        href = lot['link'].replace('https://torgi.org/', '')
+        values = {'number': (str(i + 1), None), 'name': (lot['name'], href),
+                  'region': (lot['region'], None), 'date': ('01-02-2024', None),
+                  'price': (lot['price_text'], None), 'status': ('Прием заявок', None),
+                  'form': ('Аукцион', None)}
+        rows.append([values[column] for column in layout])
+
+    # Схему страницы-образца забываем: проверяется разбор самих строк
+    pt.COLUMN_MAP_CACHE.clear()
+    return rows
+
+
+def parse_test_rows(rows):
+    """
+    ЛОТЫ ИЗ СТРОК ПО СХЕМЕ КОЛОНОК (как при разборе страницы)
+    """
+
+    return pt.parse_lot_rows(rows, get_test_cell_text, get_test_cell_link)
+
+
+def parse_rows_by_cells(rows):
+    """
+    ЛОТЫ ИЗ СТРОК ПРЕЖНИМ ПОИСКОМ ПО ВСЕМ ЯЧЕЙКАМ (без схемы)
+    """
+
+    lots, seen = [], set()
+    for cells in rows:
+        if len(cells) >= 6:
+            found_cells = [pt.find_data_in_cell(cell, get_test_cell_text, get_test_cell_link) for cell in cells]
+            pt.add_lot(lots, pt.merge_cell_data(found_cells), seen)
+    return lots
+
+
+@pytest.fixture
+def count_cell_checks(monkeypatch):
+    """
+    СЧЕТЧИК ВЫЗОВОВ find_data_in_cell (сколько ячеек разобрано без схемы)
+    """
+
+    pt.COLUMN_MAP_CACHE.clear()
+    calls = []
+    original = pt.find_data_in_cell
+
+    def find_data_in_cell(cell, *rest):
+        calls.append(cell)
+        return original(cell, *rest)
+
+    monkeypatch.setattr(pt, 'find_data_in_cell', find_data_in_cell)
+    return calls
+
+
+def test_column_map_from_header(count_cell_checks):
+    """Схема по заголовкам: тот же результат, строки после заголовка читаются по схеме"""
+
+    rows = [HEADER_CELLS] + make_lot_rows()
+    expected = parse_rows_by_cells(rows)
+    count_cell_checks.clear()
+
+    assert parse_test_rows(rows) == expected
+    signature = ('header', tuple(text for text, _ in HEADER_CELLS))
+    assert pt.COLUMN_MAP_CACHE[signature] == {'columns': 7, 'roles': {'name': 1, 'region': 2, 'price': 4},
+                                              'required': ('link', 'region')}
+    # По всем ячейкам разобраны только заголовок и строки образца
+    assert len(count_cell_checks) == len(HEADER_CELLS) * (1 + pt.COLUMN_MAP_SAMPLE_ROWS)
+
+
+def test_column_map_from_sample(count_cell_checks):
+    """Схема без заголовков выводится по первым строкам и запоминается по рисунку строки"""
+
+    rows = make_lot_rows()
+    expected = parse_rows_by_cells(rows)
+    count_cell_checks.clear()
+
+    assert parse_test_rows(rows) == expected
+    assert len(count_cell_checks) == 7 * pt.COLUMN_MAP_SAMPLE_ROWS
+    [(signature, column_map)] = pt.COLUMN_MAP_CACHE.items()
+    assert signature[0] == 'cells' and column_map['roles'] == {'name': 1, 'region': 2, 'price': 4}
+
+    # Вторая страница с такой же таблицей - сразу по схеме
+    count_cell_checks.clear()
+    assert parse_test_rows(rows) == expected
+    assert len(count_cell_checks) == 7
+
+
+def test_column_map_not_shared_between_layouts(count_cell_checks):
+    """Таблица без заголовков с тем же числом колонок, но другим порядком - своя схема"""
+
+    first = make_lot_rows()
+    second = make_lot_rows(layout=('price', 'number', 'date', 'region', 'status', 'form', 'name'))
+    expected = parse_rows_by_cells(second)
+
+    assert parse_test_rows(first) == parse_rows_by_cells(first)
+    assert parse_test_rows(second) == expected
+    assert sorted(column_map['roles']['name'] for column_map in pt.COLUMN_MAP_CACHE.values()) == [1, 6]
+
+
+def test_column_map_falls_back_on_empty_field(count_cell_checks):
+    """Пустой регион или ссылка в колонке схемы - строка разбирается по всем ячейкам"""
+
+    rows = [HEADER_CELLS] + make_lot_rows()
+    # Регион перенесен в колонку статуса, у другой строки нет ссылки
+    rows[10][2], rows[10][5] = ('', None), rows[10][2]
+    rows[20][1] = (rows[20][1][0], None)
+    expected = parse_rows_by_cells(rows)
+
+    lots = parse_test_rows(rows)
+    assert lots == expected
+    assert lots[9]['region'] == rows[10][5][0]
+    assert lots[19]['link'] == ''
+
+
+def test_column_map_without_links(count_cell_checks):
+    """Таблица без ссылок (и без региона в части строк) читается по схеме, без лишних разборов"""
+
+    rows = make_lot_rows()
+    for i, cells in enumerate(rows):
+        cells[1] = (cells[1][0], None)
+        if i % 7 == 3:
+            cells[2] = ('', None)
+    expected = parse_rows_by_cells(rows)
+    count_cell_checks.clear()
+
+    assert parse_test_rows(rows) == expected
+    [column_map] = pt.COLUMN_MAP_CACHE.values()
+    assert column_map['required'] == ()
+    assert len(count_cell_checks) == 7 * pt.COLUMN_MAP_SAMPLE_ROWS
+
+
+def test_column_map_dropped_when_rows_stop_matching(count_cell_checks):
+    """Если большинство строк не подходит под схему, она забывается"""
+
+    rows = make_lot_rows(40)
+    # После образца цена переезжает в другую колонку
+    for cells in rows[pt.COLUMN_MAP_SAMPLE_ROWS:]:
+        cells[4], cells[6] = cells[6], cells[4]
+
+    assert parse_test_rows(rows) == parse_rows_by_cells(rows)
+    assert not pt.COLUMN_MAP_CACHE
+
+
+# ХРАНИЛИЩЕ ЛОТОВ (--db)
+# ============================================================
+
+def test_store_reports_only_changes(tmp_path):
+    """Второй запуск видит новые лоты, новые цены и снятые лоты, и только их"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    store = pt.open_lot_store(str(tmp_path / 'lots.db'))
+    try:
+        first = pt.update_lot_store(store, lots, source='list', now=1.0)
+        assert len(first['new']) == 20 and not first['changed'] and not first['removed']
+
+        unchanged = pt.update_lot_store(store, lots, source='list', now=2.0)
+        assert unchanged == {'new': [], 'changed': [], 'removed': []}
+
+        # Цена первого лота выросла, второй лот снят, появился новый
+        second = [pt.make_lot(dict(lot)) for lot in lots]
+        second[0]['price'] += 1000
+        removed = second.pop(1)
+        added = pt.make_lot(dict(lots[2], link=lots[2]['link'] + '1', name='Новый лот'))
+        second.append(added)
+
+        changes = pt.update_lot_store(store, second, source='list', now=3.0)
+        assert [lot['link'] for lot in changes['new']] == [added['link']]
+        assert [(lot['link'], lot['old_price'], lot['price']) for lot in changes['changed']] == \
+            [(lots[0]['link'], lots[0]['price'], second[0]['price'])]
+        assert [lot['link'] for lot in changes['removed']] == [removed['link']]
+
+        # Снятый лот вернулся - снова новый
+        back = pt.update_lot_store(store, second + [removed], source='list', now=4.0)
+        assert [lot['link'] for lot in back['new']] == [removed['link']]
+    finally:
+        store.close()
+
+
+def test_store_keeps_other_sources(tmp_path):
+    """Лоты другого списка не считаются снятыми"""
+
+    lots = extract(make_listing_html(10), pt.DEFAULT_ENGINE)
+    store = pt.open_lot_store(str(tmp_path / 'lots.db'))
+    try:
+        pt.update_lot_store(store, lots[:5], source='a')
+        changes = pt.update_lot_store(store, lots[5:], source='b')
+        assert len(changes['new']) == 5 and not changes['removed']
+    finally:
+        store.close()
+
+
+# КЕШ ЗАГРУЖЕННЫХ СТРАНИЦ
+# ============================================================
+
+@pytest.fixture
+def fixture_server():
+    """
+    ЛОКАЛЬНЫЙ СЕРВЕР С ДВУМЯ СТРАНИЦАМИ СПИСКА (ETag → 304)
+    """
+
+    server = bt.start_fixture_server(bt.generate_site_pages(2 * bt.ROWS_PER_PAGE))
+    host, port = server.server_address
+    yield server, f'http://{host}:{port}{bt.SERVER_LIST_PATH}'
+    server.shutdown()
+
+
+def test_cache_revalidates_with_etag(tmp_path, fixture_server):
+    """Повторная загрузка - ответ 304 и та же страница с диска"""
+
+    server, url = fixture_server
+    session = pt.create_session()
+    cache = pt.open_response_cache(str(tmp_path / 'cache'))
+    try:
+        first = pt.fetch_page(session, url, cache=cache)
+        second = pt.fetch_page(session, url, cache=cache)
+    finally:
+        session.close()
+
+    assert second == first
+    assert (cache['misses'], cache['hits'], cache['not_modified']) == (1, 1, 1)
+
+
+def test_cache_survives_restart_and_page_change(tmp_path, fixture_server):
+    """Оглавление сохраняется на диск; измененная страница загружается заново"""
+
+    server, url = fixture_server
+    session = pt.create_session()
+    try:
+        cache = pt.open_response_cache(str(tmp_path / 'cache'))
+        pt.fetch_page(session, url, cache=cache)
+        pt.close_response_cache(cache)
+
+        cache = pt.open_response_cache(str(tmp_path / 'cache'))
+        pt.fetch_page(session, url, cache=cache)
+        assert cache['not_modified'] == 1
+
+        # Страница изменилась (другой ETag) - старая копия не годится
+        server.pages = bt.generate_site_pages(2 * bt.ROWS_PER_PAGE, seed=2)
+        html = pt.fetch_page(session, url, cache=cache)
+    finally:
+        session.close()
+
+    assert html == server.pages[0].decode('utf-8')
+    assert cache['misses'] == 1
+
+
+def test_cached_lots_match_parsed_lots(tmp_path, fixture_server):
+    """Лоты из кеша совпадают с разобранными и сбрасываются при изменении страницы"""
+
+    server, url = fixture_server
+    session = pt.create_session()
+    cache = pt.open_response_cache(str(tmp_path / 'cache'))
+    try:
+        html = pt.fetch_page(session, url, cache=cache)
+    finally:
+        session.close()
+
+    parsed = list(pt.iter_lots_from_pages([(url, html)], pt.DEFAULT_ENGINE, cache))
+    cached = pt.get_cached_lots(cache, url, html, pt.DEFAULT_ENGINE)
+    assert cached is not None
+    assert [dict(lot) for lot in cached] == [dict(lot) for lot in parsed]
+
+    # Другой движок или другое содержимое - разбирать заново
+    other_engine = 'bs4' if pt.DEFAULT_ENGINE == 'lxml' else 'lxml'
+    assert pt.get_cached_lots(cache, url, html, other_engine) is None
+    assert pt.get_cached_lots(cache, url, html + ' ', pt.DEFAULT_ENGINE) is None
+
+
+def test_cached_lots_ignored_after_parser_version_change(tmp_path, fixture_server, monkeypatch):
+    """Лоты, разобранные другой версией правил (PARSER_VERSION), разбираются заново"""
+
+    server, url = fixture_server
+    session = pt.create_session()
+    cache = pt.open_response_cache(str(tmp_path / 'cache'))
+    try:
+        html = pt.fetch_page(session, url, cache=cache)
+    finally:
+        session.close()
+
+    list(pt.iter_lots_from_pages([(url, html)], pt.DEFAULT_ENGINE, cache))
+    assert pt.get_cached_lots(cache, url, html, pt.DEFAULT_ENGINE) is not None
+    monkeypatch.setattr(pt, 'PARSER_VERSION', pt.PARSER_VERSION + 1)
+    assert pt.get_cached_lots(cache, url, html, pt.DEFAULT_ENGINE) is None
+
+
+def test_cache_evicts_on_insert(tmp_path, fixture_server):
+    """Кеш не выходит за max_bytes и без сохранения: лишнее удаляется сразу при записи"""
+
+    server, url = fixture_server
+    server.pages = bt.generate_site_pages(10 * bt.ROWS_PER_PAGE)
+    cache_dir = tmp_path / 'cache'
+    cache = pt.open_response_cache(str(cache_dir))
+
+    session = pt.create_session()
+    try:
+        for page in range(1, 11):
+            page_url = f'{url}&page={page}'
+            html = pt.fetch_page(session, page_url, cache=cache)
+            list(pt.iter_lots_from_pages([(page_url, html)], pt.DEFAULT_ENGINE, cache))
+            if page == 1:
+                # Предел - три с половиной страницы вместе с лотами
+                cache['max_bytes'] = int(cache['bytes'] * 3.5)
+
+            assert cache['bytes'] <= cache['max_bytes']
+            assert cache['bytes'] == sum(meta['size'] for meta in cache['index'].values())
+            files = {name.split('.')[0] for name in os.listdir(cache_dir)}
+            assert files == set(cache['index'])
+    finally:
+        session.close()
+
+    # Остались последние страницы
+    assert pt.get_cache_key(f'{url}&page=10') in cache['index']
+    assert pt.get_cache_key(f'{url}&page=1') not in cache['index']
+    assert cache['evictions'] >= 6
+
+
+def test_cache_refetches_evicted_page_on_304(tmp_path, fixture_server, monkeypatch):
+    """Ответ 304 пришел, а копию страницы уже удалила очистка - страница загружается заново"""
+
+    server, url = fixture_server
+    session = pt.create_session()
+    cache = pt.open_response_cache(str(tmp_path / 'cache'))
+    try:
+        first = pt.fetch_page(session, url, cache=cache)
+        headers = pt.get_cache_headers(cache, url)
+        os.remove(pt.get_cache_path(cache, pt.get_cache_key(url), '.html.gz'))
+        monkeypatch.setattr(pt, 'get_cache_headers', lambda cache, url: headers)
+        second = pt.fetch_page(session, url, cache=cache)
+    finally:
+        session.close()
+
+    assert second == first
+    assert len(server.requests) == 3
+    assert os.path.exists(pt.get_cache_path(cache, pt.get_cache_key(url), '.html.gz'))
+
+
+# "ЛИЧНОСТЬ" ЛОТА И ПОИСК ПОВТОРОВ
+# ============================================================
+
+def make_test_lot(name='Квартира, 45 кв.м', region='Тверская обл.', price=590000.0, link=''):
+    """
+    ЛОТ ДЛЯ ПРОВЕРОК
+    """
+
+    return pt.make_lot({'name': name, 'region': region, 'price': price,
+                        'link': link, 'price_text': pt.format_price_text(price)})
+
+
+def test_identity_uses_lot_number_from_link():
+    """Номер лота из ссылки не зависит от порядка параметров и других полей"""
+
+    a = make_test_lot(link='https://torgi.org/index.php?class=ArrestAuction&action=View&OID=169159')
+    b = make_test_lot(name='Другое название', price=1.0,
+                      link='https://torgi.org/index.php?OID=169159&action=View&class=ArrestAuction')
+    assert pt.get_lot_identity(a) == pt.get_lot_identity(b) == 'oid:ArrestAuction:169159'
+
+    other_section = make_test_lot(link='https://torgi.org/index.php?class=Auction&action=View&OID=169159')
+    assert pt.get_lot_identity(other_section) != pt.get_lot_identity(a)
+
+
+def test_identity_without_link():
+    """Без ссылки лот узнается по названию, региону и цене (без учета регистра и пробелов)"""
+
+    a = make_test_lot()
+    assert pt.get_lot_identity(a) == pt.get_lot_identity(make_test_lot(name='КВАРТИРА,  45 кв.м '))
+    assert pt.get_lot_identity(a) != pt.get_lot_identity(make_test_lot(price=600000.0))
+    assert pt.get_lot_identity(a) != pt.get_lot_identity(make_test_lot(region='Московская обл.'))
+
+
+@pytest.mark.parametrize('on_disk', [False, True])
+def test_deduper_skips_repeats_across_runs(tmp_path, on_disk):
+    """Повтор в этом запуске - 'run', лот прошлого запуска (файл SQLite) - 'seen'"""
+
+    path = str(tmp_path / 'seen.db') if on_disk else None
+    lots = extract(make_listing_html(30), pt.DEFAULT_ENGINE)
+
+    deduper = pt.create_lot_deduper(path, bloom_bytes=1024 if on_disk else None)
+    assert [pt.is_duplicate_lot(deduper, lot) for lot in lots] == [None] * 30
+    assert pt.is_duplicate_lot(deduper, lots[0]) == 'run'
+    pt.close_lot_deduper(deduper)
+
+    if on_disk:
+        deduper = pt.create_lot_deduper(path, bloom_bytes=1024)
+        assert pt.is_duplicate_lot(deduper, lots[5]) == 'seen'
+        assert pt.is_duplicate_lot(deduper, make_test_lot()) is None
+        pt.close_lot_deduper(deduper)
+
+
+def test_store_key_is_lot_identity():
+    """Хранилище узнает лот так же, как поиск повторов"""
+
+    for lot in extract(make_listing_html(5), pt.DEFAULT_ENGINE) + [make_test_lot()]:
+        assert pt.get_lot_key(lot) == pt.get_lot_identity(lot)
+
+
+def test_old_store_is_migrated(tmp_path):
+    """Хранилище со старыми ключами (ссылка) переводится на новые без ложных "новых" лотов"""
+
+    path = str(tmp_path / 'lots.db')
+    lots = extract(make_listing_html(10), pt.DEFAULT_ENGINE)
+
+    store = pt.open_lot_store(path)
+    pt.update_lot_store(store, lots, source='list')
+    # Так ключи записывала прежняя версия: ссылка вместо номера лота
+    store.execute('UPDATE lots SET lot_key = link')
+    store.execute('PRAGMA user_version = 0')
+    store.commit()
+    store.close()
+
+    store = pt.open_lot_store(path)
+    try:
+        keys = {row[0] for row in store.execute('SELECT lot_key FROM lots')}
+        assert keys == {pt.get_lot_identity(lot) for lot in lots}
+        assert pt.update_lot_store(store, lots, source='list') == {'new': [], 'changed': [], 'removed': []}
+    finally:
+        store.close()
+
+
+# КОМПАКТНЫЙ ЛОТ (Lot)
+# ============================================================
+
+def test_lot_behaves_like_dict():
+    """Lot читается и дополняется как словарь; дополнительные поля - после основных"""
+
+    lot = make_test_lot()
+    data = {'name': 'Квартира, 45 кв.м', 'region': 'Тверская обл.', 'price': 590000.0,
+            'link': '', 'price_text': '590 000.00 руб.'}
+    assert dict(lot) == data and lot == data
+
+    lot['area'] = '45'
+    lot.update(old_price=500000.0)
+    assert list(lot.keys()) == list(pt.LOT_FIELDS) + ['area', 'old_price']
+    assert lot.get('organizer') is None and 'area' in lot
+
+
+def test_lot_pickle_round_trip():
+    """Lot проходит через pickle (пул процессов, внешняя сортировка) без потерь"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    lots[0]['old_price'] = 1.0
+    restored = pickle.loads(pickle.dumps(lots, protocol=pickle.HIGHEST_PROTOCOL))
+    assert all(type(lot) is pt.Lot for lot in restored)
+    assert [dict(lot) for lot in restored] == [dict(lot) for lot in lots]
+
+
+def test_lot_json_round_trip(tmp_path):
+    """Лоты, записанные в JSONL, читаются обратно теми же лотами"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    lots[3]['area'] = '45'
+    path = str(tmp_path / 'lots.jsonl')
+    assert pt.write_lots(lots, pt.open_sink('jsonl', path)) == 20
+
+    with open(path, encoding='utf-8') as f:
+        restored = [pt.make_lot(json.loads(line)) for line in f]
+    assert restored == lots
+
+
+# СТОЛБЦЫ ЦЕН (NUMPY)
+# ============================================================
+
+PRICE_TEXTS = [
+    '2 662 880.00 руб.', '1,500,000 руб', '590000 руб', '', 'руб.', 'Цена не указана',
+    '12,50', '1.234.567,89', '0', '0.00 руб.', '٣٠٠ руб', '  3 000 ', '1 000 000,00 ₽',
+    '10.000.000', '5,5', '-100', '1e5', '12 345.6 руб. (НДС)', 'от 100 до 200',
+]
+
+
+@pytest.mark.skipif(pt.np is None, reason='нужен numpy')
+def test_prices_batch_matches_parse_price():
+    """Столбец цен разбирается в те же числа, что и по одной цене"""
+
+    texts = PRICE_TEXTS + [pt.format_price_text(p) for p in (0.01, 99.99, 123456789.5)]
+    texts += [row.split('<td>')[5].split('</td>')[0] for row in bt.generate_lot_rows(200)]
+    assert pt.parse_prices_batch(texts).tolist() == [pt.parse_price(text) for text in texts]
+
+
+@pytest.mark.skipif(pt.np is None, reason='нужен numpy')
+@pytest.mark.parametrize('order', ['price-desc', 'price-asc', 'none'])
+def test_select_by_price_column_matches_sort(order):
+    """Фильтр и сортировка по столбцу цен дают тот же порядок лотов"""
+
+    lots = extract(make_listing_html(300), pt.DEFAULT_ENGINE)
+    # Одинаковые цены: порядок среди них должен сохраниться
+    for lot in lots[::7]:
+        lot['price'] = 1000000.0
+    prices = sorted(lot['price'] for lot in lots)
+    low, high = prices[50], prices[250]
+
+    expected = list(pt.sort_lots(pt.iter_lots_in_price_range(lots, low, high), order))
+    assert pt.select_lots_by_price(pt.create_lot_columns(lots), low, high, order) == expected
+
+
+@pytest.mark.skipif(pt.np is None, reason='нужен numpy')
+def test_region_price_stats():
+    """Цены по регионам: регион сводится по справочнику, медиана - как у statistics"""
+
+    lots = [make_test_lot(region='Московская обл', price=100.0),
+            make_test_lot(region='Московская область', price=300.0),
+            make_test_lot(region='Моск. обл.', price=200.0),
+            make_test_lot(region='Москва г.', price=50.0),
+            make_test_lot(region='г. Москва', price=70.0)]
+    columns = pt.create_lot_columns(lots)
+    assert columns['regions'] is None
+
+    stats = pt.get_region_price_stats(columns)
+    assert stats == {
+        'Московская область': {'count': 3, 'min': 100.0, 'median': 200.0, 'max': 300.0},
+        'Москва': {'count': 2, 'min': 50.0, 'median': statistics.median([50.0, 70.0]), 'max': 70.0},
+    }
+
+
+# ЛУЧШИЕ ЛОТЫ И ВНЕШНЯЯ СОРТИРОВКА
+# ============================================================
+
+def make_sort_lots():
+    """
+    ЛОТЫ ДЛЯ СОРТИРОВКИ: МНОГО ОДИНАКОВЫХ ЦЕН (проверка устойчивости)
+    """
+
+    lots = extract(make_listing_html(250), pt.DEFAULT_ENGINE)
+    for i, lot in enumerate(lots):
+        if i % 3 == 0:
+            lot['price'] = float(i % 5) * 1000
+    return lots
+
+
+@pytest.mark.parametrize('order', ['price-desc', 'price-asc', 'none'])
+@pytest.mark.parametrize('run_size', [1, 7, 250, 1000])
+def test_external_sort_matches_sort(tmp_path, order, run_size):
+    """Сортировка частями через временные файлы дает тот же порядок, что sort_lots"""
+
+    lots = make_sort_lots()
+    expected = list(pt.sort_lots(lots, order))
+    result = list(pt.external_sort_lots(iter(lots), order, run_size, str(tmp_path)))
+    assert result == expected
+    # Временные файлы удалены
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize('order', ['price-desc', 'price-asc', 'none'])
+@pytest.mark.parametrize('n', [0, 1, 10, 500])
+def test_top_lots_matches_sort(order, n):
+    """Куча из n лотов дает начало полностью отсортированного списка"""
+
+    lots = make_sort_lots()
+    assert pt.top_lots(iter(lots), n, order) == list(pt.sort_lots(lots, order))[:n]
+
+
+# ИНДЕКС ЦЕН
+# ============================================================
+
+def check_price_range(lots, low, high, include_min=True, include_max=True):
+    """
+    ЛОТЫ В ДИАПАЗОНЕ ЦЕН ПРОСТЫМ ПЕРЕБОРОМ (в исходном порядке)
+    """
+
+    return [lot for lot in lots
+            if (low is None or (lot['price'] >= low if include_min else lot['price'] > low))
+            and (high is None or (lot['price'] <= high if include_max else lot['price'] < high))]
+
+
+PRICE_BOUNDS = [(None, None), (0, None), (None, 0), (0, 0), (1000, 3000),
+                (2000, 2000), (4000, 1000), (1000, None), (None, 5e6), (5e6, None)]
+
+
+@pytest.mark.parametrize('low, high', PRICE_BOUNDS)
+@pytest.mark.parametrize('include_min', [True, False])
+@pytest.mark.parametrize('include_max', [True, False])
+@pytest.mark.parametrize('order', ['price-desc', 'price-asc', 'none'])
+def test_price_index_query_matches_scan(low, high, include_min, include_max, order):
+    """Запрос к индексу - те же лоты в том же порядке, что перебор и sort_lots()"""
+
+    lots = make_sort_lots()
+    index = pt.create_price_index(lots)
+    expected = check_price_range(lots, low, high, include_min, include_max)
+
+    assert pt.count_in_price_range(index, low, high, include_min, include_max) == len(expected)
+    assert pt.query_price_range(index, low, high, include_min, include_max, order) == \
+        list(pt.sort_lots(expected, order))
+
+
+@pytest.mark.parametrize('low, high', PRICE_BOUNDS)
+def test_filter_price_index_matches_filter_lots(low, high):
+    """filter_price_index() и filter_lots_by_price() отбирают одно и то же; 0 - тоже граница"""
+
+    lots = make_sort_lots()
+    assert pt.filter_price_index(pt.create_price_index(lots), low, high) == \
+        pt.filter_lots_by_price(lots, low, high)
+
+
+@pytest.mark.parametrize('n', [0, 1, 3, 10, 250, 1000])
+@pytest.mark.parametrize('largest', [True, False])
+def test_top_by_price_matches_sort(n, largest):
+    """top_by_price() - начало sort_lots(), одинаковые цены - в порядке добавления"""
+
+    lots = make_sort_lots()
+    order = 'price-desc' if largest else 'price-asc'
+    assert pt.top_by_price(pt.create_price_index(lots), n, largest) == \
+        list(pt.sort_lots(lots, order))[:n]
+
+
+def test_price_index_add_and_remove():
+    """Индекс после добавлений и удалений - как построенный заново"""
+
+    lots = make_sort_lots()
+    index = pt.create_price_index(lots[:100])
+    for lot in lots[100:]:
+        pt.add_to_price_index(index, lot)
+
+    # Удаляется равный по содержимому лот, а не только тот же объект
+    removed = lots[::4]
+    for lot in removed:
+        assert pt.remove_from_price_index(index, pt.make_lot(dict(lot)))
+    assert not pt.remove_from_price_index(index, removed[0])
+
+    kept = [lot for i, lot in enumerate(lots) if i % 4]
+    rebuilt = pt.create_price_index(kept)
+    assert index['prices'] == rebuilt['prices'] and index['lots'] == rebuilt['lots']
+    for low, high in PRICE_BOUNDS:
+        for order in ('price-asc', 'none'):
+            assert pt.query_price_range(index, low, high, order=order) == \
+                pt.query_price_range(rebuilt, low, high, order=order)
+
+    # Новый лот с уже занятой ценой встает после старых
+    twin = pt.make_lot(dict(kept[0], link='twin'))
+    pt.add_to_price_index(index, twin)
+    same_price = pt.query_price_range(index, twin['price'], twin['price'])
+    assert same_price[-1] is twin
+    assert pt.filter_price_index(index)[-1] is twin
+
+
+# ПОИСК ПО НАЗВАНИЯМ
+# ============================================================
+
+SEARCH_QUERIES = ['', 'квартира', 'квартиры москва', 'КВАРТИРУ', '"земельный участок"',
+                  '"участок земельный"', 'участок дом', 'кв*', 'транспорт* пробег',
+                  '"общая площадь" этаж', 'магазин квартира', 'нет-такого-слова', 'лот 100007']
+
+
+def scan_search(lots, query, min_price=None, max_price=None):
+    """
+    ПОИСК ПРОСТЫМ ПЕРЕБОРОМ НАЗВАНИЙ (те же правила, что search_lots)
+    """
+
+    clauses = pt.parse_search_query(query)
+    result = []
+    for lot in pt.iter_lots_in_price_range(lots, min_price, max_price):
+        tokens = pt.tokenize_name(lot['name'])
+        if all(any(token.startswith(value) for token in tokens) if kind == 'prefix' else
+               any(tokens[i:i + len(value)] == value for i in range(len(tokens)))
+               for kind, value in clauses):
+            result.append(lot)
+    return result
+
+
+def test_stem_word_forms():
+    """Формы одного слова дают одну основу; короткие слова и числа не режутся"""
+
+    assert pt.stem_word('квартиры') == pt.stem_word('квартира') == pt.stem_word('квартиру') == 'квартир'
+    assert pt.stem_word('участок') == pt.stem_word('участка') == 'участк'
+    assert pt.stem_word('земельного') == pt.stem_word('земельный') == 'земельн'
+    assert pt.stem_word('дом') == 'дом'
+    assert pt.stem_word('169159') == '169159'
+
+
+def test_tokenize_name():
+    """Слова по порядку, без регистра и знаков; ё - как е"""
+
+    assert pt.tokenize_name('Земельный участок, 1/2 доли') == ['земельн', 'участк', '1', '2', 'дол']
+    assert pt.tokenize_name('ЁЛКИ') == pt.tokenize_name('елки')
+    assert pt.tokenize_name('') == pt.tokenize_name(None) == []
+
+
+def test_parse_search_query():
+    """Слова, фразы в кавычках и слова с * в конце"""
+
+    assert pt.parse_search_query('квартира москва') == [('phrase', ['квартир']), ('phrase', ['москв'])]
+    assert pt.parse_search_query('"земельный участок"') == [('phrase', ['земельн', 'участк'])]
+    assert pt.parse_search_query('кадастр*') == [('prefix', 'кадастр')]
+    assert pt.parse_search_query('ул.Ленина') == [('phrase', ['ул', 'ленин'])]
+
+
+@pytest.mark.parametrize('query', SEARCH_QUERIES)
+@pytest.mark.parametrize('low, high', [(None, None), (1000000, 20000000)])
+def test_search_matches_scan(query, low, high):
+    """Поиск по индексу находит те же лоты в том же порядке, что перебор названий"""
+
+    lots = extract(make_listing_html(300), pt.DEFAULT_ENGINE)
+    index = pt.create_search_index(lots)
+    assert pt.search_lots(index, query, low, high) == scan_search(lots, query, low, high)
+
+
+def test_search_phrase_and_prefix():
+    """Фраза - слова подряд и по порядку; * - любое слово с таким началом"""
+
+    lots = [make_test_lot('Земельный участок под ИЖС', link='a'),
+            make_test_lot('Участок земельный', link='b'),
+            make_test_lot('Жилой дом и земельный участок', link='c'),
+            make_test_lot('Кадастровый номер 50:01', link='d')]
+    index = pt.create_search_index(lots)
+
+    found = lambda query: [lot['link'] for lot in pt.search_lots(index, query)]
+    assert found('"земельного участка"') == ['a', 'c']
+    assert found('участок земельный') == ['a', 'b', 'c']
+    assert found('"дом земельный"') == []
+    assert found('кадастр*') == ['d']
+    assert found('кадастр') == []
+    assert found('"50 01"') == ['d']
+
+
+def test_search_results_follow_insertion_order():
+    """Результаты - в порядке добавления; лот с новым названием уходит в конец"""
+
+    lots = [make_test_lot(f'Квартира {i}', link=str(i), price=1000.0 * i) for i in range(5)]
+    index = pt.create_search_index(lots)
+    assert [lot['link'] for lot in pt.search_lots(index, 'квартира')] == ['0', '1', '2', '3', '4']
+
+    pt.add_to_search_index(index, [make_test_lot('Квартира новая', link='1', price=1000.0)])
+    assert [lot['link'] for lot in pt.search_lots(index, 'квартира')] == ['0', '2', '3', '4', '1']
+
+
+def test_search_index_replace_and_remove():
+    """Повторный лот заменяется: новая цена находится сразу, старое название - нет"""
+
+    lots = extract(make_listing_html(100), pt.DEFAULT_ENGINE)
+    index = pt.create_search_index(lots)
+    assert pt.add_to_search_index(index, lots[:10]) == 0
+
+    # Та же ссылка и то же название, новая цена
+    cheaper = pt.make_lot(dict(lots[0], price=1.0))
+    assert pt.add_to_search_index(index, [cheaper]) == 0
+    assert pt.search_lots(index, '', None, 1.0) == [cheaper]
+
+    # Та же ссылка, другое название: старые слова больше не находят лот
+    renamed = pt.make_lot(dict(lots[1], name='Гараж кирпичный'))
+    pt.add_to_search_index(index, [renamed])
+    assert pt.search_lots(index, 'гараж') == [renamed]
+    assert lots[1] not in pt.search_lots(index, '')
+
+    # Удаленный лот не находится ни по словам, ни пустым запросом
+    doc = index['ids'][pt.get_lot_identity(lots[2])]
+    pt.remove_from_search_index(index, doc)
+    assert lots[2] not in pt.search_lots(index, '')
+    assert all(doc not in docs for docs, _ in index['postings'].values())
+
+    current = [cheaper] + lots[3:] + [renamed]
+    for query in SEARCH_QUERIES:
+        assert pt.search_lots(index, query) == scan_search(current, query)
+
+
+def test_search_index_save_and_load(tmp_path):
+    """Сохраненный и загруженный индекс ищет так же и пополняется дальше"""
+
+    lots = extract(make_listing_html(200), pt.DEFAULT_ENGINE)
+    index = pt.create_search_index(lots)
+    doc = index['ids'][pt.get_lot_identity(lots[5])]
+    pt.remove_from_search_index(index, doc)
+
+    path = str(tmp_path / 'search.gz')
+    assert pt.load_search_index(path)['lots'] == []
+    pt.save_search_index(index, path)
+    assert os.listdir(tmp_path) == ['search.gz']
+    loaded = pt.load_search_index(path)
+
+    for query in SEARCH_QUERIES:
+        assert pt.search_lots(loaded, query) == pt.search_lots(index, query)
+        assert pt.search_lots(loaded, query, 1000000, 20000000) == \
+            pt.search_lots(index, query, 1000000, 20000000)
+
+    # Известные лоты не добавляются второй раз; новые и удаленный - в конец
+    more = extract(make_listing_html(250), pt.DEFAULT_ENGINE)
+    assert pt.add_to_search_index(loaded, more) == 51
+    assert pt.search_lots(loaded, '') == more[:5] + more[6:200] + [more[5]] + more[200:]
+
+
+
+# РЕГИОНЫ
+# ============================================================
+
+@pytest.mark.parametrize('text, code', [
+    ('Московская обл.', '50'),
+    ('Московская область', '50'),
+    ('г. Москва', '77'),
+    ('Санкт-Петербург', '78'),
+    ('Республика Северная Осетия - Алания', '15'),
+    ('Кемеровская область - Кузбасс', '42'),
+    ('Алтай', '04'),
+    ('Алтайский край', '22'),
+    # Начало многословного названия - еще не регион
+    ('Северная', None),
+    ('Ханты', None),
+    ('Республика', None),
+    ('обл.', None),
+    # Короткие слова сравниваются целиком
+    ('Коми респ', '11'),
+    ('Комиссия', None),
+    # Несколько регионов в ячейке: берется первый
+    ('Москва и Московская обл.', '77'),
+    ('Московская обл., г. Москва', '50'),
+    # Нет в справочнике
+    ('Прием заявок', None),
+    ('Тверь', None),
+    ('50', None),
+    ('', None),
+    (None, None),
+])
+def test_find_region_code(text, code):
+    """Регион ищется по словам справочника: частичные, неоднозначные и чужие названия"""
+
+    assert pt.find_region_code(text) == code
+
+
+def test_parse_region_arg():
+    """--region принимает код, название или вариант названия"""
+
+    assert pt.parse_region_arg('5') == '05'
+    assert pt.parse_region_arg(' 50 ') == '50'
+    assert pt.parse_region_arg('спб') == '78'
+    assert pt.parse_region_arg('99') is None
+    assert pt.parse_region_arg('Тверь') is None
+
+
+def test_region_facets_add_and_remove():
+    """Число лотов и лоты регионов верны после добавления и удаления лотов"""
+
+    lots = [make_test_lot(region='Московская обл', price=100.0),
+            make_test_lot(region='г. Москва', price=200.0),
+            make_test_lot(region='Прием заявок', price=300.0),
+            make_test_lot(region='Московская область', price=400.0)]
+    facets = pt.create_region_facets(lots[:2])
+    assert pt.get_region_counts(facets) == [('50', 'Московская область', 1), ('77', 'Москва', 1)]
+
+    pt.add_to_region_facets(facets, lots[2:])
+    assert pt.get_region_counts(facets) == [('50', 'Московская область', 2), ('77', 'Москва', 1),
+                                            (None, '(не распознан)', 1)]
+    assert pt.get_region_lots(facets, ['50']) == [lots[0], lots[3]]
+    assert pt.get_region_lots(facets, ['77', '50']) == [lots[0], lots[1], lots[3]]
+    assert pt.get_region_lots(facets, [None]) == [lots[2]]
+
+    pt.remove_from_region_facets(facets, 0)
+    pt.remove_from_region_facets(facets, 1)
+    pt.remove_from_region_facets(facets, 1)
+    assert pt.get_region_counts(facets) == [('50', 'Московская область', 1), (None, '(не распознан)', 1)]
+    assert pt.get_region_lots(facets, ['50', '77']) == [lots[3]]
+
+    # Номера лотов не сдвигаются: новый лот получает следующий номер
+    pt.add_to_region_facets(facets, [lots[1]])
+    assert facets['regions'] == {'50': [3], None: [2], '77': [4]}
+    assert pt.get_region_lots(facets, ['77', None]) == [lots[2], lots[1]]
+
+
+# ПАКЕТНЫЙ РЕЖИМ И ПРИЕМНИКИ
+# ============================================================
+
+def test_main_exits_with_error_on_bad_replay_path(tmp_path):
+    """Неудачный пакетный запуск завершается с кодом 1 и не оставляет файла вывода"""
+
+    output = tmp_path / 'lots.jsonl'
+    with pytest.raises(SystemExit) as exit_info:
+        pt.main(['--replay', str(tmp_path / 'missing'), '--format', 'jsonl', '--output', str(output)])
+    assert exit_info.value.code == 1
+    assert os.listdir(tmp_path) == []
+
+
+def test_main_batch_replay_succeeds(tmp_path):
+    """Удачный пакетный запуск завершается без SystemExit и пишет все лоты"""
+
+    page = tmp_path / 'page.html'
+    page.write_text(make_listing_html(30), encoding='utf-8')
+    output = tmp_path / 'lots.jsonl'
+    pt.main(['--replay', str(page), '--format', 'jsonl', '--output', str(output), '--parse-workers', '1'])
+    with open(output, encoding='utf-8') as f:
+        assert len(f.readlines()) == 30
+
+
+def test_csv_sink_round_trip(tmp_path):
+    """CSV: заголовок SINK_FIELDS и те же значения полей"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    lots[0]['area'] = '45'
+    path = str(tmp_path / 'lots.csv')
+    assert pt.write_lots(lots, pt.open_sink('csv', path)) == 20
+
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == list(pt.SINK_FIELDS)
+    assert [float(row['price']) for row in rows] == [lot['price'] for lot in lots]
+    assert [row['name'] for row in rows] == [lot['name'] for lot in lots]
+    assert rows[0]['area'] == '45' and rows[1]['area'] == ''
+
+
+def test_sqlite_sink_round_trip(tmp_path):
+    """SQLite: таблица lots с теми же лотами"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    path = str(tmp_path / 'lots.db')
+    assert pt.write_lots(lots, pt.open_sink('sqlite', path)) == 20
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(f"SELECT {', '.join(pt.LOT_FIELDS)} FROM lots ORDER BY rowid").fetchall()
+    finally:
+        conn.close()
+    assert [pt.Lot(*row) for row in rows] == lots
+
+
+@pytest.mark.skipif(pt.pa is None, reason='нужен pyarrow')
+@pytest.mark.parametrize('fmt', ['arrow', 'parquet'])
+def test_arrow_sink_round_trip(tmp_path, fmt):
+    """Arrow и Parquet: те же лоты, цена - число"""
+
+    lots = extract(make_listing_html(20), pt.DEFAULT_ENGINE)
+    path = str(tmp_path / f'lots.{fmt}')
+    assert pt.write_lots(lots, pt.open_sink(fmt, path)) == 20
+
+    if fmt == 'parquet':
+        table = pt.pq.read_table(path)
+    else:
+        with pt.pa.OSFile(path, 'rb') as f:
+            table = pt.pa.ipc.open_stream(f).read_all()
+    assert table.schema.field('price').type == pt.pa.float64()
+    restored = [pt.make_lot({field: row[field] for field in pt.LOT_FIELDS}) for row in table.to_pylist()]
+    assert restored == lots
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'csv', 'sqlite'] + (['arrow', 'parquet'] if pt.pa is not None else []))
+def test_failed_write_keeps_previous_output(tmp_path, fmt):
+    """Сбой посреди записи: прежний файл цел, временного файла нет"""
+
+    path = tmp_path / f'lots.{fmt}'
+    path.write_bytes(b'previous')
+
+    def failing_lots():
+        yield from extract(make_listing_html(5), pt.DEFAULT_ENGINE)
+        raise pt.requests.exceptions.ConnectionError('сеть пропала')
+
+    with pytest.raises(pt.requests.exceptions.ConnectionError):
+        pt.write_lots(failing_lots(), pt.open_sink(fmt, str(path)))
+    assert path.read_bytes() == b'previous'
+    assert os.listdir(tmp_path) == [path.name]
+
+
+# НАБЛЮДЕНИЕ (--watch) И ИЗДАТЕЛИ
+# ============================================================
+
+def make_watch_args(url, *extra):
+    """
+    АРГУМЕНТЫ НАБЛЮДЕНИЯ ЗА ЛОКАЛЬНЫМ СЕРВЕРОМ (без кеша и пауз)
+    """
+
+    return pt.parse_args(['--watch', '--url', url, '--no-cache',
+                          '--interval', '0', '--min-interval', '0', *extra])
+
+
+def make_watch_state(url):
+    """
+    СОСТОЯНИЕ СПИСКА ДО ПЕРВОЙ ПРОВЕРКИ (как в run_watch)
+    """
+
+    return {'url': url, 'interval': 60.0, 'content_hash': None, 'known': None}
+
+
+def get_metric_value(name, **labels):
+    """
+    ТЕКУЩЕЕ ЗНАЧЕНИЕ СЧЕТЧИКА (0, если его еще нет)
+    """
+
+    return pt.METRICS['values'].get((name, tuple(sorted(labels.items()))), 0)
+
+
+@pytest.mark.parametrize('status, factor', [('changed', pt.WATCH_SPEEDUP),
+                                            ('static', pt.WATCH_SLOWDOWN),
+                                            ('error', pt.WATCH_ERROR_SLOWDOWN)])
+def test_watch_interval_follows_status(status, factor):
+    """Пауза сокращается после изменений и растет после пустых проверок и ошибок"""
+
+    for _ in range(50):
+        interval, delay = pt.get_next_watch_interval(100.0, status, 1.0, 1000.0)
+        assert interval == 100.0 * factor
+        assert interval * (1 - pt.WATCH_JITTER) <= delay <= interval * (1 + pt.WATCH_JITTER)
+
+
+def test_watch_interval_is_clamped():
+    """Пауза не выходит за --min-interval и --max-interval"""
+
+    assert pt.get_next_watch_interval(10.0, 'changed', 8.0, 100.0)[0] == 8.0
+    assert pt.get_next_watch_interval(90.0, 'static', 8.0, 100.0)[0] == 100.0
+    assert pt.get_next_watch_interval(90.0, 'error', 8.0, 100.0)[0] == 100.0
+
+
+@pytest.mark.parametrize('use_store', [False, True], ids=['memory', 'db'])
+def test_poll_listing_detects_changes(tmp_path, fixture_server, use_store):
+    """Первая проверка запоминает лоты, та же страница - 'static', новые лоты и цены - события"""
+
+    server, url = fixture_server
+    extra = ['--db', str(tmp_path / 'lots.db')] if use_store else []
+    args = make_watch_args(url, *extra)
+    store = pt.open_lot_store(args.db) if use_store else None
+    session = pt.create_session()
+    state = make_watch_state(url)
+    poll = lambda: pt.poll_listing(state, session, None, None, None, store, args)
+
+    try:
+        status, events = poll()
+        # Без хранилища первая проверка только запоминает лоты
+        assert status == 'changed' if use_store else status == 'static'
+        assert len(events) == (bt.ROWS_PER_PAGE if use_store else 0)
+        assert all(event['event'] == 'new' and event['source'] == url for event in events)
+
+        assert poll() == ('static', [])
+
+        # Тот же список и еще один лот в конце
+        rows = bt.generate_lot_rows(bt.ROWS_PER_PAGE + 1)
+        server.pages = [bt.generate_listing_html(rows, 1, 2).encode('utf-8')] + server.pages[1:]
+        status, events = poll()
+        assert status == 'changed'
+        assert [event['event'] for event in events] == ['new']
+        assert 'OID=100050' in events[0]['lot']['link']
+
+        # Те же ссылки, другие цены
+        rows = bt.generate_lot_rows(bt.ROWS_PER_PAGE + 1, seed=2)
+        server.pages = [bt.generate_listing_html(rows, 1, 2).encode('utf-8')] + server.pages[1:]
+        status, events = poll()
+        changed = [event['lot'] for event in events if event['event'] == 'changed']
+        assert status == 'changed' and len(changed) == len(events) > 0
+        assert all(lot['old_price'] != lot['price'] for lot in changed)
+    finally:
+        session.close()
+        if store is not None:
+            store.close()
+
+
+def test_poll_listing_filters_events_by_price(fixture_server):
+    """Издателям попадают только лоты из --min-price/--max-price"""
+
+    server, url = fixture_server
+    args = make_watch_args(url, '--min-price', '10000000')
+    session = pt.create_session()
+    state = make_watch_state(url)
+    state['known'] = {}
+    try:
+        status, events = pt.poll_listing(state, session, None, None, None, None, args)
+    finally:
+        session.close()
+
+    assert status == 'changed'
+    assert events and all(event['lot']['price'] >= 10000000 for event in events)
+    assert len(events) < bt.ROWS_PER_PAGE
+
+
+def test_failed_poll_is_retried(fixture_server, monkeypatch):
+    """Сбой сравнения не запоминает страницу: следующая проверка разберет ее снова"""
+
+    server, url = fixture_server
+    args = make_watch_args(url)
+    session = pt.create_session()
+    state = make_watch_state(url)
+    state['known'] = {}
+
+    def failing_identity(lot):
+        raise ValueError('сбой')
+
+    try:
+        with monkeypatch.context() as patch:
+            patch.setattr(pt, 'get_lot_identity', failing_identity)
+            with pytest.raises(ValueError):
+                pt.poll_listing(state, session, None, None, None, None, args)
+        status, events = pt.poll_listing(state, session, None, None, None, None, args)
+    finally:
+        session.close()
+
+    assert status == 'changed' and len(events) == bt.ROWS_PER_PAGE
+
+
+def test_watch_survives_failing_polls(fixture_server, monkeypatch):
+    """Любая ошибка проверки - итог 'error', наблюдение продолжается"""
+
+    server, url = fixture_server
+    calls = []
+
+    def failing_check(state, *rest):
+        calls.append(state['url'])
+        raise ValueError('сломанная разметка')
+
+    monkeypatch.setattr(pt, 'check_listing', failing_check)
+    before = get_metric_value('torgi_watch_polls_total', status='error')
+    pt.run_watch(make_watch_args(url, '--watch-polls', '3'), None)
+
+    assert calls == [url] * 3
+    assert get_metric_value('torgi_watch_polls_total', status='error') == before + 3
+
+
+def test_watch_survives_failing_publisher(tmp_path, fixture_server, monkeypatch):
+    """Сбой одного издателя не мешает другим и не останавливает наблюдение"""
+
+    server, url = fixture_server
+    events_path = tmp_path / 'events.jsonl'
+    original = pt.open_publisher
+
+    def open_publisher(spec, *rest):
+        if spec == 'console':
+            return {'publish': lambda events: 1 / 0, 'close': lambda: None}
+        return original(spec, *rest)
+
+    monkeypatch.setattr(pt, 'open_publisher', open_publisher)
+    pt.run_watch(make_watch_args(url, '--db', str(tmp_path / 'lots.db'), '--watch-polls', '2',
+                                 '--publish', 'console', '--publish', f'file:{events_path}'), None)
+
+    with open(events_path, encoding='utf-8') as f:
+        events = [json.loads(line) for line in f]
+    assert len(events) == bt.ROWS_PER_PAGE
+
+
+def make_watch_events():
+    """
+    СОБЫТИЯ НАБЛЮДЕНИЯ: НОВЫЙ ЛОТ И НОВАЯ ЦЕНА
+    """
+
+    new = make_test_lot('Квартира', 'Москва', 5000000.0, 'https://torgi.org/?OID=1')
+    changed = dict(make_test_lot('Гараж', 'Тула', 300000.0, 'https://torgi.org/?OID=2'), old_price=350000.0)
+    return [{'event': 'new', 'source': 'list', 'time': 1.5, 'lot': dict(new)},
+            {'event': 'changed', 'source': 'list', 'time': 1.5, 'lot': changed}]
+
+
+def test_file_publisher_appends_jsonl(tmp_path):
+    """file: дописывает по событию в строке, прежние строки остаются"""
+
+    path = tmp_path / 'events.jsonl'
+    path.write_text('{"event": "old"}\n', encoding='utf-8')
+    events = make_watch_events()
+
+    publisher = pt.open_publisher(f'file:{path}')
+    publisher['publish'](events)
+    publisher['close']()
+
+    with open(path, encoding='utf-8') as f:
+        assert [json.loads(line) for line in f] == [{'event': 'old'}] + events
+
+
+def test_spool_publisher_writes_one_file_per_event(tmp_path):
+    """spool: каждое событие - отдельный файл, без временных файлов, по порядку"""
+
+    spool = tmp_path / 'queue'
+    events = make_watch_events()
+    publisher = pt.open_publisher(f'spool:{spool}')
+    publisher['publish'](events)
+    publisher['close']()
+
+    names = sorted(os.listdir(spool))
+    assert len(names) == 2 and all(name.endswith('.json') for name in names)
+    restored = []
+    for name in names:
+        with open(spool / name, encoding='utf-8') as f:
+            restored.append(json.load(f))
+    assert restored == events
+
+
+def test_console_publisher_prints_lots():
+    """console: метка события и название лота"""
+
+    stream = io.StringIO()
+    publisher = pt.open_publisher('console', stdout=stream)
+    publisher['publish'](make_watch_events())
+
+    text = stream.getvalue()
+    assert 'Новый лот' in text and 'Новая цена' in text
+    assert 'Квартира' in text and 'Гараж' in text
+
+
+def test_unknown_publisher_is_rejected():
+    """Неизвестный вид издателя - ValueError"""
+
+    with pytest.raises(ValueError):
+        pt.open_publisher('kafka:topic')
+
+
+# ДАННЫЕ СО СТРАНИЦ ЛОТОВ (--enrich)
+# ============================================================
+
+LOT_PAGE_OIDS = range(100000, 100040)
+
+# Страницы лотов с необычной разметкой
+ODD_LOT_PAGES = [
+    '',
+    '<html><body><p>Лот снят с торгов</p></body></html>',
+    '<table><tr><td>Площадь:</td></tr><tr><td></td><td>100 кв.м.</td></tr></table>',
+    '<table><tr><th>ПЛОЩАДЬ</th><td> 45,5 <i>кв.м.</i> </td><td>лишняя ячейка</td></tr>'
+    '<tr><td>Площадь:</td><td>второе значение</td></tr></table>',
+    '<table><tr><td>Организатор<br>торгов</td><td><span>ООО</span><span>"Торг"</span></td></tr></table>',
+]
+
+
+def make_enrich_lots(base_url, oids=LOT_PAGE_OIDS):
+    """
+    ЛОТЫ СО ССЫЛКАМИ НА СТРАНИЦЫ ЛОКАЛЬНОГО СЕРВЕРА
+    """
+
+    return [make_test_lot(f'Лот {oid}', price=1000.0 + oid,
+                          link=f'{base_url}/index.php?class=ArrestAuction&action=View&OID={oid}')
+            for oid in oids]
+
+
+@pytest.fixture
+def lot_server():
+    """
+    ЛОКАЛЬНЫЙ СЕРВЕР СО СТРАНИЦАМИ ЛОТОВ LOT_PAGE_OIDS
+    """
+
+    lot_pages = {str(oid): bt.generate_lot_page(oid).encode('utf-8') for oid in LOT_PAGE_OIDS}
+    server = bt.start_fixture_server([], lot_pages)
+    host, port = server.server_address
+    yield server, f'http://{host}:{port}'
+    server.shutdown()
+
+
+def test_parse_lot_details_fields():
+    """Все поля страницы лота, в том числе из вложенной таблицы и с переводом строки в подписи"""
+
+    html = bt.generate_lot_page(100001)
+    details = pt.parse_lot_details(html)
+    assert list(details) == ['auction_date', 'application_start', 'application_end',
+                             'area', 'organizer', 'bid_step']
+    assert details['auction_date'].endswith(' 10:00')
+    assert details['area'].endswith(' кв.м.') and '  ' not in details['area']
+    assert details['organizer'].startswith('ТУ Росимущества ИНН 77')
+
+
+@pytest.mark.skipif(pt.etree is None, reason='нужен lxml')
+@pytest.mark.parametrize('html', [bt.generate_lot_page(oid) for oid in LOT_PAGE_OIDS[:5]] + ODD_LOT_PAGES)
+def test_lot_details_engines_agree(html, monkeypatch):
+    """lxml и BeautifulSoup находят на странице лота одни и те же поля"""
+
+    details = pt.parse_lot_details(html)
+    monkeypatch.setattr(pt, 'etree', None)
+    assert pt.parse_lot_details(html) == details
+
+
+def test_lot_details_odd_pages():
+    """Пустая страница и строки без значения не дают полей; берется первое значение"""
+
+    assert [pt.parse_lot_details(html) for html in ODD_LOT_PAGES] == [
+        {}, {}, {}, {'area': '45,5 кв.м.'}, {'organizer': 'ООО "Торг"'}]
+
+
+def test_enrich_lots_from_server(lot_server):
+    """Каждая страница загружается один раз; лоты без страницы и без ссылки не теряются"""
+
+    server, base_url = lot_server
+    lots = make_enrich_lots(base_url)
+    missing = make_enrich_lots(base_url, [999])[0]
+    no_link = make_test_lot('Лот без ссылки')
+    twin = pt.make_lot(dict(lots[3], name='Тот же лот'))
+
+    session = pt.create_session(retries=0)
+    try:
+        result = list(pt.enrich_lots(session, lots + [missing, no_link, twin], workers=4, per_host=2))
+    finally:
+        session.close()
+
+    assert sorted(map(id, result)) == sorted(map(id, lots + [missing, no_link, twin]))
+    assert len(server.requests) == len(set(server.requests)) == len(lots) + 1
+    for oid, lot in zip(LOT_PAGE_OIDS, lots):
+        details = pt.parse_lot_details(bt.generate_lot_page(oid))
+        assert details and all(lot[key] == value for key, value in details.items())
+    assert twin['area'] == lots[3]['area']
+    assert missing.get('area') is None and no_link.get('area') is None
+
+
+def test_enrich_lots_reuses_stored_details(tmp_path, lot_server):
+    """Со свежими данными в хранилище страницы лотов не загружаются повторно"""
+
+    server, base_url = lot_server
+    store = pt.open_lot_store(str(tmp_path / 'lots.db'))
+    session = pt.create_session()
+    try:
+        first = list(pt.enrich_lots(session, make_enrich_lots(base_url), store=store))
+        requests = len(server.requests)
+        second = list(pt.enrich_lots(session, make_enrich_lots(base_url), store=store))
+        assert len(server.requests) == requests == len(LOT_PAGE_OIDS)
+
+        # Устаревшие данные загружаются заново
+        list(pt.enrich_lots(session, make_enrich_lots(base_url), store=store, max_age=-1))
+        assert len(server.requests) == 2 * len(LOT_PAGE_OIDS)
+    finally:
+        session.close()
+        store.close()
+
+    by_link = lambda lots: sorted((lot['link'], lot['area']) for lot in lots)
+    assert by_link(second) == by_link(first)
+
+
+def test_enrich_lots_stops_when_consumer_stops(lot_server):
+    """Если получатель взял один лот и остановился, остальные страницы не загружаются"""
+
+    server, base_url = lot_server
+    session = pt.create_session()
+    try:
+        lots = pt.enrich_lots(session, make_enrich_lots(base_url), workers=4)
+        assert next(lots)['area']
+        lots.close()
+    finally:
+        session.close()
+
+    assert len(server.requests) <= 4 + 1
+
+
+# ОБХОД СТРАНИЦ СПИСКА (--crawl)
+# ============================================================
+
+CRAWL_PAGES = 12
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_crawl_fetches_every_page_once_in_order(fixture_server, workers):
+    """Все страницы найдены по навигации, каждая загружена один раз, результат - по порядку"""
+
+    server, url = fixture_server
+    server.pages = bt.generate_site_pages(CRAWL_PAGES * bt.ROWS_PER_PAGE)
+    session = pt.create_session()
+    try:
+        pages = pt.crawl_listing_pages(session, url, workers=workers)
+    finally:
+        session.close()
+
+    # Первая страница - сам адрес списка, ее ссылка "&page=1" - та же страница
+    assert [pt.get_page_number(page_url) for page_url, _ in pages] == [0] + list(range(2, CRAWL_PAGES + 1))
+    assert [html for _, html in pages] == [page.decode('utf-8') for page in server.pages]
+    assert len(server.requests) == len(set(server.requests)) == CRAWL_PAGES
+
+    lots = list(pt.iter_lots_from_pages(pages, pt.DEFAULT_ENGINE, deduper=pt.create_lot_deduper()))
+    assert len({lot['link'] for lot in lots}) == len(lots) == CRAWL_PAGES * bt.ROWS_PER_PAGE
+
+
+def test_crawl_stops_at_max_pages(fixture_server):
+    """--max-pages: загружается не больше заданного числа страниц"""
+
+    server, url = fixture_server
+    server.pages = bt.generate_site_pages(CRAWL_PAGES * bt.ROWS_PER_PAGE)
+    session = pt.create_session()
+    try:
+        pages = pt.crawl_listing_pages(session, url, workers=4, max_pages=5)
+    finally:
+        session.close()
+
+    assert len(pages) == len(server.requests) == 5
+
+
+def test_crawl_skips_missing_page(fixture_server):
+    """Страница из навигации не загрузилась - остальные страницы все равно обходятся"""
+
+    server, url = fixture_server
+    server.pages = bt.generate_site_pages(CRAWL_PAGES * bt.ROWS_PER_PAGE)
+    server.pages[6] = None
+    session = pt.create_session(retries=0)
+    try:
+        pages = pt.crawl_listing_pages(session, url, workers=4)
+    finally:
+        session.close()
+
+    # Страница 7 отдает 404; ссылки на остальные есть на соседних страницах
+    assert len(pages) == CRAWL_PAGES - 1
+    assert 7 not in [pt.get_page_number(page_url) for page_url, _ in pages]
+
+
+def test_crawl_rate_limit(fixture_server):
+    """С ограничением частоты запросы к одному сайту идут не чаще заданного"""
+
+    server, url = fixture_server
+    server.pages = bt.generate_site_pages(8 * bt.ROWS_PER_PAGE)
+    session = pt.create_session()
+    try:
+        start = pt.time.monotonic()
+        pages = pt.crawl_listing_pages(session, url, workers=4, limiter=pt.create_rate_limiter(40))
+        elapsed = pt.time.monotonic() - start
+    finally:
+        session.close()
+
+    assert len(pages) == 8
+    assert elapsed >= 7 / 40
+
+
+def test_rate_limiter_is_per_host():
+    """Ограничитель задерживает повторный запрос к тому же сайту, а не к другому"""
+
+    limiter = pt.create_rate_limiter(10)
+    start = pt.time.monotonic()
+    pt.wait_for_rate_limit(limiter, 'https://torgi.org/a')
+    pt.wait_for_rate_limit(limiter, 'https://example.org/a')
+    assert pt.time.monotonic() - start < 0.05
+    pt.wait_for_rate_limit(limiter, 'https://torgi.org/b')
+    assert pt.time.monotonic() - start >= 0.09
+
+    pt.wait_for_rate_limit(None, 'https://torgi.org/c')
+    pt.wait_for_rate_limit(pt.create_rate_limiter(None), 'https://torgi.org/c')
+
+
+PAGER_HTML = (
+    '<html><body>'
+    '<a href="/index.php?class=Auction&amp;action=List&amp;page=1">1</a>'
+    '<a href="index.php?class=Auction&amp;action=List&amp;page=2">2</a>'
+    '<a href="?action=List&amp;class=Auction&amp;page=2">2</a>'
+    '<a href="/index.php?class=Auction&amp;action=List&amp;page=3#top">дальше</a>'
+    '<a href="/index.php?class=Auction&amp;action=List&amp;sort=price">4</a>'
+    '<a href="/index.php?class=Auction&amp;action=View&amp;OID=5">5</a>'
+    '<a href="/index.php?class=Page&amp;action=List&amp;page=2">2</a>'
+    '<a href="/index.php?class=Auction&amp;action=List&amp;sort=name">Сортировать</a>'
+    '<a name="no-href">7</a>'
+    '</body></html>'
+)
+
+
+@pytest.mark.parametrize('engine_available', [True, False], ids=['lxml', 'bs4'])
+def test_find_page_links(engine_available, monkeypatch):
+    """Навигация: тот же раздел, номер в тексте или адресе, без повторов и без самой страницы"""
+
+    if engine_available and pt.etree is None:
+        pytest.skip('нужен lxml')
+    if not engine_available:
+        monkeypatch.setattr(pt, 'etree', None)
+
+    page_url = 'https://torgi.org/index.php?class=Auction&action=List&page=1'
+    base = 'https://torgi.org/index.php?action=List&class=Auction'
+    assert pt.find_page_links(PAGER_HTML, page_url) == [
+        f'{base}&page=2', f'{base}&page=3', f'{base}&sort=price']
+
+
+def test_page_key_joins_first_page():
+    """Адрес списка без номера и с номером первой страницы - одна страница"""
+
+    base = 'https://torgi.org/index.php?class=Auction&action=List'
+    assert pt.get_page_key(base) == pt.get_page_key(base + '&page=1') == pt.get_page_key(base + '&start=0')
+    assert pt.get_page_key(base + '&page=2') != pt.get_page_key(base)
+    assert pt.get_page_key(base + '&start=20') == pt.normalize_url(base + '&start=20')
+
+
+# ПАРАЛЛЕЛЬНЫЙ РАЗБОР (--parse-workers)
+# ============================================================
+
+PARSE_WORKERS = 2
+
+
+@pytest.fixture(scope='module')
+def parse_pool():
+    """
+    ПУЛ ПРОЦЕССОВ РАЗБОРА (один на все проверки: запуск spawn небыстрый)
+    """
+
+    pool = pt.create_parse_pool(PARSE_WORKERS)
+    yield pool
+    pt.close_parse_pool(pool)
+
+
+def make_mixed_pages():
+    """
+    СТРАНИЦЫ РАЗНОГО ВИДА: С ЗАГОЛОВКОМ И БЕЗ, БЕЗ ТАБЛИЦЫ, С ПОВТОРАМИ
+    """
+
+    header = ('<tr><th>№</th><th>Наименование лота</th><th>Регион</th><th>Дата торгов</th>'
+              '<th>Начальная цена</th><th>Статус</th><th>Форма торгов</th></tr>')
+    htmls = [
+        make_listing_html(120, seed=1),
+        make_listing_html(7, seed=2).replace(header, ''),
+        '<html><body><table><tr><td>меню</td></tr></table></body></html>',
+        bt.generate_listing_html(bt.generate_lot_rows(60, seed=1, start=100)),
+        make_listing_html(300, seed=3).replace(header, ''),
+        make_listing_html(1, seed=4),
+    ] + [read_fixture(path) for path in FIXTURE_PATHS]
+    return [(f'https://torgi.org/index.php?class=Auction&action=List&page={i + 1}', html)
+            for i, html in enumerate(htmls)]
+
+
+@pytest.mark.parametrize('engine', ['bs4'] + (['lxml'] if pt.etree is not None else []))
+def test_pool_matches_serial_parse(parse_pool, engine):
+    """Пул процессов выдает те же лоты в том же порядке, с теми же счетчиками, что и разбор здесь"""
+
+    pages = make_mixed_pages()
+
+    def run(pool):
+        pt.COLUMN_MAP_CACHE.clear()
+        page_info = {}
+        before = pt.get_parse_counters()
+        lots = list(pt.iter_lots_from_pages(pages, engine, page_info=page_info, pool=pool))
+        return lots, page_info, pt.get_counters_change(before, pt.get_parse_counters())
+
+    serial = run(None)
+    parallel = run(parse_pool)
+    assert [dict(lot) for lot in parallel[0]] == [dict(lot) for lot in serial[0]]
+    assert parallel[1] == serial[1] == {'pages': len(pages), 'tables_found': True}
+    assert sorted(parallel[2]) == sorted(serial[2])
+
+
+def test_pool_keeps_page_order_and_window(parse_pool):
+    """Медленная первая страница не меняет порядок; страниц в работе не больше 2 на процесс"""
+
+    pages = [(f'page{i}', make_listing_html(3000 if i == 0 else 5, seed=i)) for i in range(12)]
+    pulled = []
+    ahead = []
+
+    def source():
+        for page in pages:
+            pulled.append(page[0])
+            yield page
+
+    result = []
+    for page_url, html, page_lots in pt.iter_parsed_pages(source(), pool=parse_pool):
+        ahead.append(len(pulled) - len(result))
+        result.append(page_url)
+        assert page_lots == extract(html, pt.DEFAULT_ENGINE)
+
+    assert result == [page_url for page_url, _ in pages]
+    assert max(ahead) <= 2 * PARSE_WORKERS + 1
+
+
+def test_parse_pool_is_warm_and_closes():
+    """Процессы пула запускаются сразу; после закрытия пул не принимает страниц"""
+
+    before = len(multiprocessing.active_children())
+    pool = pt.create_parse_pool(PARSE_WORKERS)
+    try:
+        assert len(multiprocessing.active_children()) - before == PARSE_WORKERS
+    finally:
+        pt.close_parse_pool(pool)
+
+    with pytest.raises(RuntimeError):
+        pool['executor'].submit(int)
+
+
+# СОХРАНЕННЫЕ СТРАНИЦЫ (--replay)
+# ============================================================
+
+def make_snapshot_pages():
+    """
+    ДВА СНИМКА СПИСКА ПО 12 ЛОТОВ
+    ============================================
+
+    Во втором снимке по сравнению с первым: два лота сняты, у одного
+    новая цена, два лота новые.
+
+    ВОЗВРАЩАЕТ:
+    - Пару (HTML первого дня, HTML второго дня)
+    """
+
+    rows = bt.generate_lot_rows(12)
+    first = bt.generate_listing_html(rows)
+    price = extract(first, pt.DEFAULT_ENGINE)[2]['price']
+
+    changed = rows[2].replace(pt.format_price_text(price), pt.format_price_text(price + 1000))
+    second = bt.generate_listing_html([changed] + rows[3:] + bt.generate_lot_rows(2, start=100))
+    return first, second
+
+
+def write_snapshot_archive(path):
+    """
+    АРХИВ .tgz ИЛИ .zip: СНИМКИ ПО ДНЯМ В ПАПКАХ (второй день - сжатый .html.gz)
+    """
+
+    import gzip
+    import tarfile
+    import zipfile
+
+    first, second = make_snapshot_pages()
+    files = [('2024-05-01/p1.html', first.encode('utf-8')),
+             ('2024-05-02/p1.html.gz', gzip.compress(second.encode('utf-8')))]
+
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, data in files:
+                archive.writestr(name, data)
+        return
+
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in files:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def read_jsonl(path):
+    """
+    ЛОТЫ ИЗ ФАЙЛА JSONL
+    """
+
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize('suffix', ['.tgz', '.zip'])
+def test_replay_archive_snapshots(tmp_path, suffix):
+    """Страницы архива идут по снимкам: лот, который есть в обоих днях, выдается дважды"""
+
+    archive = str(tmp_path / f'snapshots{suffix}')
+    write_snapshot_archive(archive)
+
+    pages = list(pt.iter_replay_pages([archive]))
+    assert [name for name, _ in pages] == [f'{archive}:2024-05-01/p1.html', f'{archive}:2024-05-02/p1.html.gz']
+    assert [html for _, html in pages] == list(make_snapshot_pages())
+
+    snapshots = list(pt.iter_snapshot_lots(pages))
+    assert [(name, len(lots)) for name, lots in snapshots] == [('2024-05-01', 12), ('2024-05-02', 12)]
+
+    output = tmp_path / 'lots.jsonl'
+    pt.main(['--replay', archive, '--format', 'jsonl', '--output', str(output)])
+    assert len(read_jsonl(output)) == 24
+
+
+def test_replay_with_db_reports_changes_per_snapshot(tmp_path, capsys):
+    """С --db каждый снимок сравнивается с предыдущим, время изменений - дата снимка"""
+
+    archive = str(tmp_path / 'snapshots.tgz')
+    write_snapshot_archive(archive)
+    db = str(tmp_path / 'lots.db')
+    output = tmp_path / 'lots.jsonl'
+
+    pt.main(['--replay', archive, '--db', db, '--format', 'jsonl', '--output', str(output)])
+    text = capsys.readouterr().out
+    assert len(read_jsonl(output)) == 24
+    assert 'Снимок 2024-05-01' in text and 'Снимок 2024-05-02' in text
+    assert 'новых 12, с новой ценой 0, снято 0' in text
+    assert 'новых 2, с новой ценой 1, снято 2' in text
+
+    # Только изменения: новые лоты и новые цены второго дня
+    conn = sqlite3.connect(db)
+    try:
+        conn.execute('DELETE FROM lots')
+        conn.commit()
+    finally:
+        conn.close()
+    pt.main(['--replay', archive, '--db', db, '--changes-only', '--format', 'jsonl', '--output', str(output)])
+    lots = read_jsonl(output)
+    assert len(lots) == 12 + 3
+
+    first, second = make_snapshot_pages()
+    changed, old = extract(second, pt.DEFAULT_ENGINE)[0], extract(first, pt.DEFAULT_ENGINE)[2]
+    repriced = [lot for lot in lots if 'old_price' in lot]
+    assert [(lot['link'], lot['price'], lot['old_price']) for lot in repriced] == [(changed['link'], changed['price'], old['price'])]
+
+
+def test_replay_folder_and_single_files(tmp_path):
+    """Папка обходится по алфавиту (вместе с вложенными); явно названный файл читается всегда"""
+
+    first, second = make_snapshot_pages()
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'a.html').write_text(first, encoding='utf-8')
+    (tmp_path / 'b' / 'c.htm').write_text(second, encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text('не страница', encoding='utf-8')
+    odd = tmp_path / 'page.dump'
+    odd.write_text(second, encoding='utf-8')
+
+    names = [name for name, _ in pt.iter_replay_pages([str(tmp_path / 'b'), str(tmp_path)])]
+    assert names == [str(tmp_path / 'b' / 'c.htm'), str(tmp_path / 'a.html'), str(tmp_path / 'b' / 'c.htm')]
+    assert [html for _, html in pt.iter_replay_pages([str(odd)])] == [second]
+
+
+@pytest.mark.parametrize('name, snapshot', [
+    ('snapshots/2024-05-01/p1.html', '2024-05-01'),
+    ('archive.tar:20240502.html', '2024-05-02'),
+    ('dump_2024_05_03_p2.html', '2024-05-03'),
+    ('lot-20241399.html', 'lot-20241399.html'),
+    ('page.html', 'page.html'),
+])
+def test_snapshot_name(name, snapshot):
+    """Снимок - дата из пути страницы, а без даты - сама страница"""
+
+    assert pt.get_snapshot_name(name) == snapshot
+
+
+@pytest.mark.parametrize('content', [None, b'not an archive'])
+def test_replay_bad_path_fails_batch_run(tmp_path, content):
+    """Нет файла или архив поврежден - код выхода 1, файла вывода нет"""
+
+    archive = tmp_path / 'snapshots.tgz'
+    if content is not None:
+        archive.write_bytes(content)
+    output = tmp_path / 'lots.jsonl'
+
+    with pytest.raises(SystemExit) as exit_info:
+        pt.main(['--replay', str(archive), '--format', 'jsonl', '--output', str(output)])
+    assert exit_info.value.code == 1
+    assert not output.exists() and not os.path.exists(str(output) + '.tmp')